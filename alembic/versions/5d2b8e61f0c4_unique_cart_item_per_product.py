@@ -0,0 +1,56 @@
+"""unique_cart_item_per_product
+
+Revision ID: 5d2b8e61f0c4
+Revises: a91f4c7e2d63
+Create Date: 2026-10-19 18:12:05.904417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d2b8e61f0c4"
+down_revision: Union[str, Sequence[str], None] = "a91f4c7e2d63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fold duplicate lines into the oldest one before adding the constraint.
+    # Plain correlated subqueries, so this runs on SQLite as well as Postgres.
+    op.execute(
+        """
+        UPDATE cartitems SET quantity = (
+            SELECT SUM(dup.quantity) FROM cartitems AS dup
+            WHERE dup.cart_id = cartitems.cart_id
+              AND dup.product_id = cartitems.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cartitems
+            GROUP BY cart_id, product_id
+            HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM cartitems WHERE id NOT IN (
+            SELECT MIN(id) FROM cartitems GROUP BY cart_id, product_id
+        )
+        """
+    )
+    # Batch mode: SQLite can only add a constraint by recreating the table.
+    with op.batch_alter_table("cartitems") as batch_op:
+        batch_op.create_unique_constraint(
+            "uq_cartitems_cart_product", ["cart_id", "product_id"]
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("cartitems") as batch_op:
+        batch_op.drop_constraint("uq_cartitems_cart_product", type_="unique")
@@ -0,0 +1,35 @@
+"""add_cache_versions_table
+
+Revision ID: a91f4c7e2d63
+Revises: 7c3e91d2a4b8
+Create Date: 2026-10-19 16:58:47.530921
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a91f4c7e2d63"
+down_revision: Union[str, Sequence[str], None] = "7c3e91d2a4b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    cache_versions = op.create_table(
+        "cache_versions",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(cache_versions, [{"name": "category_tree", "version": 1}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("cache_versions")
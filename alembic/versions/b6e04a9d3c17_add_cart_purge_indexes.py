@@ -0,0 +1,38 @@
+"""add_cart_purge_indexes
+
+Revision ID: b6e04a9d3c17
+Revises: 5d2b8e61f0c4
+Create Date: 2026-10-19 19:03:41.652180
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6e04a9d3c17"
+down_revision: Union[str, Sequence[str], None] = "5d2b8e61f0c4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_carts_session_id", "carts", ["session_id"], unique=False)
+    op.create_index(
+        "ix_carts_anon_updated_at",
+        "carts",
+        ["updated_at"],
+        unique=False,
+        postgresql_where=sa.text("session_id IS NOT NULL"),
+        sqlite_where=sa.text("session_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_carts_anon_updated_at", table_name="carts")
+    op.drop_index("ix_carts_session_id", table_name="carts")
@@ -0,0 +1,94 @@
+"""per_consumer_outbox_deliveries
+
+Revision ID: c4f7a2e9d815
+Revises: b6e04a9d3c17
+Create Date: 2026-10-20 10:14:52.318406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f7a2e9d815"
+down_revision: Union[str, Sequence[str], None] = "b6e04a9d3c17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The relay's consumers when delivery state moved off the event rows.
+CONSUMERS = ("elasticsearch", "cache", "autocomplete")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "outbox_cursors",
+        sa.Column("consumer", sa.String(length=50), nullable=False),
+        sa.Column("last_event_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("consumer"),
+    )
+    op.create_table(
+        "outbox_deliveries",
+        sa.Column("consumer", sa.String(length=50), nullable=False),
+        sa.Column("event_id", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("dead_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["event_id"], ["outbox_events.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("consumer", "event_id"),
+    )
+    op.create_index(
+        "ix_outbox_deliveries_event", "outbox_deliveries", ["event_id"], unique=False
+    )
+
+    # Every consumer resumes just before the oldest event still pending;
+    # anything after it that was already delivered is delivered once more.
+    for consumer in CONSUMERS:
+        op.execute(
+            sa.text(
+                "INSERT INTO outbox_cursors (consumer, last_event_id) "
+                "SELECT :consumer, COALESCE("
+                "(SELECT MIN(id) - 1 FROM outbox_events WHERE processed_at IS NULL), "
+                "(SELECT MAX(id) FROM outbox_events), 0)"
+            ).bindparams(consumer=consumer)
+        )
+
+    op.drop_index("ix_outbox_events_pending", table_name="outbox_events")
+    with op.batch_alter_table("outbox_events") as batch_op:
+        batch_op.drop_column("last_error")
+        batch_op.drop_column("attempts")
+        batch_op.drop_column("processed_at")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("outbox_events") as batch_op:
+        batch_op.add_column(sa.Column("processed_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(
+            sa.Column("attempts", sa.Integer(), nullable=False, server_default="0")
+        )
+        batch_op.add_column(sa.Column("last_error", sa.Text(), nullable=True))
+    op.create_index(
+        "ix_outbox_events_pending",
+        "outbox_events",
+        ["processed_at", "id"],
+        unique=False,
+    )
+    # Events every consumer has read count as processed again.
+    op.execute(
+        sa.text(
+            "UPDATE outbox_events SET processed_at = CURRENT_TIMESTAMP "
+            "WHERE id <= (SELECT MIN(last_event_id) FROM outbox_cursors) "
+            "AND id NOT IN (SELECT event_id FROM outbox_deliveries "
+            "WHERE dead_at IS NULL)"
+        )
+    )
+    op.drop_index("ix_outbox_deliveries_event", table_name="outbox_deliveries")
+    op.drop_table("outbox_deliveries")
+    op.drop_table("outbox_cursors")
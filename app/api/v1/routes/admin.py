@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, Query, status
 from typing import Annotated, Optional
 from datetime import datetime
 
+from app.core.user_cache import user_cache
 from app.dependencies import require_admin, get_db
 from app.services.admin_service import AdminService
 from app.schema.admin_schema import (
@@ -28,7 +29,7 @@ router = APIRouter(tags=["Admin"])
 
 def get_admin_service(db: Annotated[Session, Depends(get_db)]) -> AdminService:
     """Dependency to get admin service"""
-    return AdminService(db=db)
+    return AdminService(db=db, cache=user_cache)
 
 
 # Analytics Endpoints
@@ -138,7 +139,9 @@ async def update_user_role(
     current_admin: Annotated[UserPublic, Depends(require_admin)],
 ):
     """Update a user's role"""
-    user = admin_service.update_user_role(user_id=user_id, new_role=role_update.role)
+    user = await admin_service.update_user_role(
+        user_id=user_id, new_role=role_update.role
+    )
     return UserPublic.model_validate(user)
 
 
@@ -1,11 +1,15 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Request
-
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Request, Response
 from app.dependencies import get_cart_service_dep, get_optional_user
 from app.schema.user_schema import UserPublic
 from app.services.cart_service import CartService
-from app.schema.cart_schema import CartItemCreate, CartItemUpdate, CartResponse
+from app.schema.cart_schema import (
+    CartBatchRequest,
+    CartBatchResponse,
+    CartItemCreate,
+    CartItemUpdate,
+    CartResponse,
+)
 from app.utils.session import generate_session_id
 from app.core.logger import logger
 
@@ -15,26 +19,45 @@ cart_dependency = Annotated[CartService, Depends(get_cart_service_dep)]
 user_dep = Annotated[UserPublic | None, Depends(get_optional_user)]
 
 
-@router.get("")
+def _anonymous_session(request: Request, response: Response) -> str:
+    """The caller's session id; a new one is also set as the cookie."""
+    session_id = request.cookies.get("session_id")
+    if not session_id:
+        session_id = generate_session_id()
+        response.set_cookie("session_id", session_id, httponly=True, max_age=1296000)
+    return session_id
+
+
+@router.get("", response_model=CartResponse)
 async def get_cart(
     request: Request, current_user: user_dep, cart_service: cart_dependency
 ):
     # Authenticated user
     if current_user:
+        # Login merges the session cart and clears the cookie; a cookie still
+        # here means a client that got its token some other way.
         session_id = request.cookies.get("session_id")
-        cart_service.merge_carts(current_user.id, session_id)
-
-        cart = cart_service.get_or_create_cart(user_id=current_user.id, session_id=None)
-        return cart_service.get_cart_details(cart=cart)
+        if session_id:
+            await cart_service.merge_carts(current_user.id, session_id)
+
+        cart = await cart_service.get_or_create_cart(
+            user_id=current_user.id, session_id=None
+        )
+        summary = await cart_service.get_cart_summary(cart=cart)
+        response = Response(summary.model_dump_json(), media_type="application/json")
+        if session_id:
+            response.delete_cookie("session_id")
+        return response
 
     # Anonymous user
     session_id = request.cookies.get("session_id")
     if not session_id:
         session_id = generate_session_id()
 
-    cart = cart_service.get_or_create_cart(user_id=None, session_id=session_id)
+    cart = await cart_service.get_or_create_cart(user_id=None, session_id=session_id)
 
-    response = JSONResponse(cart_service.get_cart_details(cart=cart))
+    summary = await cart_service.get_cart_summary(cart=cart)
+    response = Response(summary.model_dump_json(), media_type="application/json")
     response.set_cookie("session_id", session_id, httponly=True, max_age=1296000)
     return response
 
@@ -42,18 +65,44 @@ async def get_cart(
 @router.post("/items")
 async def add_item(
     request: Request,
+    response: Response,
     data: CartItemCreate,
     current_user: user_dep,
     cart_service: cart_dependency,
 ):
     if current_user:
-        cart = cart_service.get_or_create_cart(user_id=current_user.id, session_id=None)
+        cart = await cart_service.get_or_create_cart(
+            user_id=current_user.id, session_id=None
+        )
+    else:
+        session_id = _anonymous_session(request, response)
+        cart = await cart_service.get_or_create_cart(
+            user_id=None, session_id=session_id
+        )
+
+    item_id = await cart_service.add_item(cart=cart, data=data)
+    return {"message": "Item added", "item_id": item_id}
+
+
+@router.post("/items/batch", response_model=CartBatchResponse)
+async def add_items(
+    request: Request,
+    response: Response,
+    data: CartBatchRequest,
+    current_user: user_dep,
+    cart_service: cart_dependency,
+):
+    if current_user:
+        cart = await cart_service.get_or_create_cart(
+            user_id=current_user.id, session_id=None
+        )
     else:
-        session_id = request.cookies.get("session_id") or generate_session_id()
-        cart = cart_service.get_or_create_cart(user_id=None, session_id=session_id)
+        session_id = _anonymous_session(request, response)
+        cart = await cart_service.get_or_create_cart(
+            user_id=None, session_id=session_id
+        )
 
-    item = cart_service.add_item(cart=cart, data=data)
-    return {"message": "Item added", "item_id": item.id}
+    return await cart_service.add_items(cart=cart, items=data.items)
 
 
 @router.put("/items/{item_id}")
@@ -65,15 +114,19 @@ async def update_item(
     cart_service: cart_dependency,
 ):
     if current_user:
-        cart = cart_service.get_or_create_cart(user_id=current_user.id, session_id=None)
+        cart = await cart_service.get_or_create_cart(
+            user_id=current_user.id, session_id=None
+        )
         logger.info("cart with user: {cart}")
     else:
         session_id = request.cookies.get("session_id")
         logger.info(f"we are using session: {session_id}")
-        cart = cart_service.get_or_create_cart(user_id=None, session_id=session_id)
+        cart = await cart_service.get_or_create_cart(
+            user_id=None, session_id=session_id
+        )
 
-    item = cart_service.update_item(cart, item_id, data)
-    return {"message": "Item updated", "item_id": item.id}
+    item_id = await cart_service.update_item(cart, item_id, data)
+    return {"message": "Item updated", "item_id": item_id}
 
 
 @router.delete("/items/{item_id}")
@@ -84,10 +137,14 @@ async def remove_item(
     cart_service: cart_dependency,
 ):
     if current_user:
-        cart = cart_service.get_or_create_cart(user_id=current_user.id, session_id=None)
+        cart = await cart_service.get_or_create_cart(
+            user_id=current_user.id, session_id=None
+        )
     else:
         session_id = request.cookies.get("session_id")
-        cart = cart_service.get_or_create_cart(user_id=None, session_id=session_id)
+        cart = await cart_service.get_or_create_cart(
+            user_id=None, session_id=session_id
+        )
 
-    cart_service.remove_item(cart, item_id)
+    await cart_service.remove_item(cart, item_id)
     return {"message": "Item removed"}
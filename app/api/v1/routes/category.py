@@ -1,5 +1,10 @@
-from fastapi import APIRouter, Depends
-from app.schema.category_schema import CreateCategory, UpdateCategory, CategoryPublic
+from fastapi import APIRouter, Depends, Request, Response, status
+from app.schema.category_schema import (
+    CategoryPublic,
+    CategoryTreeNode,
+    CreateCategory,
+    UpdateCategory,
+)
 from app.schema.user_schema import UserPublic
 from app.dependencies import (
     get_category_service_dep,
@@ -46,6 +51,30 @@ async def get_all_categories(
     return category_service.get_all_categories()
 
 
+@router.get(
+    "/tree",
+    response_model=List[CategoryTreeNode],
+    summary="Category tree",
+    description="Nested categories with product counts. Supports ETag / If-None-Match.",
+)
+async def get_category_tree(
+    request: Request,
+    category_service: category_dependency,
+) -> Response:
+    """Return the category tree, or 304 if the client's copy is current."""
+    version = category_service.get_tree_version()
+    etag = f'"category-tree-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = await category_service.get_category_tree(version)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get(
     "/{id}",
     response_model=CategoryPublic,
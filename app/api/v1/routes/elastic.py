@@ -1,12 +1,36 @@
+import json
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
-from app.dependencies import get_elastic_service_dep
+from app.dependencies import (
+    get_elastic_service_dep,
+    get_product_service_dep,
+    require_admin,
+)
+from app.schema.search_schema import (
+    ProductSearchResponse,
+    SearchSortField,
+    SortOrder,
+)
+from app.schema.user_schema import UserPublic
 from app.services.elasticsearch_service import ElasticService
+from app.services.product_service import ProductService
+from app.utils.es_utils import rebuild_product_index
 
 router = APIRouter(tags=["ELastic"])
 elastic_dependency = Annotated[ElasticService, Depends(get_elastic_service_dep)]
+product_dependency = Annotated[ProductService, Depends(get_product_service_dep)]
+admin_dependency = Annotated[UserPublic, Depends(require_admin)]
 
 
 @router.get("/health")
@@ -14,11 +38,141 @@ async def elastic_health_check(elastic_service: elastic_dependency):
     return await elastic_service.ping()
 
 
+@router.get("/search", response_model=ProductSearchResponse)
+async def search_products(
+    elastic_service: elastic_dependency,
+    product_service: product_dependency,
+    q: Annotated[str | None, Query(min_length=1, max_length=255)] = None,
+    category_id: Annotated[int | None, Query(ge=1)] = None,
+    category: Annotated[str | None, Query(max_length=255)] = None,
+    min_price: Annotated[float | None, Query(ge=0)] = None,
+    max_price: Annotated[float | None, Query(ge=0)] = None,
+    in_stock: bool | None = None,
+    sort_by: SearchSortField = SearchSortField.RELEVANCE,
+    sort_order: SortOrder = SortOrder.ASC,
+    page: Annotated[int, Query(ge=1)] = 1,
+    per_page: Annotated[int, Query(ge=1, le=100)] = 20,
+    scroll: bool = False,
+    cursor: Annotated[str | None, Query(max_length=4096)] = None,
+) -> ProductSearchResponse:
+    """
+    Full-text product search.
+
+    - `q`: matched against name and description (typo tolerant)
+    - `category_id` / `category`: filter by category id or name
+    - `min_price`, `max_price`, `in_stock`: narrow the results
+
+    **Response:** `facets` holds category and price-range counts for the
+    current query; each facet ignores its own filter. Cursor pages after the
+    first carry none.
+
+    **Pagination:** `page`/`per_page` by default. For infinite scroll or deep
+    result sets pass `scroll=true` and then the returned `next_cursor` as
+    `cursor`; a cursor carries the original filters, so other query
+    parameters except `per_page` are ignored while following it.
+
+    **Degraded mode:** while Elasticsearch is unavailable, page requests are
+    answered from recently cached results or the database and flagged with
+    `degraded: true` (no scores, highlights or facets).
+    """
+    filters = {
+        "q": q,
+        "category_id": category_id,
+        "category": category,
+        "min_price": min_price,
+        "max_price": max_price,
+        "in_stock": in_stock,
+        "sort_by": sort_by.value,
+        "sort_order": sort_order.value,
+    }
+    if scroll or cursor:
+        result = await elastic_service.search_products_cursor(
+            cursor=cursor, per_page=per_page, **filters
+        )
+        page = None
+    else:
+        try:
+            result = await elastic_service.search_products(
+                page=page, per_page=per_page, **filters
+            )
+        except HTTPException as e:
+            if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+                raise
+            result = product_service.search_products_in_database(
+                page=page, per_page=per_page, **filters
+            )
+    return ProductSearchResponse(
+        total=result["total"],
+        took_ms=result["took_ms"],
+        page=page,
+        per_page=per_page,
+        results=[
+            {**hit["data"], "score": hit["score"], "highlight": hit["highlight"]}
+            for hit in result["results"]
+        ],
+        facets=result.get("facets"),
+        next_cursor=result.get("next_cursor"),
+        degraded=result.get("degraded", False),
+    )
+
+
+@router.get("/search/export")
+async def export_products(
+    elastic_service: elastic_dependency,
+    current_admin: admin_dependency,
+    q: Annotated[str | None, Query(min_length=1, max_length=255)] = None,
+    category_id: Annotated[int | None, Query(ge=1)] = None,
+    category: Annotated[str | None, Query(max_length=255)] = None,
+    min_price: Annotated[float | None, Query(ge=0)] = None,
+    max_price: Annotated[float | None, Query(ge=0)] = None,
+    in_stock: bool | None = None,
+) -> StreamingResponse:
+    """Stream every matching product as NDJSON (admin only)."""
+    if elastic_service.es is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search temporarily unavailable",
+        )
+    documents = elastic_service.iter_products(
+        q=q,
+        category_id=category_id,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+    )
+
+    async def ndjson():
+        async for document in documents:
+            document.pop("suggest", None)
+            yield json.dumps(document) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 @router.post("/search")
 async def search(elastic_service: elastic_dependency, query: dict = Body(...)):
     return await elastic_service.search(query)
 
 
 @router.get("/suggest")
-async def suggest(elastic_service: elastic_dependency, text: str):
-    return await elastic_service.suggest(text=text)
+async def suggest(
+    elastic_service: elastic_dependency, text: str, category: str | None = None
+):
+    return await elastic_service.suggest(text=text, category=category)
+
+
+@router.post("/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def reindex_products(
+    elastic_service: elastic_dependency,
+    current_admin: admin_dependency,
+    background_tasks: BackgroundTasks,
+):
+    """Rebuild the product index from the database (admin only)."""
+    if elastic_service.es is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="elasticseach unreachable",
+        )
+    background_tasks.add_task(rebuild_product_index, elastic_service.es)
+    return {"detail": "product reindex started"}
@@ -1,7 +1,14 @@
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from app.schema.user_schema import UserPublic
+from app.services.cart_service import CartService
 from app.services.order_service import OrderService
-from app.dependencies import get_current_user, get_order_service_dep
+from app.dependencies import (
+    checkout_rate_limit,
+    get_cart_service_dep,
+    get_current_user,
+    get_order_service_dep,
+)
 from app.schema.order_schema import OrderCreateRequest, OrderResponse
 from typing import Annotated
 
@@ -9,19 +16,28 @@ router = APIRouter(tags=["Orders"])
 
 user_dependency = Annotated[UserPublic, Depends(get_current_user)]
 order_dependency = Annotated[OrderService, Depends(get_order_service_dep)]
+cart_dependency = Annotated[CartService, Depends(get_cart_service_dep)]
 
 
-@router.post("", response_model=OrderResponse)
-def place_order(
+@router.post(
+    "", response_model=OrderResponse, dependencies=[Depends(checkout_rate_limit)]
+)
+async def place_order(
     payload: OrderCreateRequest,
     current_user: user_dependency,
     order_service: order_dependency,
+    cart_service: cart_dependency,
 ):
-    return order_service.place_order(
+    await cart_service.prepare_checkout(current_user.id)
+    # The order transaction is blocking database work; keep it off the loop.
+    order = await run_in_threadpool(
+        order_service.place_order,
         user_id=current_user.id,
         shipping_id=payload.shipping_address_id,
         billing_id=payload.billing_address_id,
     )
+    await cart_service.finish_checkout(current_user.id)
+    return order
 
 
 @router.get("", response_model=list[OrderResponse])
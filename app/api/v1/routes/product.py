@@ -6,17 +6,31 @@ from app.schema.search_schema import (
     SortByField,
     SortOrder,
     ProductAutocompleteResponse,
+    ProductListingResponse,
 )
+from app.services.elasticsearch_service import ElasticService
 from app.services.product_service import ProductService
-from app.dependencies import get_product_service_dep, require_admin
+from app.services.wishlist_service import WishlistService
+from app.dependencies import (
+    autocomplete_rate_limit,
+    get_optional_elastic_service,
+    get_optional_user_id,
+    get_product_service_dep,
+    get_wishlist_service_dep,
+    require_admin,
+)
 from app.schema.user_schema import UserPublic
-from typing import Annotated, List
+from typing import Annotated
 from app.core.logger import logger
 import enum
 
 router = APIRouter(tags=["Product"])
 product_dependency = Annotated[ProductService, Depends(get_product_service_dep)]
 admin_dependency = Annotated[UserPublic, Depends(require_admin)]
+optional_elastic_dependency = Annotated[
+    ElasticService | None, Depends(get_optional_elastic_service)
+]
+wishlist_dependency = Annotated[WishlistService, Depends(get_wishlist_service_dep)]
 
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=ProductResponse)
@@ -33,9 +47,12 @@ async def create_prodcut(
     return product
 
 
-@router.get("", response_model=PaginatedResponse[ProductResponse])
+@router.get("", response_model=ProductListingResponse)
 async def get_all_products(
     product_service: product_dependency,
+    elastic_service: optional_elastic_dependency,
+    wishlist_service: wishlist_dependency,
+    user_id: Annotated[int | None, Depends(get_optional_user_id)],
     page: Annotated[int, Query(ge=1)] = 1,
     per_page: Annotated[int, Query(ge=1, le=100)] = 10,
     search: Annotated[str | None, Query(min_length=1, max_length=255)] = None,
@@ -46,13 +63,20 @@ async def get_all_products(
     availability: AvailabilityFilter = AvailabilityFilter.ALL,
     sort_by: SortByField = SortByField.ID,
     sort_order: SortOrder = SortOrder.ASC,
-) -> PaginatedResponse[ProductResponse]:
+    include_subcategories: bool = False,
+    facets: bool = False,
+    include_wishlist: bool = False,
+) -> ProductListingResponse:
     """
     Get all products with advanced filtering and sorting.
 
     **Filters:**
-    - `search`: Search in product name and description (case-insensitive)
+    - `search`: Search in product name and description (case-insensitive).
+      Served by Elasticsearch, ranked by relevance, when the cluster is up
+      and no rating filter or rating/popularity sort is requested; otherwise
+      by the worker's in-memory catalog index once it is built.
     - `category_id`: Filter by category
+    - `include_subcategories`: Also match products in categories below it
     - `min_price`, `max_price`: Price range filter
     - `min_rating`: Minimum average rating (0-5)
     - `availability`: Stock availability (all, in_stock, out_of_stock)
@@ -64,25 +88,93 @@ async def get_all_products(
     **Pagination:**
     - `page`: Page number (1-indexed)
     - `per_page`: Items per page (1-100)
-    """
-    return product_service.get_all_products(
-        page,
-        per_page,
-        search,
-        category_id,
-        min_price,
-        max_price,
-        min_rating,
-        availability.value,
-        sort_by.value,
-        sort_order.value,
-    )
 
+    **Facets:**
+    - `facets`: Also return category, price range, rating and availability
+      counts for the current filters
 
-@router.get("/autocomplete", response_model=ProductAutocompleteResponse)
+    **Wishlist:**
+    - `include_wishlist`: For an authenticated user, also return whether each
+      product on the page is in their wishlist
+    """
+    listing = None
+    if search and elastic_service is not None and min_rating is None:
+        listing = await product_service.search_products(
+            elastic_service,
+            page,
+            per_page,
+            search,
+            category_id,
+            min_price,
+            max_price,
+            availability.value,
+            sort_by.value,
+            sort_order.value,
+            include_subcategories,
+        )
+
+    if search and listing is None:
+        listing = product_service.search_products_in_catalog_index(
+            page,
+            per_page,
+            search,
+            category_id,
+            min_price,
+            max_price,
+            min_rating,
+            availability.value,
+            sort_by.value,
+            sort_order.value,
+            include_subcategories,
+        )
+
+    if listing is None:
+        listing = product_service.get_all_products(
+            page,
+            per_page,
+            search,
+            category_id,
+            min_price,
+            max_price,
+            min_rating,
+            availability.value,
+            sort_by.value,
+            sort_order.value,
+            include_subcategories,
+        )
+
+    response = ProductListingResponse(
+        data=listing.data, meta=listing.meta, links=listing.links
+    )
+    if facets:
+        response.facets = await product_service.get_listing_facets(
+            search,
+            category_id,
+            min_price,
+            max_price,
+            min_rating,
+            availability.value,
+            include_subcategories,
+        )
+    if include_wishlist and user_id is not None:
+        response.in_wishlist = await wishlist_service.get_membership(
+            user_id, [p.id for p in response.data]
+        )
+    return response
+
+
+@router.get(
+    "/autocomplete",
+    response_model=ProductAutocompleteResponse,
+    dependencies=[Depends(autocomplete_rate_limit)],
+)
 async def get_product_autocomplete(
     product_service: product_dependency,
+    elastic_service: optional_elastic_dependency,
     q: Annotated[str, Query(min_length=2, max_length=100, description="Search query")],
+    category: Annotated[
+        str | None, Query(max_length=255, description="Category name")
+    ] = None,
 ) -> ProductAutocompleteResponse:
     """
     Get product name suggestions for autocomplete.
@@ -91,22 +183,39 @@ async def get_product_autocomplete(
     - Query must be at least 2 characters
     - Returns maximum 10 suggestions
     - Results are cached for 1 hour
+    - Limited to `RATE_LIMIT_AUTOCOMPLETE` requests per client IP; beyond
+      that 429 with `Retry-After`
 
     **Matching:**
-    - Prioritizes products that start with the query
-    - Falls back to products containing the query
-    - Case-insensitive matching
+    - Elasticsearch completion suggester (typo tolerant), scoped to
+      `category` when given
+    - If the search cluster is down: products that start with the query,
+      then products containing it (case-insensitive)
     """
-    suggestions = await product_service.get_autocomplete_suggestions(q)
+    suggestions = await product_service.get_autocomplete_suggestions(
+        q, category=category, elastic=elastic_service
+    )
     return ProductAutocompleteResponse(suggestions=suggestions)
 
 
-@router.get("/category/{slug}", response_model=List[ProductResponse])
+@router.get("/category/{slug}", response_model=PaginatedResponse[ProductResponse])
 async def get_products_by_category_slug(
     slug: Annotated[str, Path(title="The category slug")],
     product_service: product_dependency,
-) -> List[ProductResponse]:
-    return product_service.get_products_by_category_slug(slug)
+    page: Annotated[int, Query(ge=1)] = 1,
+    per_page: Annotated[int, Query(ge=1, le=100)] = 20,
+    cursor: Annotated[str | None, Query(max_length=512)] = None,
+    include_subcategories: bool = False,
+) -> PaginatedResponse[ProductResponse]:
+    """
+    Products of a category in id order.
+
+    Page with `page`/`per_page`, or pass `meta.next_cursor` as `cursor` to
+    walk large categories without offsets.
+    """
+    return await product_service.get_products_by_category_slug(
+        slug, page, per_page, cursor, include_subcategories
+    )
 
 
 @router.get("/id/{id}", response_model=ProductResponse)
@@ -1,6 +1,7 @@
 from app.schema.address_schema import AddressCreate, AddressUpdate, AddressPublic
 from app.services.address_service import AddressService
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from app.services.cart_service import CartService
 from app.services.user_service import UserService
 from app.schema.user_schema import (
     CreateUserSchema,
@@ -11,15 +12,18 @@ from app.schema.user_schema import (
     DeleteUserResponseModel,
 )
 from app.dependencies import (
+    get_cart_service_dep,
     get_user_service_dep,
     get_current_user,
     require_admin,
     get_address_service_dep,
+    login_rate_limit,
 )
 from typing import Annotated
 
 router = APIRouter(tags=["User"])
 user_dependency = Annotated[UserService, Depends(get_user_service_dep)]
+cart_dependency = Annotated[CartService, Depends(get_cart_service_dep)]
 address_dependency = Annotated[
     AddressService, Depends(get_address_service_dep)
 ]  # Note: Fixed typo from 'depedency' to 'dependency'
@@ -51,7 +55,7 @@ async def create_user(
     Raises:
     - HTTPException: If validation fails or a conflict occurs (e.g., duplicate email).
     """
-    user = user_service.create_user(create_user_data)
+    user = await user_service.create_user(create_user_data)
     return user
 
 
@@ -60,19 +64,26 @@ async def create_user(
     response_model=TokenSchema,
     summary="Login",
     description="Authenticate a user and return a JWT token.",
+    dependencies=[Depends(login_rate_limit)],
 )
 async def login(
-    user_login_data: LoginSchema, user_service: user_dependency
+    user_login_data: LoginSchema,
+    request: Request,
+    response: Response,
+    user_service: user_dependency,
+    cart_service: cart_dependency,
 ) -> TokenSchema:
     """
     Authenticate a user and return an access token.
 
     This endpoint verifies the user's credentials and issues a JWT token for authentication
-    in subsequent requests.
+    in subsequent requests. An anonymous cart from the `session_id` cookie is merged into
+    the user's cart here, once, and the cookie is cleared.
 
     Parameters:
     - user_login_data (LoginSchema): The login credentials, typically including email/username and password.
     - user_service (UserService): Dependency-injected service for user operations.
+    - cart_service (CartService): Dependency-injected service for cart operations.
 
     Returns:
     - TokenSchema: An object containing the JWT access token and token type.
@@ -80,7 +91,12 @@ async def login(
     Raises:
     - HTTPException: If credentials are invalid (e.g., 401 Unauthorized).
     """
-    return user_service.login(user_login_data=user_login_data)
+    user, token = await user_service.login_user(user_login_data=user_login_data)
+    session_id = request.cookies.get("session_id")
+    if session_id:
+        await cart_service.merge_carts(user.id, session_id)
+        response.delete_cookie("session_id")
+    return token
 
 
 @router.get(
@@ -137,7 +153,7 @@ async def update_user(
     Raises:
     - HTTPException: If validation fails or the update operation encounters an error.
     """
-    updated_user = user_service.update_user(
+    updated_user = await user_service.update_user(
         id=current_user.id, update_user_data=update_user_data
     )
     return updated_user
@@ -171,7 +187,7 @@ async def delete_user(
     Raises:
     - HTTPException: If the user lacks permission or deletion fails (e.g., 403 Forbidden).
     """
-    user_service.delete_user(id=current_user.id)
+    await user_service.delete_user(id=current_user.id)
     return {"detail": "User deleted successfully"}
 
 
@@ -207,7 +223,9 @@ async def add_address_to_user(
     is_first = False
     if not current_user.addresses:
         is_first = True
-    address = address_service.add_address(user_id, is_first, address_data=address_data)
+    address = await address_service.add_address(
+        user_id, is_first, address_data=address_data
+    )
     return address
 
 
@@ -244,5 +262,5 @@ async def update_address(
     if not address_data:
         raise HTTPException(status_code=400, detail="No data provided for update")
 
-    address = address_service.update_address(address_id, address_data)
+    address = await address_service.update_address(address_id, address_data)
     return address
@@ -1,25 +1,20 @@
-from fastapi import APIRouter, Depends, status
-from typing import Annotated
+from fastapi import APIRouter, Depends, Query, status
+from typing import Annotated, List
 
-from app.dependencies import get_current_user, get_db
+from app.dependencies import get_current_user, get_wishlist_service_dep
 from app.services.wishlist_service import WishlistService
 from app.schema.wishlist_schema import (
     AddToWishlistRequest,
+    WishlistMembershipResponse,
     WishlistResponse,
     WishlistStatsResponse,
     WishlistActionResponse,
 )
 from app.schema.user_schema import UserPublic
-from sqlalchemy.orm import Session
 
 router = APIRouter(tags=["Wishlist"])
 
 
-def get_wishlist_service(db: Annotated[Session, Depends(get_db)]) -> WishlistService:
-    """Dependency to get wishlist service"""
-    return WishlistService(db=db)
-
-
 @router.get(
     "",
     response_model=WishlistResponse,
@@ -27,7 +22,7 @@ def get_wishlist_service(db: Annotated[Session, Depends(get_db)]) -> WishlistSer
     description="Get all products in the authenticated user's wishlist",
 )
 async def get_wishlist(
-    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
     current_user: Annotated[UserPublic, Depends(get_current_user)],
 ):
     """Get user's wishlist with product details"""
@@ -43,11 +38,11 @@ async def get_wishlist(
 )
 async def add_to_wishlist(
     request: AddToWishlistRequest,
-    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
     current_user: Annotated[UserPublic, Depends(get_current_user)],
 ):
     """Add a product to wishlist"""
-    return wishlist_service.add_product_to_wishlist(
+    return await wishlist_service.add_product_to_wishlist(
         user_id=current_user.id, product_id=request.product_id
     )
 
@@ -60,11 +55,11 @@ async def add_to_wishlist(
 )
 async def remove_from_wishlist(
     product_id: int,
-    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
     current_user: Annotated[UserPublic, Depends(get_current_user)],
 ):
     """Remove a product from wishlist"""
-    return wishlist_service.remove_product_from_wishlist(
+    return await wishlist_service.remove_product_from_wishlist(
         user_id=current_user.id, product_id=product_id
     )
 
@@ -76,11 +71,11 @@ async def remove_from_wishlist(
     description="Remove all products from the authenticated user's wishlist",
 )
 async def clear_wishlist(
-    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
     current_user: Annotated[UserPublic, Depends(get_current_user)],
 ):
     """Clear entire wishlist"""
-    return wishlist_service.clear_wishlist(user_id=current_user.id)
+    return await wishlist_service.clear_wishlist(user_id=current_user.id)
 
 
 @router.get(
@@ -90,13 +85,31 @@ async def clear_wishlist(
     description="Get the number of items in the authenticated user's wishlist",
 )
 async def get_wishlist_count(
-    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
     current_user: Annotated[UserPublic, Depends(get_current_user)],
 ):
     """Get count of items in wishlist"""
     return wishlist_service.get_wishlist_count(user_id=current_user.id)
 
 
+@router.get(
+    "/contains",
+    response_model=WishlistMembershipResponse,
+    summary="Check wishlist membership",
+    description="Check which of the given products are in the authenticated user's wishlist",
+)
+async def get_wishlist_membership(
+    product_ids: Annotated[List[int], Query(min_length=1, max_length=100)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
+    current_user: Annotated[UserPublic, Depends(get_current_user)],
+):
+    """Wishlist flags for a batch of products"""
+    flags = await wishlist_service.get_membership(
+        user_id=current_user.id, product_ids=product_ids
+    )
+    return WishlistMembershipResponse(in_wishlist=flags)
+
+
 @router.post(
     "/{product_id}/move-to-cart",
     response_model=WishlistActionResponse,
@@ -105,8 +118,10 @@ async def get_wishlist_count(
 )
 async def move_to_cart(
     product_id: int,
-    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service)],
+    wishlist_service: Annotated[WishlistService, Depends(get_wishlist_service_dep)],
     current_user: Annotated[UserPublic, Depends(get_current_user)],
 ):
     """Move a wishlist item to shopping cart"""
-    return wishlist_service.move_to_cart(user_id=current_user.id, product_id=product_id)
+    return await wishlist_service.move_to_cart(
+        user_id=current_user.id, product_id=product_id
+    )
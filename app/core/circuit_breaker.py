@@ -0,0 +1,78 @@
+import time
+from typing import Literal
+
+from app.core.logger import logger
+from app.core.metrics import CIRCUIT_BREAKER_OPEN
+
+State = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker for a flaky dependency.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    callers skip the dependency for `reset_timeout` seconds. Then a single
+    trial call is let through (half open); its outcome closes the circuit
+    again or re-opens it for another timeout. A trial released without an
+    outcome (record_release) hands the slot to the next caller, and one that
+    never reports back is given up on after another `reset_timeout`.
+    """
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state: State = "closed"
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if (self.state == "open" and now - self.opened_at >= self.reset_timeout) or (
+            self.state == "half_open"
+            and (
+                not self.probe_in_flight
+                or now - self.probe_started_at >= self.reset_timeout
+            )
+        ):
+            self.state = "half_open"
+            self.probe_started_at = now
+            self.probe_in_flight = True
+            return True
+        # Open, or half open with the trial call still in flight.
+        return False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"Circuit '{self.name}' closed")
+            CIRCUIT_BREAKER_OPEN.labels(name=self.name).set(0)
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_release(self) -> None:
+        """
+        End a call that says nothing about the dependency's health (it was
+        cancelled, or failed on our side): neither a success nor a failure,
+        but a half-open trial slot is freed for the next caller.
+        """
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(
+                    f"Circuit '{self.name}' opened after {self.failures} failure(s)"
+                )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+            CIRCUIT_BREAKER_OPEN.labels(name=self.name).set(1)
@@ -6,10 +6,56 @@ class Setting(BaseSettings):
     JWT_ALGORITHM: str = ""
     JWT_SECRET_KEY: str = ""
     JWT_DEFAULT_EXP_MINUTES: int = 30
+    # Argon2 runs in this many processes per API worker; see app/core/password_hasher.py.
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
     STRIPE_SECRET_KEY: str = ""
     STRIPE_WEBHOOK_SECRET: str = ""
     REDIS_URL: str = "redis://localhost:6379/0"
     ELASTIC_URL: str = "http://elasticsearch:9200"
+    # The compose cluster is a single node; raise this on a real cluster.
+    ELASTIC_PRODUCT_REPLICAS: int = 0
+    ELASTIC_CONNECT_ATTEMPTS: int = 10
+    ELASTIC_CONNECT_RETRY_SECONDS: float = 5.0
+    ELASTIC_RECONNECT_SECONDS: float = 30.0
+    ELASTIC_REQUEST_BUDGET_SECONDS: float = 2.0
+    ELASTIC_BREAKER_FAILURES: int = 5
+    ELASTIC_BREAKER_RESET_SECONDS: float = 15.0
+    ELASTIC_BULK_CHUNK_SIZE: int = 500
+    ELASTIC_BULK_CONCURRENCY: int = 4
+    ELASTIC_BULK_MAX_RETRIES: int = 3
+    SEARCH_CACHE_TTL_SECONDS: int = 30
+    SEARCH_CACHE_STALE_TTL_SECONDS: int = 3600
+    FACET_CACHE_TTL_SECONDS: int = 120
+    CATEGORY_PRODUCTS_CACHE_TTL_SECONDS: int = 60
+    AUTOCOMPLETE_INDEX_ENABLED: bool = True
+    AUTOCOMPLETE_INDEX_REBUILD_SECONDS: int = 900
+    CATALOG_INDEX_ENABLED: bool = True
+    CATALOG_INDEX_REBUILD_SECONDS: int = 900
+    WISHLIST_CACHE_TTL_SECONDS: int = 600
+    USER_CACHE_TTL_SECONDS: int = 300
+    USER_CACHE_LOCAL_TTL_SECONDS: float = 5.0
+    USER_CACHE_LOCAL_MAX_ENTRIES: int = 10000
+    # "<requests>/<seconds>" per client; see app/core/rate_limit.py.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_LOGIN: str = "10/60"
+    RATE_LIMIT_AUTOCOMPLETE: str = "30/10"
+    RATE_LIMIT_CHECKOUT: str = "5/60"
+    RATE_LIMIT_LOCAL_MAX_BUCKETS: int = 10000
+    # "sql" or "redis"; see app/services/cart_store.py.
+    CART_BACKEND: str = "sql"
+    CART_SESSION_TTL_SECONDS: int = 1296000
+    CART_EMPTY_MARKER_TTL_SECONDS: int = 3600
+    CART_GC_INTERVAL_SECONDS: int = 3600
+    CART_GC_CHUNK_SIZE: int = 500
+    CART_GC_METRICS_PORT: int = 9101
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0
+    # Retries back off from 1s to 5 min, so 20 attempts ride out about an hour.
+    OUTBOX_MAX_ATTEMPTS: int = 20
+    OUTBOX_RETRY_BASE_SECONDS: float = 1.0
+    OUTBOX_RETRY_MAX_SECONDS: float = 300.0
+    OUTBOX_RETENTION_HOURS: int = 72
 
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", case_sensitive=False
@@ -6,15 +6,24 @@ from app.core.config import settings
 from app.core.logger import logger
 
 es: AsyncElasticsearch | None = None
+_connect_lock = asyncio.Lock()
 
 
-async def get_es_client() -> AsyncElasticsearch:
+async def get_es_client(
+    attempts: int = settings.ELASTIC_CONNECT_ATTEMPTS,
+    retry_delay: float = settings.ELASTIC_CONNECT_RETRY_SECONDS,
+) -> AsyncElasticsearch:
     global es
 
-    if es is None:
+    # Concurrent callers wait for one connection attempt instead of each
+    # creating (and leaking) their own client.
+    async with _connect_lock:
+        if es is not None:
+            return es
+
         logger.info("Initializing Elasticsearch client...")
 
-        es = AsyncElasticsearch(
+        client = AsyncElasticsearch(
             hosts=[
                 (
                     settings.ELASTIC_URL
@@ -28,24 +37,29 @@ async def get_es_client() -> AsyncElasticsearch:
             sniff_on_start=False,
         )
 
-        for attempt in range(10):
+        # Only published once a ping succeeds, so get_connected_es_client()
+        # never hands out a client that is still connecting.
+        for attempt in range(attempts):
             try:
-                logger.info(f"Elasticsearch ping attempt {attempt+1}/10...")
-                if await es.ping():
+                logger.info(f"Elasticsearch ping attempt {attempt+1}/{attempts}...")
+                if await client.ping():
                     logger.info(" Elasticsearch connected successfully")
+                    es = client
                     return es
 
             except Exception as e:
                 logger.warning(f" Elasticsearch ping failed: {e}")
 
-            await asyncio.sleep(5)
+            if attempt + 1 < attempts:
+                await asyncio.sleep(retry_delay)
+
+        logger.error(" Elasticsearch connection failed after retries")
+        await client.close()
+        raise RuntimeError("Elasticsearch connection failed")
 
-        if not await es.ping():
-            logger.error(" Elasticsearch connection failed after retries")
-            await es.close()
-            es = None
-            raise RuntimeError("Elasticsearch connection failed")
 
+def get_connected_es_client() -> AsyncElasticsearch | None:
+    """The shared client if it is already connected; never blocks or retries."""
     return es
 
 
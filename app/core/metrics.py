@@ -0,0 +1,90 @@
+"""
+Application Prometheus metrics.
+
+Registered on the default registry, so they are served by the
+instrumentator's /metrics endpoint next to the HTTP metrics.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import Counter, Gauge, Histogram
+
+AUTOCOMPLETE_BACKEND_LATENCY = Histogram(
+    "autocomplete_backend_latency_seconds",
+    "Time spent answering autocomplete, per backend and outcome",
+    ["backend", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+SEARCH_CACHE_REQUESTS = Counter(
+    "search_cache_requests_total",
+    "Search cache lookups by result",
+    ["result"],
+)
+
+USER_CACHE_REQUESTS = Counter(
+    "user_cache_requests_total",
+    "Authenticated user lookups by where they were answered",
+    ["result"],
+)
+
+CIRCUIT_BREAKER_OPEN = Gauge(
+    "circuit_breaker_open",
+    "1 while the named circuit breaker is open or half open",
+    ["name"],
+)
+
+CART_GC_DELETED = Counter(
+    "cart_gc_deleted_carts_total",
+    "Expired anonymous carts deleted by the cart purge",
+)
+
+CART_GC_DURATION = Histogram(
+    "cart_gc_run_duration_seconds",
+    "Time taken by one cart purge run",
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0),
+)
+
+CART_GC_LAST_SUCCESS = Gauge(
+    "cart_gc_last_success_timestamp_seconds",
+    "Unix time the last cart purge run completed",
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Time to hash or verify a password, including waiting for a worker",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hash jobs waiting for a free worker process",
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash jobs refused because PASSWORD_HASH_MAX_PENDING were pending",
+)
+
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions_total",
+    "Rate limited requests by bucket backend and whether they were let through",
+    ["backend", "result"],
+)
+
+
+@contextmanager
+def observe_latency(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Time the block into `histogram`, labelled outcome=success or error."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        histogram.labels(outcome=outcome, **labels).observe(
+            time.perf_counter() - started
+        )
@@ -0,0 +1,126 @@
+"""
+Argon2 password hashing off the event loop.
+
+Hashing or verifying a password costs tens of milliseconds of CPU, and run
+inline it held up every other request on the worker for that long. Once
+started by the app's lifespan, PasswordHasher runs that work on a pool of
+PASSWORD_HASH_WORKERS processes. While PASSWORD_HASH_MAX_PENDING jobs are
+queued or running it refuses more with PasswordHasherBusy, so a login burst
+cannot build an unbounded queue. If a worker process dies, the pool is
+replaced and the job that hit it runs once more on the new one.
+
+Before start() (scripts, tests) the work runs on a thread instead.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import (
+    PASSWORD_HASH_DURATION,
+    PASSWORD_HASH_QUEUE_DEPTH,
+    PASSWORD_HASH_REJECTED,
+)
+from app.utils.security import hash_password, verify_password
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hash jobs are already pending."""
+
+
+class PasswordHasherUnavailable(PasswordHasherBusy):
+    """The worker pool broke again right after being replaced."""
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = settings.PASSWORD_HASH_WORKERS,
+        max_pending: int = settings.PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending = 0
+
+    def start(self) -> None:
+        if self._pool is not None or self.workers < 1:
+            return
+        self._pool = self._new_pool()
+        # Bring every worker up now instead of on the first logins.
+        for _ in range(self.workers):
+            self._pool.submit(hash_password, "").add_done_callback(_log_warm_up)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hash: str) -> bool:
+        return await self._run("verify", verify_password, password, hash)
+
+    async def _run(self, operation: str, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.max_pending:
+            PASSWORD_HASH_REJECTED.inc()
+            raise PasswordHasherBusy(f"{self._pending} password hash jobs pending")
+        self._pending += 1
+        self._report_depth()
+        started = time.perf_counter()
+        try:
+            if self._pool is None:
+                return await asyncio.to_thread(fn, *args)
+            pool = self._pool
+            try:
+                return await self._submit(pool, fn, *args)
+            except BrokenProcessPool as e:
+                logger.warning(f"Password hash pool broke, replacing it: {e}")
+                pool = self._replace(pool)
+            try:
+                return await self._submit(pool, fn, *args)
+            except BrokenProcessPool as e:
+                self._replace(pool)
+                raise PasswordHasherUnavailable(str(e)) from e
+        finally:
+            self._pending -= 1
+            self._report_depth()
+            PASSWORD_HASH_DURATION.labels(operation=operation).observe(
+                time.perf_counter() - started
+            )
+
+    async def _submit(
+        self, pool: ProcessPoolExecutor, fn: Callable[..., Any], *args: Any
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, fn, *args)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the API process already runs threads.
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _replace(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap in a new pool, once for all the jobs that saw `broken` fail."""
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+        return self._pool
+
+    def _report_depth(self) -> None:
+        PASSWORD_HASH_QUEUE_DEPTH.set(max(0, self._pending - self.workers))
+
+
+def _log_warm_up(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Password hash worker failed to start: {future.exception()}")
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,202 @@
+"""
+Token-bucket rate limits for expensive endpoints.
+
+Each limited route names a policy, "<requests>/<seconds>": a bucket holds
+up to <requests> tokens and refills at <requests> per <seconds>, so clients
+get a burst of that size and the same sustained rate. Buckets are per route
+and per client key (IP address, user or session) and live in Redis, updated
+by one Lua script so concurrent workers cannot overspend them.
+
+If Redis is unreachable, each worker falls back to buckets in its own
+memory. Clients can then get up to one full limit per worker.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, Response, status
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import RATE_LIMIT_DECISIONS
+from app.core.redis import RedisClient, redis_client
+from app.utils.security import decode_access_token
+
+# KEYS[1] bucket; ARGV capacity, refill tokens per millisecond, cost.
+# Returns {allowed, tokens left}; tokens go back as a string because Redis
+# truncates Lua numbers to integers.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    requests: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimitPolicy":
+        """Parse "<requests>/<seconds>", e.g. "10/60"."""
+        requests, _, seconds = spec.partition("/")
+        policy = cls(requests=int(requests), seconds=float(seconds or 1))
+        if policy.requests < 1 or policy.seconds <= 0:
+            raise ValueError(f"Invalid rate limit {spec!r}")
+        return policy
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.requests / self.seconds
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    tokens: float
+
+    def headers(self, policy: RateLimitPolicy) -> dict[str, str]:
+        """RateLimit-* headers, plus Retry-After when refused."""
+        headers = {
+            "RateLimit-Limit": str(policy.requests),
+            "RateLimit-Remaining": str(max(0, math.floor(self.tokens))),
+            "RateLimit-Reset": str(
+                math.ceil((policy.requests - self.tokens) / policy.refill_per_second)
+            ),
+            "RateLimit-Policy": f"{policy.requests};w={math.ceil(policy.seconds)}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(
+                max(1, math.ceil((1 - self.tokens) / policy.refill_per_second))
+            )
+        return headers
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        redis: RedisClient,
+        local_max_buckets: int = settings.RATE_LIMIT_LOCAL_MAX_BUCKETS,
+    ):
+        self.redis = redis
+        self.local_max_buckets = local_max_buckets
+        self._script = None
+        # Fallback buckets, key -> (tokens, monotonic time), oldest first.
+        self._local: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def hit(self, key: str, policy: RateLimitPolicy) -> RateLimitDecision:
+        """Take one token from the bucket at `key`, if it has one."""
+        try:
+            decision = await self._hit_redis(key, policy)
+            backend = "redis"
+        except (RuntimeError, RedisError) as e:
+            logger.debug(f"Rate limiter falling back to local buckets: {e}")
+            decision = self._hit_local(key, policy)
+            backend = "local"
+        RATE_LIMIT_DECISIONS.labels(
+            backend=backend, result="allowed" if decision.allowed else "limited"
+        ).inc()
+        return decision
+
+    async def _hit_redis(self, key: str, policy: RateLimitPolicy) -> RateLimitDecision:
+        client = self.redis.client
+        if self._script is None or self._script.registered_client is not client:
+            self._script = client.register_script(_TOKEN_BUCKET_LUA)
+        allowed, tokens = await self._script(
+            keys=[key],
+            args=[policy.requests, policy.refill_per_second / 1000, 1],
+        )
+        return RateLimitDecision(allowed=bool(int(allowed)), tokens=float(tokens))
+
+    def _hit_local(self, key: str, policy: RateLimitPolicy) -> RateLimitDecision:
+        now = time.monotonic()
+        tokens, last = self._local.pop(key, (policy.requests, now))
+        tokens = min(policy.requests, tokens + (now - last) * policy.refill_per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._local[key] = (tokens, now)
+        while len(self._local) > self.local_max_buckets:
+            self._local.popitem(last=False)
+        return RateLimitDecision(allowed=allowed, tokens=tokens)
+
+
+rate_limiter = RateLimiter(redis_client)
+
+
+class RateLimit:
+    """
+    Dependency limiting a route to `spec` requests per client.
+
+    `key` picks the client: "ip", "user" (the bearer token's user id) or
+    "session" (the session_id cookie); the last two fall back to the IP
+    address for requests without one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        spec: str,
+        key: str = "ip",
+        limiter: RateLimiter = rate_limiter,
+    ):
+        if key not in ("ip", "user", "session"):
+            raise ValueError(f"Unknown rate limit key {key!r}")
+        self.name = name
+        self.policy = RateLimitPolicy.parse(spec)
+        self.key = key
+        self.limiter = limiter
+
+    async def __call__(self, request: Request, response: Response) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        decision = await self.limiter.hit(
+            f"ratelimit:{self.name}:{self._client_key(request)}", self.policy
+        )
+        headers = decision.headers(self.policy)
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please retry later",
+                headers=headers,
+            )
+        response.headers.update(headers)
+
+    def _client_key(self, request: Request) -> str:
+        if self.key == "user":
+            scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    user_id = decode_access_token(token).get("sub")
+                except Exception:
+                    user_id = None
+                if user_id:
+                    return f"user:{user_id}"
+        elif self.key == "session":
+            session_id = request.cookies.get("session_id")
+            if session_id:
+                return f"session:{session_id}"
+        host = request.client.host if request.client else "unknown"
+        return f"ip:{host}"
@@ -67,10 +67,30 @@ class RedisClient:
         return await self.client.delete(key)
 
     async def delete_pattern(self, pattern: str) -> int:
-        keys = await self.client.keys(pattern)
-        if not keys:
-            return 0
-        return await self.client.delete(*keys)
+        # SCAN in batches rather than KEYS, which blocks Redis while it walks
+        # the whole keyspace; UNLINK frees the values off the main thread.
+        deleted = 0
+        batch: list[str] = []
+        async for key in self.client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await self.client.unlink(*batch)
+                batch.clear()
+        if batch:
+            deleted += await self.client.unlink(*batch)
+        return deleted
+
+    async def generation(self, name: str) -> int:
+        """Current generation of the cache `name`, see bump_generation."""
+        return int(await self.client.get(f"cache-generation:{name}") or 0)
+
+    async def bump_generation(self, *names: str) -> None:
+        """
+        Drop every entry of the named caches at once. Their keys embed the
+        generation, so older entries are never read again and just expire.
+        """
+        for name in names:
+            await self.client.incr(f"cache-generation:{name}")
 
 
 redis_client = RedisClient()
@@ -0,0 +1,109 @@
+"""
+Redis cache for Elasticsearch search responses.
+
+Keys embed a generation number kept in Redis. A reindex bumps it once,
+which orphans every cached response at the same time without scanning keys;
+orphaned entries simply expire. The short TTL bounds staleness from
+incremental index updates in between.
+
+Entries are kept in Redis for the much longer stale TTL, stamped with their
+write time: normal reads ignore anything older than the TTL, while degraded
+mode (Elasticsearch down) may still serve them.
+"""
+
+import hashlib
+import json
+import time
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import SEARCH_CACHE_REQUESTS
+from app.core.redis import RedisClient, redis_client
+
+
+class SearchCache:
+    GENERATION_KEY = "search:generation"
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        ttl: int = settings.SEARCH_CACHE_TTL_SECONDS,
+        stale_ttl: int = settings.SEARCH_CACHE_STALE_TTL_SECONDS,
+        generation_refresh: float = 1.0,
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        # The generation is re-read at most this often per worker, so a
+        # reindex reaches every worker within about a second.
+        self.generation_refresh = generation_refresh
+        self._generation: tuple[int, float] | None = None
+
+    async def key_for(self, index: str, body: dict, **params: Any) -> str | None:
+        """Cache key for a request, or None when Redis is unavailable."""
+        try:
+            generation = await self._current_generation()
+        except (RuntimeError, RedisError) as e:
+            logger.debug(f"Search cache unavailable: {e}")
+            return None
+        canonical = json.dumps(
+            {"body": body, "params": params}, sort_keys=True, separators=(",", ":")
+        )
+        digest = hashlib.sha256(canonical.encode()).hexdigest()
+        return f"search:{generation}:{index}:{digest}"
+
+    async def get(self, key: str) -> dict | None:
+        """A fresh (younger than ttl) cached response, if any."""
+        entry = await self._read(key)
+        fresh = entry is not None and time.time() - entry["at"] <= self.ttl
+        SEARCH_CACHE_REQUESTS.labels(result="hit" if fresh else "miss").inc()
+        return entry["value"] if fresh else None
+
+    async def get_stale(self, key: str) -> dict | None:
+        """A cached response of any age, for degraded mode."""
+        entry = await self._read(key)
+        if entry is None:
+            return None
+        SEARCH_CACHE_REQUESTS.labels(result="stale").inc()
+        return entry["value"]
+
+    async def set(self, key: str, value: dict) -> None:
+        try:
+            await self.redis.set_json(
+                key, {"at": time.time(), "value": value}, ex=self.stale_ttl
+            )
+        except (RuntimeError, RedisError) as e:
+            logger.debug(f"Search cache write failed: {e}")
+
+    async def _read(self, key: str) -> dict | None:
+        try:
+            entry = await self.redis.get_json(key)
+        except (RuntimeError, RedisError) as e:
+            logger.debug(f"Search cache read failed: {e}")
+            return None
+        return entry if isinstance(entry, dict) and "at" in entry else None
+
+    async def invalidate_all(self) -> None:
+        """Orphan every cached response, e.g. after the index alias moved."""
+        try:
+            generation = await self.redis.client.incr(self.GENERATION_KEY)
+        except (RuntimeError, RedisError) as e:
+            logger.warning(f"Could not invalidate the search cache: {e}")
+            return
+        self._generation = (generation, time.monotonic())
+        logger.info(f"Search cache generation is now {generation}")
+
+    async def _current_generation(self) -> int:
+        now = time.monotonic()
+        if self._generation and now - self._generation[1] < self.generation_refresh:
+            return self._generation[0]
+        value = await self.redis.client.get(self.GENERATION_KEY)
+        generation = int(value or 0)
+        self._generation = (generation, now)
+        return generation
+
+
+search_cache = SearchCache(redis_client)
@@ -0,0 +1,84 @@
+"""
+Cache of authenticated users, so auth does not read the database per request.
+
+get_current_user looks a user up here first: in this worker's memory, then
+in Redis under user:{id}. Writes to a user, their role or their addresses
+delete both copies through invalidate(). Other workers' memory cannot be
+reached from here, so it keeps entries for USER_CACHE_LOCAL_TTL_SECONDS
+only; that is how long such a change can take to show up everywhere.
+"""
+
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import USER_CACHE_REQUESTS
+from app.core.redis import RedisClient, redis_client
+from app.schema.user_schema import UserPublic
+
+
+class UserCache:
+    def __init__(
+        self,
+        redis: RedisClient,
+        ttl: int = settings.USER_CACHE_TTL_SECONDS,
+        local_ttl: float = settings.USER_CACHE_LOCAL_TTL_SECONDS,
+        local_max_entries: int = settings.USER_CACHE_LOCAL_MAX_ENTRIES,
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_max_entries = local_max_entries
+        # user id -> (expiry on the monotonic clock, user), oldest first.
+        self._local: OrderedDict[int, tuple[float, UserPublic]] = OrderedDict()
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"user:{user_id}"
+
+    async def get(self, user_id: int) -> UserPublic | None:
+        entry = self._local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            USER_CACHE_REQUESTS.labels(result="local").inc()
+            return entry[1]
+
+        try:
+            raw = await self.redis.client.get(self._key(user_id))
+        except (RuntimeError, RedisError) as e:
+            logger.debug(f"User cache read failed: {e}")
+            raw = None
+        if raw is None:
+            USER_CACHE_REQUESTS.labels(result="miss").inc()
+            return None
+        USER_CACHE_REQUESTS.labels(result="redis").inc()
+        user = UserPublic.model_validate_json(raw)
+        self._remember(user)
+        return user
+
+    async def set(self, user: UserPublic) -> None:
+        self._remember(user)
+        try:
+            await self.redis.client.set(
+                self._key(user.id), user.model_dump_json(), ex=self.ttl
+            )
+        except (RuntimeError, RedisError) as e:
+            logger.debug(f"User cache write failed: {e}")
+
+    async def invalidate(self, user_id: int) -> None:
+        self._local.pop(user_id, None)
+        try:
+            await self.redis.delete(self._key(user_id))
+        except (RuntimeError, RedisError) as e:
+            logger.warning(f"Could not invalidate cached user {user_id}: {e}")
+
+    def _remember(self, user: UserPublic) -> None:
+        self._local[user.id] = (time.monotonic() + self.local_ttl, user)
+        self._local.move_to_end(user.id)
+        while len(self._local) > self.local_max_entries:
+            self._local.popitem(last=False)
+
+
+user_cache = UserCache(redis_client)
@@ -0,0 +1,33 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.models.cache_version import CacheVersion
+
+CATEGORY_TREE = "category_tree"
+
+
+class CacheVersionCrud:
+    """Data access for cache version counters."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_version(self, name: str) -> int:
+        stmt = select(CacheVersion.version).where(CacheVersion.name == name)
+        return self.db.scalar(stmt) or 0
+
+    def bump(self, name: str) -> None:
+        """
+        Stage a version increment on the current session.
+
+        Like outbox events it does not commit, so the new version becomes
+        visible together with the change that made the cached view stale.
+        """
+        result = self.db.execute(
+            update(CacheVersion)
+            .where(CacheVersion.name == name)
+            .values(version=CacheVersion.version + 1)
+        )
+        if result.rowcount == 0:
+            self.db.add(CacheVersion(name=name, version=1))
+            self.db.flush()
@@ -1,14 +1,17 @@
 from typing import Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import delete, select, update
-from sqlalchemy.orm import Session, selectinload
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
 
 from app.core.exceptions import ProductException
 from app.crud.product import ProductCrud
 from app.models.cart import Cart
 from app.models.cart_item import CartItem
-from app.schema.cart_schema import CartItemCreate, CartItemUpdate
+from app.models.product import Product
 from app.core.logger import logger
 
 
@@ -17,23 +20,24 @@ class CartCrud:
         self.db = db
         self.prod_crud = ProductCrud(db)
 
-    def get_cart_by_user_id(self, user_id: int) -> Cart | None:
-        stmt = (
-            select(Cart)
-            .where(Cart.user_id == user_id)
-            .options(selectinload(Cart.cart_items).selectinload(CartItem.product))
+    def _touch(self, cart_id: int) -> None:
+        # Item writes count as cart activity for the anonymous cart purge.
+        self.db.execute(
+            update(Cart)
+            .where(Cart.id == cart_id)
+            .values(updated_at=func.current_timestamp())
         )
+
+    def get_cart_by_user_id(self, user_id: int) -> Cart | None:
+        # Items are read through get_cart_summary, not loaded here.
+        stmt = select(Cart).where(Cart.user_id == user_id)
         cart = self.db.scalar(stmt)
         if not cart:
             return None
         return cart
 
     def get_cart_by_session_id(self, session_id: int) -> Cart | None:
-        stmt = (
-            select(Cart)
-            .where(Cart.session_id == session_id)
-            .options(selectinload(Cart.cart_items).selectinload(CartItem.product))
-        )
+        stmt = select(Cart).where(Cart.session_id == session_id)
         cart = self.db.scalar(stmt)
         if not cart:
             return None
@@ -53,6 +57,43 @@ class CartCrud:
         self.db.refresh(cart)
         return cart
 
+    def get_cart_summary(self, cart_id: int):
+        """
+        Cart lines with their subtotals, plus the cart totals on every row.
+
+        One projection over cart items and product columns; no ORM entities
+        are loaded. Lines of inactive products are left out, as in the Redis
+        cart.
+        """
+        line_total = Product.price * CartItem.quantity
+        stmt = (
+            select(
+                CartItem.id,
+                CartItem.product_id,
+                CartItem.quantity,
+                Product.name.label("product_name"),
+                Product.price.label("unit_price"),
+                line_total.label("subtotal"),
+                func.sum(line_total).over().label("cart_subtotal"),
+                func.sum(CartItem.quantity).over().label("total_items"),
+            )
+            .join(Product, CartItem.product_id == Product.id)
+            .where(CartItem.cart_id == cart_id, Product.is_active == True)
+            .order_by(CartItem.id)
+        )
+        return self.db.execute(stmt).all()
+
+    def get_line_products(self, product_ids: list[int]):
+        """(id, name, price) of the active products among product_ids."""
+        if not product_ids:
+            return []
+        stmt = (
+            select(Product.id, Product.name, Product.price)
+            .where(Product.id.in_(product_ids), Product.is_active == True)
+            .order_by(Product.id)
+        )
+        return self.db.execute(stmt).all()
+
     def get_cart_item_by_product(self, cart_id: int, product_id: int):
         stmt = select(CartItem).where(
             CartItem.cart_id == cart_id, CartItem.product_id == product_id
@@ -74,6 +115,7 @@ class CartCrud:
         )
 
         updated = self.db.execute(stmt).scalar_one_or_none()
+        self._touch(cart_id)
         self.db.commit()
         return updated
 
@@ -82,10 +124,31 @@ class CartCrud:
     ) -> CartItem:
         new_item = CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
         self.db.add(new_item)
+        self._touch(cart_id)
         self.db.commit()
         self.db.refresh(new_item)
         return new_item
 
+    def upsert_items(self, cart_id: int, lines: dict[int, int]) -> None:
+        """Add `lines` (product_id -> quantity) to the cart in one statement."""
+        if not lines:
+            return
+        dialect = self.db.get_bind().dialect.name
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(CartItem).values(
+            [
+                {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+                for product_id, quantity in lines.items()
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+        )
+        self.db.execute(stmt)
+        self._touch(cart_id)
+        self.db.commit()
+
     def get_cart_item_by_cart_id(self, cart_id: int, item_id: int) -> CartItem:
         stmt = select(CartItem).where(
             CartItem.id == item_id, CartItem.cart_id == cart_id
@@ -95,14 +158,16 @@ class CartCrud:
             return None
         return result
 
-    def update_item(self, cart_id: int, item_id: int, data: CartItemUpdate) -> CartItem:
+    def update_item(self, cart_id: int, item_id: int, quantity: int) -> CartItem:
         stmt = (
             update(CartItem)
             .where(CartItem.id == item_id, CartItem.cart_id == cart_id)
-            .values(quantity=data.quantity)
+            .values(quantity=quantity)
             .returning(CartItem)
         )
         updated = self.db.execute(stmt).scalar_one_or_none()
+        if updated:
+            self._touch(cart_id)
         self.db.commit()
         return updated
 
@@ -113,6 +178,7 @@ class CartCrud:
         result = self.db.execute(stmt)
         if result.rowcount == 0:
             return False
+        self._touch(cart_id)
         self.db.commit()
         return True
 
@@ -134,3 +200,96 @@ class CartCrud:
         )
         self.db.execute(stmt).scalar_one_or_none()
         self.db.commit()
+
+    def merge_session_cart(self, user_id: int, session_id: str) -> None:
+        """Fold a session cart into the user's cart with set-based statements."""
+        anon_cart_id = self.db.scalar(
+            select(Cart.id).where(Cart.session_id == session_id)
+        )
+        if anon_cart_id is None:
+            return
+        user_cart_id = self.db.scalar(select(Cart.id).where(Cart.user_id == user_id))
+        if user_cart_id is None:
+            self.update_anon_cart_to_user_cart(user_id=user_id, session_id=session_id)
+            return
+
+        anon = aliased(CartItem)
+        anon_products = select(anon.product_id).where(anon.cart_id == anon_cart_id)
+        # Products in both carts: add the session quantity to the user's line.
+        self.db.execute(
+            update(CartItem)
+            .where(
+                CartItem.cart_id == user_cart_id,
+                CartItem.product_id.in_(anon_products),
+            )
+            .values(
+                quantity=CartItem.quantity
+                + select(anon.quantity)
+                .where(
+                    anon.cart_id == anon_cart_id,
+                    anon.product_id == CartItem.product_id,
+                )
+                .scalar_subquery()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        # The rest move over as they are.
+        user_products = select(anon.product_id).where(anon.cart_id == user_cart_id)
+        self.db.execute(
+            update(CartItem)
+            .where(
+                CartItem.cart_id == anon_cart_id,
+                CartItem.product_id.not_in(user_products),
+            )
+            .values(cart_id=user_cart_id)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.execute(delete(CartItem).where(CartItem.cart_id == anon_cart_id))
+        self.db.execute(delete(Cart).where(Cart.id == anon_cart_id))
+        self.db.commit()
+
+    def get_user_cart_lines(self, user_id: int) -> dict[int, int]:
+        """product_id -> quantity for the user's cart."""
+        stmt = (
+            select(CartItem.product_id, CartItem.quantity)
+            .join(Cart, CartItem.cart_id == Cart.id)
+            .where(Cart.user_id == user_id)
+        )
+        return {product_id: quantity for product_id, quantity in self.db.execute(stmt)}
+
+    def replace_user_cart_items(self, user_id: int, lines: dict[int, int]) -> None:
+        """Make the user's cart hold exactly `lines` (product_id -> quantity)."""
+        cart_id = self.db.scalar(select(Cart.id).where(Cart.user_id == user_id))
+        if cart_id is None:
+            if not lines:
+                return
+            cart = Cart(user_id=user_id)
+            self.db.add(cart)
+            self.db.flush()
+            cart_id = cart.id
+        self.db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        self.db.add_all(
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in lines.items()
+        )
+        self.db.commit()
+
+    def delete_expired_session_carts(self, cutoff: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` anonymous carts idle since before cutoff.
+
+        Callers loop until it returns less than `limit`, which keeps each
+        transaction, and the locks it holds, small.
+        """
+        cart_ids = self.db.scalars(
+            select(Cart.id)
+            .where(Cart.session_id.is_not(None), Cart.updated_at < cutoff)
+            .order_by(Cart.updated_at)
+            .limit(limit)
+        ).all()
+        if not cart_ids:
+            return 0
+        self.db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids)))
+        self.db.execute(delete(Cart).where(Cart.id.in_(cart_ids)))
+        self.db.commit()
+        return len(cart_ids)
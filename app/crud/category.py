@@ -1,9 +1,12 @@
 from pydantic import HttpUrl
 from sqlalchemy.orm import Session
 from app.core.exceptions import CategoryCreationError, CategoryUpdateError
-from app.models.category import Category
+from app.crud.cache_version import CATEGORY_TREE, CacheVersionCrud
+from app.models.category import Category, CategoryClosure
+from app.models.product import Product
 from app.schema.category_schema import CategoryPublic, CreateCategory, UpdateCategory
-from sqlalchemy import delete, select, update
+from sqlalchemy import delete, func, insert, literal, select, true, update
+from sqlalchemy.orm import aliased
 from sqlalchemy.exc import IntegrityError
 from app.core.logger import logger
 from app.utils.generate_slug import generate_slug
@@ -14,6 +17,7 @@ class CategoryCrud:
 
     def __init__(self, db: Session):
         self.db = db
+        self.versions = CacheVersionCrud(db)
 
     # create category
     # crud.py
@@ -31,6 +35,9 @@ class CategoryCrud:
             category_data["slug"] = slug
             category = Category(**category_data)
             self.db.add(category)
+            self.db.flush()
+            self._add_closure(category.id, category.parent_id)
+            self.versions.bump(CATEGORY_TREE)
             self.db.commit()
             self.db.refresh(category)
             return category
@@ -49,6 +56,11 @@ class CategoryCrud:
         stmt = select(Category).where(Category.slug == slug)
         return self.db.scalar(stmt)
 
+    def get_category_by_name(self, name: str) -> Category | None:
+        """Retrieve a category by its exact name."""
+        stmt = select(Category).where(Category.name == name)
+        return self.db.scalar(stmt)
+
     def update_category(self, id: int, update_dto: UpdateCategory) -> Category:
         """Partially update a category; returns the updated model."""
         try:
@@ -60,6 +72,13 @@ class CategoryCrud:
             if not update_data:
                 return self.get_category_by_id(id)
 
+            if "parent_id" in update_data:
+                current = self.get_category_by_id(id)
+                if current is None:
+                    return None
+                if current.parent_id != update_data["parent_id"]:
+                    self._move_subtree(id, update_data["parent_id"])
+
             stmt = (
                 update(Category)
                 .where(Category.id == id)
@@ -68,6 +87,8 @@ class CategoryCrud:
             )
 
             updated_category = self.db.execute(stmt).scalar_one_or_none()
+            if updated_category is not None:
+                self.versions.bump(CATEGORY_TREE)
             self.db.commit()
 
             # --- REMOVE THIS LINE ---
@@ -81,13 +102,111 @@ class CategoryCrud:
     # delete category
     def delete_category(self, id: int) -> bool:
         """Delete a category by id. Returns True if deleted else False."""
+        # Its subcategories stay, as roots of their own subtrees.
+        self._unlink_subtree(id, keep_root=False)
+        self.db.execute(
+            update(Category).where(Category.parent_id == id).values(parent_id=None)
+        )
         stmt = delete(Category).where(Category.id == id)
         result = self.db.execute(stmt)
         if result.rowcount == 0:
             return False
+        self.versions.bump(CATEGORY_TREE)
         self.db.commit()
         return True
 
+    def get_subtree_ids(self, id: int) -> list[int]:
+        """Ids of a category and every category below it."""
+        stmt = select(CategoryClosure.descendant_id).where(
+            CategoryClosure.ancestor_id == id
+        )
+        return list(self.db.scalars(stmt).all())
+
+    def _add_closure(self, id: int, parent_id: int | None) -> None:
+        """Link a new category to itself and to every ancestor of its parent."""
+        self.db.add(CategoryClosure(ancestor_id=id, descendant_id=id, depth=0))
+        if parent_id is not None:
+            ancestors = select(
+                CategoryClosure.ancestor_id, literal(id), CategoryClosure.depth + 1
+            ).where(CategoryClosure.descendant_id == parent_id)
+            self.db.execute(
+                insert(CategoryClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"], ancestors
+                )
+            )
+
+    def _unlink_subtree(self, id: int, keep_root: bool = True) -> list[int]:
+        """
+        Drop the links between a subtree and the categories above it (and,
+        unless keep_root, the subtree's root). Returns the subtree ids.
+        """
+        subtree = self.get_subtree_ids(id)
+        # Materialised first: MySQL can't delete from a table it selects from.
+        ancestors = list(
+            self.db.scalars(
+                select(CategoryClosure.ancestor_id).where(
+                    CategoryClosure.descendant_id == id
+                )
+            ).all()
+        )
+        if keep_root:
+            ancestors = [a for a in ancestors if a != id]
+        if subtree and ancestors:
+            self.db.execute(
+                delete(CategoryClosure).where(
+                    CategoryClosure.descendant_id.in_(subtree),
+                    CategoryClosure.ancestor_id.in_(ancestors),
+                )
+            )
+        return subtree
+
+    def _move_subtree(self, id: int, parent_id: int | None) -> None:
+        """Re-link a category and its descendants under a new parent."""
+        if parent_id is not None and parent_id in self.get_subtree_ids(id):
+            raise CategoryUpdateError(
+                "A category cannot be moved under its own subcategory"
+            )
+        self._unlink_subtree(id)
+        if parent_id is None:
+            return
+        above = aliased(CategoryClosure)
+        below = aliased(CategoryClosure)
+        # Every ancestor of the new parent times every node of the subtree.
+        links = (
+            select(
+                above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            )
+            .select_from(above)
+            .join(below, true())
+            .where(above.descendant_id == parent_id, below.ancestor_id == id)
+        )
+        self.db.execute(
+            insert(CategoryClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"], links
+            )
+        )
+
+    def get_product_counts(self) -> tuple[dict[int, int], dict[int, int]]:
+        """
+        Active product counts per category: ({id: own products},
+        {id: products in its whole subtree}).
+        """
+        active = Product.is_active == True
+        own_stmt = (
+            select(Product.category_id, func.count(Product.id))
+            .where(active, Product.category_id.is_not(None))
+            .group_by(Product.category_id)
+        )
+        subtree_stmt = (
+            select(CategoryClosure.ancestor_id, func.count(Product.id))
+            .join(Product, Product.category_id == CategoryClosure.descendant_id)
+            .where(active)
+            .group_by(CategoryClosure.ancestor_id)
+        )
+        own = {id: count for id, count in self.db.execute(own_stmt).all()}
+        subtree = {id: count for id, count in self.db.execute(subtree_stmt).all()}
+        return own, subtree
+
     def get_all_categories(self) -> list[Category]:
         """List all categories ordered by id."""
         stmt = select(Category).order_by(Category.id)
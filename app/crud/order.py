@@ -14,12 +14,14 @@ from app.core.exceptions import OrderException
 from app.models.user import User
 from app.utils.order_utils import generate_order_number, generate_trx_ref
 from app.crud.address import AddressCrud
+from app.crud.outbox import ORDER, PRODUCT, OutboxCrud
 
 
 class OrderCrud:
     def __init__(self, db: Session):
         self.db = db
         self.address_crud = AddressCrud(db=db)
+        self.outbox = OutboxCrud(db=db)
 
     def validate_address(self, user_id: int, address_id: int):
         address = self.address_crud.get_single_address(address_id)
@@ -82,6 +84,19 @@ class OrderCrud:
 
             # Reduce stock
             item.product.stock_quantity -= item.quantity
+            self.outbox.add_event(
+                PRODUCT,
+                item.product_id,
+                "product.stock_changed",
+                {
+                    "delta": -item.quantity,
+                    "stock_quantity": item.product.stock_quantity,
+                },
+            )
+
+        self.outbox.add_event(
+            ORDER, order.id, "order.created", {"status": order.status}
+        )
 
         # Clear cart
         for item in items:
@@ -217,6 +232,9 @@ class OrderCrud:
             )
 
         order.status = new_status
+        self.outbox.add_event(
+            ORDER, order.id, "order.status_changed", {"status": new_status}
+        )
         self.db.commit()
         self.db.refresh(order)
         return order
@@ -233,6 +251,9 @@ class OrderCrud:
 
         order.status = "shipped"
         order.shipped_at = shipped_at or datetime.now()
+        self.outbox.add_event(
+            ORDER, order.id, "order.status_changed", {"status": "shipped"}
+        )
         self.db.commit()
         self.db.refresh(order)
         return order
@@ -0,0 +1,187 @@
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.outbox import OutboxCursor, OutboxDelivery, OutboxEvent
+
+PRODUCT = "product"
+ORDER = "order"
+CATEGORY = "category"
+
+
+class OutboxCrud:
+    """Data access for the transactional outbox."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add_event(
+        self,
+        aggregate_type: str,
+        aggregate_id: int,
+        event_type: str,
+        payload: dict[str, Any] | None = None,
+    ) -> OutboxEvent:
+        """
+        Stage an event on the current session.
+
+        Does not commit: the event must become visible in the same transaction
+        as the change it describes, so the caller's commit persists both.
+        """
+        event = OutboxEvent(
+            aggregate_type=aggregate_type,
+            aggregate_id=aggregate_id,
+            event_type=event_type,
+            payload=payload or {},
+        )
+        self.db.add(event)
+        return event
+
+    def get_cursor(self, consumer: str) -> int:
+        """Id of the last event `consumer` has settled; 0 before its first pass."""
+        stmt = select(OutboxCursor.last_event_id).where(
+            OutboxCursor.consumer == consumer
+        )
+        return self.db.scalar(stmt) or 0
+
+    def get_events_after(self, event_id: int, limit: int = 100) -> list[OutboxEvent]:
+        """Events committed after `event_id`, in commit order."""
+        stmt = (
+            select(OutboxEvent)
+            .where(OutboxEvent.id > event_id)
+            .order_by(OutboxEvent.id)
+            .limit(limit)
+        )
+        return list(self.db.scalars(stmt).all())
+
+    def get_retries(
+        self, consumer: str, limit: int = 100
+    ) -> list[tuple[OutboxEvent, OutboxDelivery]]:
+        """Events `consumer` still owes, due or not, oldest first; no dead letters."""
+        stmt = (
+            select(OutboxEvent, OutboxDelivery)
+            .join(OutboxDelivery, OutboxDelivery.event_id == OutboxEvent.id)
+            .where(
+                OutboxDelivery.consumer == consumer, OutboxDelivery.dead_at.is_(None)
+            )
+            .order_by(OutboxEvent.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in self.db.execute(stmt).all()]
+
+    def get_entities_with_retries(
+        self, consumer: str, entities: Iterable[tuple[str, int]]
+    ) -> set[tuple[str, int]]:
+        """Which of `entities` have an event `consumer` still owes."""
+        entities = set(entities)
+        if not entities:
+            return set()
+        stmt = (
+            select(OutboxEvent.aggregate_type, OutboxEvent.aggregate_id)
+            .join(OutboxDelivery, OutboxDelivery.event_id == OutboxEvent.id)
+            .where(
+                OutboxDelivery.consumer == consumer,
+                OutboxDelivery.dead_at.is_(None),
+                tuple_(OutboxEvent.aggregate_type, OutboxEvent.aggregate_id).in_(
+                    entities
+                ),
+            )
+            .distinct()
+        )
+        return {tuple(row) for row in self.db.execute(stmt).all()}
+
+    def settle(
+        self,
+        consumer: str,
+        cursor: int | None,
+        delivered: Iterable[int],
+        failed: dict[int, tuple[str, datetime, bool]],
+        held: Iterable[int],
+    ) -> None:
+        """
+        Record one delivery pass of `consumer` in a single commit.
+
+        Delivered events drop their retry rows. Each failed event is
+        {id: (error, next attempt, dead)}, its attempts counted; held events
+        (behind a failure of the same entity) get a row due now if they have
+        none. The cursor then moves to `cursor`, past every event the pass read.
+        """
+        now = datetime.utcnow()
+        delivered = list(delivered)
+        if delivered:
+            self.db.execute(
+                delete(OutboxDelivery).where(
+                    OutboxDelivery.consumer == consumer,
+                    OutboxDelivery.event_id.in_(delivered),
+                )
+            )
+        for event_id, (error, next_attempt_at, dead) in failed.items():
+            row = self._delivery(consumer, event_id)
+            row.attempts += 1
+            row.last_error = error[:2000]
+            row.next_attempt_at = next_attempt_at
+            row.dead_at = now if dead else None
+        for event_id in held:
+            self._delivery(consumer, event_id)
+        if cursor is not None:
+            row = self.db.get(OutboxCursor, consumer)
+            if row is None:
+                self.db.add(OutboxCursor(consumer=consumer, last_event_id=cursor))
+            else:
+                row.last_event_id = max(row.last_event_id, cursor)
+        self.db.commit()
+
+    def _delivery(self, consumer: str, event_id: int) -> OutboxDelivery:
+        row = self.db.get(OutboxDelivery, (consumer, event_id))
+        if row is None:
+            row = OutboxDelivery(
+                consumer=consumer,
+                event_id=event_id,
+                attempts=0,
+                next_attempt_at=datetime.utcnow(),
+            )
+            self.db.add(row)
+        return row
+
+    def replay_dead_letters(self, consumer: str | None = None) -> int:
+        """Make dead-lettered events due again. Returns how many."""
+        stmt = (
+            update(OutboxDelivery)
+            .where(OutboxDelivery.dead_at.is_not(None))
+            .values(dead_at=None, attempts=0, next_attempt_at=datetime.utcnow())
+        )
+        if consumer is not None:
+            stmt = stmt.where(OutboxDelivery.consumer == consumer)
+        result = self.db.execute(stmt)
+        self.db.commit()
+        return result.rowcount
+
+    def delete_delivered_before(self, cutoff: datetime, consumers: list[str]) -> int:
+        """
+        Drop events older than cutoff that every one of `consumers` has
+        taken. Dead letters are kept for replay. Returns rows removed.
+        """
+        if not consumers:
+            return 0
+        cursors = dict(
+            self.db.execute(
+                select(OutboxCursor.consumer, OutboxCursor.last_event_id).where(
+                    OutboxCursor.consumer.in_(consumers)
+                )
+            ).all()
+        )
+        settled = min(cursors.get(c, 0) for c in consumers)
+        owed = select(OutboxDelivery.event_id).where(
+            OutboxDelivery.event_id == OutboxEvent.id
+        )
+        result = self.db.execute(
+            delete(OutboxEvent).where(
+                OutboxEvent.id <= settled,
+                OutboxEvent.created_at < cutoff,
+                ~owed.exists(),
+            )
+        )
+        self.db.commit()
+        return result.rowcount
@@ -1,15 +1,28 @@
 from pydantic import HttpUrl
-from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy import (
+    Integer,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    select,
+    true,
+    update,
+)
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.core.exceptions import ProductException
 from app.core.logger import logger
-from app.models.category import Category
+from app.crud.cache_version import CATEGORY_TREE, CacheVersionCrud
+from app.crud.outbox import PRODUCT, OutboxCrud
+from app.models.category import Category, CategoryClosure
 from app.models.product import Product
 from app.schema.admin_schema import BulkInventoryUpdateItem, BulkInventoryUpdateResponse
 from app.schema.common_schema import PaginatedResponse, PaginationLinks, PaginationMeta
 from app.schema.product_schema import ProductCreate, ProductResponse, ProductUpdate
+from app.schema.search_schema import PRICE_RANGES
 from app.utils.generate_slug import generate_sku, generate_slug
 from typing import List, Literal
 
@@ -20,6 +33,8 @@ allowed_sort_by = Literal["id", "price", "name", "created_at", "rating", "popula
 class ProductCrud:
     def __init__(self, db: Session):
         self.db = db
+        self.outbox = OutboxCrud(db)
+        self.versions = CacheVersionCrud(db)
 
     def create_product(self, create_dto: ProductCreate) -> Product:
         """Create a new product with generated slug and sku."""
@@ -39,6 +54,9 @@ class ProductCrud:
             product = Product(**create_data, slug=gen_slug, sku=gen_sku)
 
             self.db.add(product)
+            self.db.flush()
+            self.outbox.add_event(PRODUCT, product.id, "product.created")
+            self.versions.bump(CATEGORY_TREE)
             self.db.commit()
             self.db.refresh(product)
             return product
@@ -73,6 +91,7 @@ class ProductCrud:
         availability: str | None = "all",
         sort_by: allowed_sort_by | None = "id",
         sort_order: allowed_sort_order = "asc",
+        include_subcategories: bool = False,
     ) -> PaginatedResponse[ProductResponse]:
         """
         List all products with advanced filtering and sorting.
@@ -88,6 +107,7 @@ class ProductCrud:
             availability: Filter by stock ('all', 'in_stock', 'out_of_stock')
             sort_by: Field to sort by
             sort_order: Sort direction ('asc' or 'desc')
+            include_subcategories: Let category_id match its whole subtree
         """
         logger.info(f"page: {page} - per_page: {per_page}")
         logger.info(
@@ -98,36 +118,17 @@ class ProductCrud:
         per_page = max(min(per_page, 100), 1)
 
         # Base query - only active products
-        stmt = select(Product).where(Product.is_active == True)
-
-        # Search filter (case-insensitive full-text search)
-        if search:
-            search_pattern = f"%{search}%"
-            stmt = stmt.where(
-                Product.name.ilike(search_pattern)
-                | Product.description.ilike(search_pattern)
+        stmt = select(Product).where(
+            *self._listing_filters(
+                search,
+                category_id,
+                min_price,
+                max_price,
+                min_rating,
+                availability,
+                include_subcategories,
             )
-
-        # Category filter
-        if category_id:
-            stmt = stmt.where(Product.category_id == category_id)
-
-        # Price range filters
-        if min_price is not None:
-            stmt = stmt.where(Product.price >= min_price)
-        if max_price is not None:
-            stmt = stmt.where(Product.price <= max_price)
-
-        # Rating filter (using hybrid property)
-        if min_rating is not None:
-            stmt = stmt.where(Product.average_rating >= min_rating)
-
-        # Availability filter
-        if availability == "in_stock":
-            stmt = stmt.where(Product.in_stock == True)
-        elif availability == "out_of_stock":
-            stmt = stmt.where(Product.in_stock == False)
-        # 'all' - no filter needed
+        )
 
         # Sorting
         from app.models.order_item import OrderItem
@@ -160,6 +161,220 @@ class ProductCrud:
         offset = (page - 1) * per_page
         items = self.db.scalars(stmt.offset(offset).limit(per_page)).all()
 
+        return self.build_page(
+            items,
+            total_items,
+            page,
+            per_page,
+            search,
+            category_id,
+            min_price,
+            max_price,
+            min_rating,
+            availability,
+            sort_by,
+            sort_order,
+            include_subcategories,
+        )
+
+    @staticmethod
+    def _listing_filters(
+        search: str | None = None,
+        category_id: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        availability: str | None = "all",
+        include_subcategories: bool = False,
+    ) -> list:
+        """WHERE clauses shared by the listing and its facet counts."""
+        # Only active products
+        filters = [Product.is_active == True]
+
+        # Search filter (case-insensitive full-text search)
+        if search:
+            search_pattern = f"%{search}%"
+            filters.append(
+                Product.name.ilike(search_pattern)
+                | Product.description.ilike(search_pattern)
+            )
+
+        # Category filter; a subtree is one indexed lookup in the closure table
+        if category_id and include_subcategories:
+            filters.append(
+                Product.category_id.in_(
+                    select(CategoryClosure.descendant_id).where(
+                        CategoryClosure.ancestor_id == category_id
+                    )
+                )
+            )
+        elif category_id:
+            filters.append(Product.category_id == category_id)
+
+        # Price range filters
+        if min_price is not None:
+            filters.append(Product.price >= min_price)
+        if max_price is not None:
+            filters.append(Product.price <= max_price)
+
+        # Rating filter (using hybrid property)
+        if min_rating is not None:
+            filters.append(Product.average_rating >= min_rating)
+
+        # Availability filter
+        if availability == "in_stock":
+            filters.append(Product.in_stock == True)
+        elif availability == "out_of_stock":
+            filters.append(Product.in_stock == False)
+        # 'all' - no filter needed
+
+        return filters
+
+    def get_listing_facets(
+        self,
+        search: str | None = None,
+        category_id: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        availability: str | None = "all",
+        include_subcategories: bool = False,
+    ) -> dict:
+        """
+        Category, price, rating and availability counts for a listing.
+
+        One grouped query counts products per (category, price bucket,
+        rating bucket, stock) cell, with whether the cell passes the price
+        and rating filters as part of the key; only the search filter is
+        applied in SQL. Each facet is then summed from the cells with every
+        filter but its own, as the Elasticsearch facets are.
+        """
+        price_bucket = case(
+            *[
+                (Product.price < hi, key)
+                for key, _, hi in PRICE_RANGES
+                if hi is not None
+            ],
+            else_=PRICE_RANGES[-1][0],
+        )
+        # Whole stars: 4.6 counts towards "4 and up".
+        rating_bucket = cast(Product.average_rating, Integer)
+        in_price, in_rating = [true()], [true()]
+        if min_price is not None:
+            in_price.append(Product.price >= min_price)
+        if max_price is not None:
+            in_price.append(Product.price <= max_price)
+        if min_rating is not None:
+            in_rating.append(Product.average_rating >= min_rating)
+        cells = (
+            select(
+                Product.category_id.label("category_id"),
+                Category.name.label("category_name"),
+                price_bucket.label("price_bucket"),
+                rating_bucket.label("rating_bucket"),
+                Product.in_stock.label("in_stock"),
+                and_(*in_price).label("in_price"),
+                and_(*in_rating).label("in_rating"),
+            )
+            .outerjoin(Category, Product.category_id == Category.id)
+            .where(*self._listing_filters(search))
+            .subquery()
+        )
+        key = [column for column in cells.c]
+        stmt = select(*key, func.count()).group_by(*key)
+        rows = self.db.execute(stmt).all()
+
+        selected = {category_id}
+        if category_id and include_subcategories:
+            selected = set(
+                self.db.scalars(
+                    select(CategoryClosure.descendant_id).where(
+                        CategoryClosure.ancestor_id == category_id
+                    )
+                ).all()
+            )
+
+        def in_category(row) -> bool:
+            return not category_id or row.category_id in selected
+
+        def in_availability(row) -> bool:
+            if availability == "in_stock":
+                return bool(row.in_stock)
+            if availability == "out_of_stock":
+                return not row.in_stock
+            return True
+
+        categories: dict[int | None, dict] = {}
+        stock = {"in_stock": 0, "out_of_stock": 0}
+        prices = {key: 0 for key, _, _ in PRICE_RANGES}
+        ratings = {stars: 0 for stars in (4, 3, 2, 1)}
+        for row in rows:
+            count = row[-1]
+            in_price, in_rating = bool(row.in_price), bool(row.in_rating)
+            if in_availability(row) and in_price and in_rating:
+                bucket = categories.setdefault(
+                    row.category_id,
+                    {
+                        "category_id": row.category_id,
+                        "name": row.category_name,
+                        "count": 0,
+                    },
+                )
+                bucket["count"] += count
+            if not in_category(row):
+                continue
+            if in_price and in_rating:
+                stock["in_stock" if row.in_stock else "out_of_stock"] += count
+            if not in_availability(row):
+                continue
+            if in_rating:
+                prices[row.price_bucket] += count
+            if not in_price:
+                continue
+            for stars in ratings:
+                if row.rating_bucket is not None and row.rating_bucket >= stars:
+                    ratings[stars] += count
+
+        return {
+            "categories": sorted(
+                categories.values(), key=lambda b: (-b["count"], b["name"] or "")
+            ),
+            "price_ranges": [
+                {"key": key, "from_price": lo, "to_price": hi, "count": prices[key]}
+                for key, lo, hi in PRICE_RANGES
+            ],
+            "ratings": [
+                {"min_rating": stars, "count": count}
+                for stars, count in ratings.items()
+            ],
+            "availability": stock,
+        }
+
+    def build_page(
+        self,
+        items: list[Product],
+        total_items: int,
+        page: int,
+        per_page: int,
+        search: str | None = None,
+        category_id: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        availability: str | None = "all",
+        sort_by: allowed_sort_by | None = "id",
+        sort_order: allowed_sort_order = "asc",
+        include_subcategories: bool = False,
+        path: str = "/products",
+        next_cursor: str | None = None,
+    ) -> PaginatedResponse[ProductResponse]:
+        """
+        Wrap one page of products with pagination meta and HATEOAS links.
+
+        With next_cursor (keyset pagination) the `next` link carries the
+        cursor instead of a page number.
+        """
+        offset = (page - 1) * per_page
         total_pages = (total_items + per_page - 1) // per_page
         from_item = offset + 1 if items else None
         to_item = offset + len(items) if items else None
@@ -171,15 +386,18 @@ class ProductCrud:
             total_items=total_items,
             from_item=from_item,
             to_item=to_item,
+            next_cursor=next_cursor,
         )
 
         # Build query string for HATEOAS links
-        base = "/products"
+        base = path
         query_params = []
         if search:
             query_params.append(f"search={search}")
         if category_id:
             query_params.append(f"category_id={category_id}")
+        if include_subcategories:
+            query_params.append("include_subcategories=true")
         if min_price is not None:
             query_params.append(f"min_price={min_price}")
         if max_price is not None:
@@ -206,7 +424,9 @@ class ProductCrud:
                 else None
             ),
             next=(
-                f"{base_with_params}page={page + 1}&per_page={per_page}"
+                f"{base_with_params}cursor={next_cursor}&per_page={per_page}"
+                if next_cursor
+                else f"{base_with_params}page={page + 1}&per_page={per_page}"
                 if page < total_pages
                 else None
             ),
@@ -218,21 +438,113 @@ class ProductCrud:
             links=links,
         )
 
-    def get_products_by_category_id(self, category_id: int) -> list[Product]:
+    def get_products_by_ids(self, ids: list[int]) -> list[Product]:
+        """Active products with the given ids, in the order of `ids`."""
+        if not ids:
+            return []
+        stmt = select(Product).where(Product.id.in_(ids), Product.is_active == True)
+        by_id = {p.id: p for p in self.db.scalars(stmt).all()}
+        return [by_id[i] for i in ids if i in by_id]
+
+    @staticmethod
+    def _response_columns() -> list:
+        """ProductResponse fields as columns, ratings included, so pages need no per-row queries."""
+        return [
+            Product.id,
+            Product.name,
+            Product.description,
+            Product.price,
+            Product.stock_quantity,
+            Product.image_url,
+            Product.category_id,
+            Product.is_active,
+            Product.created_at,
+            Product.slug,
+            Product.sku,
+            func.round(Product.average_rating, 2).label("average_rating"),
+            Product.review_count.label("review_count"),
+            Product.in_stock.label("in_stock"),
+        ]
+
+    def get_category_products_page(
+        self,
+        slug: str,
+        page: int = 1,
+        per_page: int = 20,
+        after_id: int | None = None,
+        include_subcategories: bool = False,
+        count: bool = True,
+    ) -> tuple[list[dict], bool, int | None]:
+        """
+        One page of a category's active products, projected to response
+        fields, in id order.
+
+        With after_id the page starts after that product (keyset pagination)
+        and `page` is ignored. Returns (rows, whether more rows follow,
+        total in the category); the total is only counted if `count` is set.
+        """
+        if include_subcategories:
+            membership = (
+                select(CategoryClosure.descendant_id)
+                .join(Category, CategoryClosure.ancestor_id == Category.id)
+                .where(Category.slug == slug)
+            )
+            in_category = Product.category_id.in_(membership)
+        else:
+            in_category = Product.category_id == (
+                select(Category.id).where(Category.slug == slug).scalar_subquery()
+            )
+
+        # Filter, order and limit in one select, so a page only reads (and
+        # computes ratings for) its own rows however deep the cursor is. One
+        # row past the page tells whether another page follows.
         stmt = (
-            select(Product)
-            .where(Product.category_id == category_id)
+            select(*self._response_columns())
+            .where(in_category, Product.is_active == True)
             .order_by(Product.id)
+            .limit(per_page + 1)
         )
+        if after_id is not None:
+            stmt = stmt.where(Product.id > after_id)
+        else:
+            stmt = stmt.offset((page - 1) * per_page)
+        items = [dict(row) for row in self.db.execute(stmt).mappings()]
+
+        total = None
+        if count:
+            # A separate aggregate that only reads the ids.
+            total = self.db.scalar(
+                select(func.count()).where(in_category, Product.is_active == True)
+            )
+        return items[:per_page], len(items) > per_page, total
+
+    def get_products_by_category_id(
+        self, category_id: int, include_subcategories: bool = False
+    ) -> list[Product]:
+        stmt = select(Product).order_by(Product.id)
+        if include_subcategories:
+            stmt = stmt.join(
+                CategoryClosure, Product.category_id == CategoryClosure.descendant_id
+            ).where(CategoryClosure.ancestor_id == category_id)
+        else:
+            stmt = stmt.where(Product.category_id == category_id)
         return self.db.scalars(stmt).all()
 
-    def get_products_by_category_slug(self, slug: str) -> list[Product]:
-        stmt = (
-            select(Product)
-            .join(Category, Product.category_id == Category.id)
-            .where(Category.slug == slug)
-            .order_by(Product.id)
-        )
+    def get_products_by_category_slug(
+        self, slug: str, include_subcategories: bool = False
+    ) -> list[Product]:
+        if include_subcategories:
+            stmt = (
+                select(Product)
+                .join(
+                    CategoryClosure,
+                    Product.category_id == CategoryClosure.descendant_id,
+                )
+                .join(Category, CategoryClosure.ancestor_id == Category.id)
+            )
+        else:
+            stmt = select(Product).join(Category, Product.category_id == Category.id)
+        stmt = stmt.where(Category.slug == slug).order_by(Product.id)
         return self.db.scalars(stmt).all()
 
     def update_product(self, id: int, update_dto: ProductUpdate) -> Product | None:
@@ -257,6 +569,16 @@ class ProductCrud:
             )
 
             updated = self.db.execute(stmt).scalar_one_or_none()
+            if updated is not None:
+                self.outbox.add_event(
+                    PRODUCT,
+                    id,
+                    "product.updated",
+                    {"fields": sorted(update_data.keys())},
+                )
+                # The category tree carries product counts.
+                if update_data.keys() & {"category_id", "is_active"}:
+                    self.versions.bump(CATEGORY_TREE)
             self.db.commit()
             return updated
         except IntegrityError as e:
@@ -269,16 +591,21 @@ class ProductCrud:
         result = self.db.execute(stmt)
         if result.rowcount == 0:
             return False
+        self.outbox.add_event(PRODUCT, id, "product.deleted")
+        self.versions.bump(CATEGORY_TREE)
         self.db.commit()
         return True
 
-    def get_product_suggestions(self, query: str, limit: int = 10) -> list[str]:
+    def get_product_suggestions(
+        self, query: str, limit: int = 10, category: str | None = None
+    ) -> list[str]:
         """
         Get product name suggestions for autocomplete.
 
         Args:
             query: Search query (minimum 2 characters)
             limit: Maximum number of suggestions (default 10)
+            category: Only suggest products in the category with this name
 
         Returns:
             List of product names matching the query
@@ -289,13 +616,15 @@ class ProductCrud:
         search_pattern = f"{query}%"  # Prefix matching
         contains_pattern = f"%{query}%"  # Contains matching
 
+        base = select(Product.name).where(Product.is_active == True)
+        if category:
+            base = base.join(Category, Product.category_id == Category.id).where(
+                Category.name == category
+            )
+
         # Get products that start with the query (higher priority)
         stmt_prefix = (
-            select(Product.name)
-            .where(Product.is_active == True)
-            .where(Product.name.ilike(search_pattern))
-            .distinct()
-            .limit(limit)
+            base.where(Product.name.ilike(search_pattern)).distinct().limit(limit)
         )
 
         prefix_matches = self.db.scalars(stmt_prefix).all()
@@ -307,9 +636,7 @@ class ProductCrud:
         # Otherwise, get additional matches that contain the query
         remaining = limit - len(prefix_matches)
         stmt_contains = (
-            select(Product.name)
-            .where(Product.is_active == True)
-            .where(Product.name.ilike(contains_pattern))
+            base.where(Product.name.ilike(contains_pattern))
             .where(~Product.name.ilike(search_pattern))  # Exclude prefix matches
             .distinct()
             .limit(remaining)
@@ -325,9 +652,16 @@ class ProductCrud:
             update(Product)
             .where(Product.id == product_id)
             .values(stock_quantity=Product.stock_quantity - item_quantity)
-            .returning(Product.id)
+            .returning(Product.stock_quantity)
         )
-        self.db.execute(stmt).scalar_one_or_none()
+        stock = self.db.execute(stmt).scalar_one_or_none()
+        if stock is not None:
+            self.outbox.add_event(
+                PRODUCT,
+                product_id,
+                "product.stock_changed",
+                {"delta": -item_quantity, "stock_quantity": stock},
+            )
 
     def get_total_products(self):
         total_products = self.db.query(func.count(Product.id)).scalar() or 0
@@ -393,7 +727,14 @@ class ProductCrud:
                 failed_products.append(update.product_id)
                 continue
 
+            delta = update.stock_quantity - (product.stock_quantity or 0)
             product.stock_quantity = update.stock_quantity
+            self.outbox.add_event(
+                PRODUCT,
+                product.id,
+                "product.stock_changed",
+                {"delta": delta, "stock_quantity": update.stock_quantity},
+            )
             updated_count += 1
 
         self.db.commit()
@@ -5,7 +5,6 @@ from sqlalchemy.orm import Session
 from pydantic import EmailStr
 from typing import Optional
 from app.schema.user_schema import CreateUserSchema, UpdateUserSchema
-from app.utils.security import hash_password
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException, status
 
@@ -14,15 +13,16 @@ class UserCrud:
     def __init__(self, db: Session):
         self.db = db
 
-    def create_user(self, user_create_data: CreateUserSchema) -> User:
+    def create_user(
+        self, user_create_data: CreateUserSchema, password_hash: str
+    ) -> User:
         """
-        Create a new user
+        Create a new user with an already hashed password
         """
         try:
-            hashed_password = hash_password(user_create_data.password)
             db_user = User(
                 **user_create_data.model_dump(exclude={"password"}),
-                password_hash=hashed_password,
+                password_hash=password_hash,
             )
             self.db.add(db_user)
             self.db.commit()
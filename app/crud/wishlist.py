@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
+from sqlalchemy import and_, delete, func, select
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from typing import Optional
 
 from app.models.wishlist import Wishlist
 from app.models.product import Product
@@ -35,25 +35,36 @@ class WishlistCrud:
         Remove a product from user's wishlist
         Returns True if removed, False if not found
         """
-        stmt = select(Wishlist).where(
-            and_(Wishlist.user_id == user_id, Wishlist.product_id == product_id)
+        result = self.db.execute(
+            delete(Wishlist).where(
+                and_(Wishlist.user_id == user_id, Wishlist.product_id == product_id)
+            )
         )
-        wishlist_item = self.db.scalar(stmt)
-
-        if wishlist_item:
-            self.db.delete(wishlist_item)
-            self.db.commit()
-            return True
-        return False
+        self.db.commit()
+        return result.rowcount > 0
 
-    def get_user_wishlist(self, user_id: int) -> List[Wishlist]:
-        """Get all wishlist items for a user"""
+    def get_user_wishlist(self, user_id: int):
+        """
+        Wishlist rows joined with the product columns the response needs,
+        newest first, in one query.
+        """
         stmt = (
-            select(Wishlist)
+            select(
+                Wishlist.id,
+                Wishlist.created_at.label("added_at"),
+                Product.id.label("product_id"),
+                Product.name.label("product_name"),
+                Product.slug.label("product_slug"),
+                Product.price.label("product_price"),
+                Product.image_url.label("product_image_url"),
+                Product.stock_quantity.label("product_stock_quantity"),
+                Product.is_active.label("product_is_active"),
+            )
+            .join(Product, Wishlist.product_id == Product.id)
             .where(Wishlist.user_id == user_id)
             .order_by(Wishlist.created_at.desc())
         )
-        return list(self.db.scalars(stmt).all())
+        return self.db.execute(stmt).all()
 
     def is_in_wishlist(self, user_id: int, product_id: int) -> bool:
         """Check if a product is in user's wishlist"""
@@ -62,25 +73,28 @@ class WishlistCrud:
         )
         return self.db.scalar(stmt) is not None
 
+    def get_product_ids(self, user_id: int) -> list[int]:
+        """Ids of every product in the user's wishlist"""
+        stmt = select(Wishlist.product_id).where(Wishlist.user_id == user_id)
+        return list(self.db.scalars(stmt).all())
+
     def get_wishlist_count(self, user_id: int) -> int:
         """Get count of items in user's wishlist"""
-        stmt = select(Wishlist).where(Wishlist.user_id == user_id)
-        return len(list(self.db.scalars(stmt).all()))
+        stmt = (
+            select(func.count())
+            .select_from(Wishlist)
+            .where(Wishlist.user_id == user_id)
+        )
+        return self.db.scalar(stmt)
 
     def clear_wishlist(self, user_id: int) -> int:
         """
         Clear all items from user's wishlist
         Returns number of items removed
         """
-        stmt = select(Wishlist).where(Wishlist.user_id == user_id)
-        items = list(self.db.scalars(stmt).all())
-        count = len(items)
-
-        for item in items:
-            self.db.delete(item)
-
+        result = self.db.execute(delete(Wishlist).where(Wishlist.user_id == user_id))
         self.db.commit()
-        return count
+        return result.rowcount
 
     def get_wishlist_item(self, user_id: int, product_id: int) -> Optional[Wishlist]:
         """Get a specific wishlist item"""
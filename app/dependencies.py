@@ -5,9 +5,13 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
-from app.core.elastic_config import get_es_client
+from app.core.config import settings
+from app.core.elastic_config import get_connected_es_client
 from app.core.logger import *
+from app.core.rate_limit import RateLimit
 from app.core.redis import RedisClient, redis_client
+from app.core.search_cache import search_cache
+from app.core.user_cache import user_cache
 from app.db.database import SessionLocal
 from app.models.user import User
 from app.schema.user_schema import UserPublic
@@ -20,6 +24,7 @@ from app.services.payment_service import PaymentService
 from app.services.product_service import ProductService
 from app.services.review_service import ReviewService
 from app.services.user_service import UserService
+from app.services.wishlist_service import WishlistService
 from app.utils.security import TokenError, decode_access_token
 
 oauth_scheme = HTTPBearer(
@@ -28,6 +33,12 @@ oauth_scheme = HTTPBearer(
     description="JWT Access Token in the Authorization header",
 )
 
+login_rate_limit = RateLimit("login", settings.RATE_LIMIT_LOGIN, key="ip")
+autocomplete_rate_limit = RateLimit(
+    "autocomplete", settings.RATE_LIMIT_AUTOCOMPLETE, key="ip"
+)
+checkout_rate_limit = RateLimit("checkout", settings.RATE_LIMIT_CHECKOUT, key="user")
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -44,32 +55,51 @@ async def get_redis_manager() -> RedisClient:
     return redis_client
 
 
-async def get_elastic_manager() -> AsyncElasticsearch:
-    return await get_es_client()
+async def get_elastic_manager() -> AsyncElasticsearch | None:
+    """
+    The connected Elasticsearch client, or None.
+
+    Never waits on a connection attempt: the app connects in the background
+    and ElasticService fails fast (or degrades) while there is no client.
+    """
+    return get_connected_es_client()
+
+
+async def get_optional_elastic_service() -> ElasticService | None:
+    """
+    ElasticService when Elasticsearch is already connected, otherwise None.
+
+    For endpoints that go straight to the database when there is no cluster.
+    """
+    es = get_connected_es_client()
+    return ElasticService(es=es, cache=search_cache) if es is not None else None
 
 
 def get_user_service_dep(db: Session = Depends(get_db)) -> UserService:
     """
     User service dependency
     """
-    return UserService(db=db)
+    return UserService(db=db, cache=user_cache)
 
 
 def get_elastic_service_dep(
-    es: Annotated[AsyncElasticsearch, Depends(get_elastic_manager)],
+    es: Annotated[AsyncElasticsearch | None, Depends(get_elastic_manager)],
 ) -> ElasticService:
-    return ElasticService(es=es)
+    return ElasticService(es=es, cache=search_cache)
 
 
 def get_address_service_dep(db: Session = Depends(get_db)) -> AddressService:
     """
     Address service dependency
     """
-    return AddressService(db=db)
+    return AddressService(db=db, cache=user_cache)
 
 
-def get_category_service_dep(db: Session = Depends(get_db)) -> CategoryService:
-    return CategoryService(db=db)
+def get_category_service_dep(
+    db: Annotated[Session, Depends(get_db)],
+    redis_client: Annotated[RedisClient, Depends(get_redis_manager)],
+) -> CategoryService:
+    return CategoryService(db=db, redis=redis_client)
 
 
 def get_product_service_dep(
@@ -79,8 +109,18 @@ def get_product_service_dep(
     return ProductService(db=db, redis=redis_client)
 
 
-def get_cart_service_dep(db: Annotated[Session, Depends(get_db)]) -> CartService:
-    return CartService(db=db)
+def get_cart_service_dep(
+    db: Annotated[Session, Depends(get_db)],
+    redis_client: Annotated[RedisClient, Depends(get_redis_manager)],
+) -> CartService:
+    return CartService(db=db, redis=redis_client)
+
+
+def get_wishlist_service_dep(
+    db: Annotated[Session, Depends(get_db)],
+    redis_client: Annotated[RedisClient, Depends(get_redis_manager)],
+) -> WishlistService:
+    return WishlistService(db=db, redis=redis_client)
 
 
 def get_order_service_dep(db: Annotated[Session, Depends(get_db)]) -> OrderService:
@@ -95,6 +135,15 @@ def get_payment_service_dep(db: Annotated[Session, Depends(get_db)]) -> PaymentS
     return PaymentService(db=db)
 
 
+async def _load_user(user_service: UserService, user_id: int) -> UserPublic:
+    """The user from the user cache, read from the database on a miss."""
+    user = await user_cache.get(user_id)
+    if user is None:
+        user = UserPublic.model_validate(user_service.get_user_by_id(id=user_id))
+        await user_cache.set(user)
+    return user
+
+
 async def get_current_user(
     user_service: Annotated[UserService, Depends(get_user_service_dep)],
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(oauth_scheme)],
@@ -122,8 +171,7 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        user = user_service.get_user_by_id(id=int(user_id))
-        return UserPublic.model_validate(user)
+        return await _load_user(user_service, int(user_id))
 
     except TokenError as e:
         raise HTTPException(
@@ -157,9 +205,26 @@ async def get_optional_user(
         if not user_id:
             return None
 
-        user = user_service.get_user_by_id(id=int(user_id))
-        return UserPublic.model_validate(user)
+        return await _load_user(user_service, int(user_id))
 
     except Exception:
         return None
         return None
+
+
+async def get_optional_user_id(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(oauth_scheme)],
+) -> Optional[int]:
+    """
+    The user id from a valid token, or None.
+
+    Unlike get_optional_user it does not load the user, for endpoints that
+    only personalise a response.
+    """
+    if not credentials:
+        return None
+    try:
+        user_id = decode_access_token(credentials.credentials).get("sub")
+        return int(user_id) if user_id else None
+    except Exception:
+        return None
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
@@ -11,6 +12,7 @@ from app.api.v1.init_routes import init_routes
 from app.api.v1.routes import cart, category, healthcheck, product, user
 from app.core.elastic_config import close_es_client, get_es_client
 from app.core.logger import logger
+from app.core.password_hasher import password_hasher
 
 from prometheus_fastapi_instrumentator import Instrumentator
 from opentelemetry import trace
@@ -23,26 +25,69 @@ from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 # from app.core.otel_config import setup_otel
 from app.core.redis import redis_client
 from app.middleware.request_logger import LoggingMiddleware
-from app.utils.es_utils import bulk_index_products, create_product_index
+from app.core.config import settings
+from app.services.autocomplete_index import AutocompleteIndexSync
+from app.services.catalog_index import CatalogIndexSync
+from app.services.product_change_listener import run_product_change_listener
+from app.utils.es_utils import ensure_product_index, sync_changed_products
 from app.utils.seed import seed_product
 
 
+async def sync_search_index(client) -> None:
+    """Bring the product index up to date without blocking startup."""
+    try:
+        await ensure_product_index(client)
+        await sync_changed_products(client)
+    except Exception as e:
+        logger.warning(f"Incremental Elasticsearch sync failed: {e}")
+
+
+async def connect_search_index() -> None:
+    """
+    Connect to Elasticsearch in the background, retrying until it is up.
+
+    Requests never wait on this: until it succeeds search is served in
+    degraded mode (cached results or the database).
+    """
+    while True:
+        try:
+            client = await get_es_client()
+            break
+        except Exception as e:
+            logger.warning(
+                f"Failed to initialize Elasticsearch client: {e}. "
+                f"Retrying in {settings.ELASTIC_RECONNECT_SECONDS}s."
+            )
+            await asyncio.sleep(settings.ELASTIC_RECONNECT_SECONDS)
+    logger.info("Elasticsearch client initialized successfully")
+    # Full rebuilds are an explicit operation (POST /elastic/reindex or
+    # `python -m app.utils.es_utils rebuild`); boot only catches up.
+    await sync_search_index(client)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # setup_otel()
     await redis_client.connect()
-    try:
-        client = await get_es_client()
-        logger.info("Elasticsearch client initialized successfully")
-    except Exception as e:
-        logger.warning(
-            f"Failed to initialize Elasticsearch client: {e}. App will continue without ES."
+    password_hasher.start()
+    local_indexes = []
+    if settings.AUTOCOMPLETE_INDEX_ENABLED:
+        local_indexes.append(AutocompleteIndexSync())
+    if settings.CATALOG_INDEX_ENABLED:
+        local_indexes.append(CatalogIndexSync())
+    listener_task = None
+    if local_indexes:
+        listener_task = asyncio.create_task(
+            run_product_change_listener(redis_client, local_indexes)
         )
-    await create_product_index(client)
-    await bulk_index_products(client)
+    sync_task = asyncio.create_task(connect_search_index())
     yield
+    for task in (sync_task, listener_task):
+        if task is not None and not task.done():
+            task.cancel()
     await redis_client.close()
     await close_es_client()
+    password_hasher.close()
 
 
 class RootResponse(BaseModel):
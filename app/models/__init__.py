@@ -2,10 +2,31 @@ from .user import User
 from .address import Address
 from .cart_item import CartItem
 from .cart import Cart
-from .category import Category
+from .category import Category, CategoryClosure
 from .order_item import OrderItem
 from .order import Order
 from .payment import Payment
 from .product import Product
 from .review import Review
 from .wishlist import Wishlist
+from .outbox import OutboxCursor, OutboxDelivery, OutboxEvent
+from .cache_version import CacheVersion
+
+__all__ = [
+    "User",
+    "Address",
+    "CartItem",
+    "Cart",
+    "Category",
+    "CategoryClosure",
+    "OrderItem",
+    "Order",
+    "Payment",
+    "Product",
+    "Review",
+    "Wishlist",
+    "OutboxEvent",
+    "OutboxCursor",
+    "OutboxDelivery",
+    "CacheVersion",
+]
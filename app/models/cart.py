@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, ForeignKey, DateTime, String, func
+from sqlalchemy import Integer, ForeignKey, DateTime, Index, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import List
 from datetime import datetime
@@ -22,6 +22,17 @@ class Cart(Base):
         DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp()
     )
 
+    __table_args__ = (
+        Index("ix_carts_session_id", "session_id"),
+        # Only anonymous carts are ever purged by age.
+        Index(
+            "ix_carts_anon_updated_at",
+            "updated_at",
+            postgresql_where=text("session_id IS NOT NULL"),
+            sqlite_where=text("session_id IS NOT NULL"),
+        ),
+    )
+
     # Relationships
     user: Mapped["User"] = relationship("User", back_populates="carts")
     cart_items: Mapped[List["CartItem"]] = relationship(
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, ForeignKey, DateTime, func
+from sqlalchemy import Integer, ForeignKey, DateTime, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from app.db.database import Base
@@ -21,6 +21,10 @@ class CartItem(Base):
         DateTime, default=func.current_timestamp()
     )
 
+    __table_args__ = (
+        UniqueConstraint("cart_id", "product_id", name="uq_cartitems_cart_product"),
+    )
+
     # Relationships
     cart: Mapped["Cart"] = relationship("Cart", back_populates="cart_items")
     product: Mapped["Product"] = relationship("Product", back_populates="cart_items")
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, Text, ForeignKey
+from sqlalchemy import Index, Integer, String, Text, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional, List
 from app.db.database import Base
@@ -28,3 +28,24 @@ class Category(Base):
     products: Mapped[List["Product"]] = relationship(
         "Product", back_populates="category"
     )
+
+
+class CategoryClosure(Base):
+    """
+    Every (ancestor, descendant) pair of the category tree, including each
+    category paired with itself at depth 0. Maintained by CategoryCrud.
+    """
+
+    __tablename__ = "category_closure"
+
+    ancestor_id: Mapped[int] = mapped_column(
+        ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+    )
+    descendant_id: Mapped[int] = mapped_column(
+        ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+    )
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_category_closure_descendant", "descendant_id", "ancestor_id"),
+    )
@@ -0,0 +1,63 @@
+from sqlalchemy import (
+    JSON,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+from typing import Any, Optional
+from datetime import datetime
+from app.db.database import Base
+
+
+class OutboxEvent(Base):
+    """Change event recorded in the same transaction as the write it describes."""
+
+    __tablename__ = "outbox_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    aggregate_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    aggregate_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    event_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON, default=dict)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.current_timestamp()
+    )
+
+    __table_args__ = (
+        Index("ix_outbox_events_aggregate", "aggregate_type", "aggregate_id"),
+    )
+
+
+class OutboxCursor(Base):
+    """How far one consumer has read: every event up to it is settled."""
+
+    __tablename__ = "outbox_cursors"
+
+    consumer: Mapped[str] = mapped_column(String(50), primary_key=True)
+    last_event_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class OutboxDelivery(Base):
+    """
+    An event behind its consumer's cursor that the consumer has not taken
+    yet: failed and waiting for next_attempt_at, held behind an earlier
+    failure of the same entity, or dead-lettered (dead_at set) until replayed.
+    """
+
+    __tablename__ = "outbox_deliveries"
+
+    consumer: Mapped[str] = mapped_column(String(50), primary_key=True)
+    event_id: Mapped[int] = mapped_column(
+        ForeignKey("outbox_events.id", ondelete="CASCADE"), primary_key=True
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    dead_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_outbox_deliveries_event", "event_id"),)
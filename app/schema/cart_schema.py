@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 
 
 class CartItemCreate(BaseModel):
@@ -23,9 +23,26 @@ class CartItemResponse(BaseModel):
 
 
 class CartResponse(BaseModel):
-    id: int
+    id: Optional[int] = None
     items: List[CartItemResponse]
     total_items: int
     subtotal: float  # ✅ FIXED: name must match service output
 
     model_config = {"from_attributes": True}
+
+
+class CartBatchRequest(BaseModel):
+    items: List[CartItemCreate] = Field(..., min_length=1, max_length=100)
+
+
+class CartBatchLineResult(BaseModel):
+    product_id: int
+    quantity: int
+    # "added", "not_found" or "out_of_stock"
+    status: str
+    available: Optional[int] = None
+
+
+class CartBatchResponse(BaseModel):
+    added_count: int
+    results: List[CartBatchLineResult]
@@ -69,6 +69,17 @@ class CategoryPublic(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class CategoryTreeNode(BaseModel):
+    id: int
+    name: str
+    slug: str
+    product_count: int = Field(0, description="Active products in this category")
+    total_product_count: int = Field(
+        0, description="Active products in this category and all below it"
+    )
+    children: list["CategoryTreeNode"] = Field(default_factory=list)
+
+
 class UpdateCategory(BaseModel):
     name: str | None = None
     slug: str | None = None
@@ -11,6 +11,10 @@ class PaginationMeta(BaseModel):
     total_items: int = Field(..., description="Total number of items across all pages")
     from_item: Optional[int] = Field(None, description="Starting item index (1-based)")
     to_item: Optional[int] = Field(None, description="Ending item index (1-based)")
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Pass as `cursor` to fetch the next page, on listings that support it",
+    )
 
 
 class PaginationLinks(BaseModel):
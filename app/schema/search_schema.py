@@ -1,7 +1,20 @@
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional
 from pydantic import BaseModel, Field
 
+from app.schema.common_schema import PaginatedResponse
+from app.schema.product_schema import ProductResponse
+
+# Buckets for the price facet: (key, from, to); bounds are [from, to).
+PRICE_RANGES = [
+    ("0-25", None, 25),
+    ("25-50", 25, 50),
+    ("50-100", 50, 100),
+    ("100-250", 100, 250),
+    ("250-500", 250, 500),
+    ("500+", 500, None),
+]
+
 
 class AvailabilityFilter(str, Enum):
     """Filter products by stock availability."""
@@ -22,6 +35,15 @@ class SortByField(str, Enum):
     CREATED_AT = "created_at"
 
 
+class SearchSortField(str, Enum):
+    """Sort options for full-text product search."""
+
+    RELEVANCE = "relevance"
+    PRICE = "price"
+    NAME = "name"
+    CREATED_AT = "created_at"
+
+
 class SortOrder(str, Enum):
     """Sort order direction."""
 
@@ -113,3 +135,91 @@ class ProductAutocompleteResponse(BaseModel):
             ]
         }
     }
+
+
+class ProductSearchHit(BaseModel):
+    """A product matched by full-text search."""
+
+    id: int
+    score: Optional[float] = None
+    name: str
+    description: Optional[str] = None
+    category: Optional[str] = None
+    category_id: Optional[int] = None
+    price: float
+    in_stock: bool
+    highlight: dict[str, list[str]] = Field(default_factory=dict)
+
+
+class FacetBucket(BaseModel):
+    value: str
+    count: int
+
+
+class PriceRangeBucket(BaseModel):
+    key: str
+    from_price: Optional[float] = None
+    to_price: Optional[float] = None
+    count: int
+
+
+class ProductSearchFacets(BaseModel):
+    categories: list[FacetBucket] = Field(default_factory=list)
+    price_ranges: list[PriceRangeBucket] = Field(default_factory=list)
+
+
+class CategoryFacetBucket(BaseModel):
+    category_id: Optional[int] = None
+    name: Optional[str] = None
+    count: int
+
+
+class RatingFacetBucket(BaseModel):
+    min_rating: int = Field(..., description="Average rating of at least this")
+    count: int
+
+
+class AvailabilityFacet(BaseModel):
+    in_stock: int = 0
+    out_of_stock: int = 0
+
+
+class ProductListingFacets(BaseModel):
+    """
+    Counts for the current filters. Category and availability counts ignore
+    their own filter, so they show what choosing another value would give.
+    """
+
+    categories: list[CategoryFacetBucket] = Field(default_factory=list)
+    price_ranges: list[PriceRangeBucket] = Field(default_factory=list)
+    ratings: list[RatingFacetBucket] = Field(default_factory=list)
+    availability: AvailabilityFacet = Field(default_factory=AvailabilityFacet)
+
+
+class ProductListingResponse(PaginatedResponse[ProductResponse]):
+    facets: Optional[ProductListingFacets] = Field(
+        None, description="Only when requested with `facets=true`"
+    )
+    in_wishlist: Optional[Dict[int, bool]] = Field(
+        None,
+        description="Per product id; only when requested with `include_wishlist=true`",
+    )
+
+
+class ProductSearchResponse(BaseModel):
+    """Response schema for full-text product search."""
+
+    total: int
+    took_ms: int
+    page: Optional[int] = Field(None, description="Page number (offset pagination)")
+    per_page: int
+    results: list[ProductSearchHit]
+    facets: Optional[ProductSearchFacets] = Field(
+        None, description="Only on the first page of a cursor search"
+    )
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as `cursor` to fetch the next page (cursor mode)"
+    )
+    degraded: bool = Field(
+        False, description="Served from cache or the database while search is down"
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -46,3 +46,11 @@ class WishlistActionResponse(BaseModel):
 
     message: str
     product_id: Optional[int] = None
+
+
+class WishlistMembershipResponse(BaseModel):
+    """Wishlist flags for a batch of products"""
+
+    in_wishlist: Dict[int, bool] = Field(
+        ..., description="Whether each requested product id is in the wishlist"
+    )
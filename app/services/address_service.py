@@ -4,20 +4,25 @@ from app.schema.address_schema import AddressCreate, AddressPublic, AddressUpdat
 from fastapi import HTTPException, status
 from fastapi.exceptions import RequestValidationError
 from app.models.address import Address
+from app.core.user_cache import UserCache
 
 
 class AddressService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache: UserCache | None = None):
         self.db = db
         self.crud = AddressCrud(db=db)
+        # Cached users carry their addresses.
+        self.cache = cache
 
-    def add_address(
+    async def add_address(
         self, user_id: int, is_first: bool, address_data: AddressCreate
     ) -> AddressPublic:
         address = self.crud.create_address(user_id, is_first, address_data)
+        if self.cache is not None:
+            await self.cache.invalidate(user_id)
         return AddressPublic.model_validate(address)
 
-    def update_address(
+    async def update_address(
         self, address_id: int, address_data: AddressUpdate
     ) -> AddressPublic:
         address = self.crud.get_single_address(address_id)
@@ -31,6 +36,8 @@ class AddressService:
                 setattr(address, key, value)
             self.db.commit()
             self.db.refresh(address)
+            if self.cache is not None:
+                await self.cache.invalidate(address.user_id)
             return AddressPublic.model_validate(address)
 
         except Exception as e:
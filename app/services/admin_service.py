@@ -12,6 +12,7 @@ from app.crud.order import OrderCrud
 from app.crud.user import UserCrud
 from app.crud.product import ProductCrud
 from app.crud.review import ReviewCrud
+from app.core.user_cache import UserCache
 from app.schema.admin_schema import (
     SalesAnalytics,
     UserAnalytics,
@@ -33,8 +34,9 @@ from app.schema.admin_schema import (
 class AdminService:
     """Service layer for admin dashboard and management operations"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache: UserCache | None = None):
         self.db = db
+        self.cache = cache
         self.order_crud = OrderCrud(db=db)
         self.user_crud = UserCrud(db=db)
         self.product_crud = ProductCrud(db=db)
@@ -183,7 +185,7 @@ class AdminService:
             users=user_items, total=total, page=page, page_size=page_size
         )
 
-    def update_user_role(self, user_id: int, new_role: str) -> User:
+    async def update_user_role(self, user_id: int, new_role: str) -> User:
         """Update a user's role"""
         if new_role not in ["customer", "admin"]:
             raise HTTPException(
@@ -192,6 +194,8 @@ class AdminService:
             )
 
         user = self.user_crud.update_user_role(user_id, new_role)
+        if self.cache is not None:
+            await self.cache.invalidate(user_id)
         return user
 
     # Order Management Methods
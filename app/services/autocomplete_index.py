@@ -0,0 +1,82 @@
+"""
+Per-worker autocomplete index.
+
+Each API worker keeps a PrefixIndex of active product names in memory, built
+at startup and kept current by the product change listener. It is rebuilt
+from the database every AUTOCOMPLETE_INDEX_REBUILD_SECONDS.
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import SessionLocal
+from app.models.category import Category
+from app.models.order_item import OrderItem
+from app.models.product import Product
+from app.utils.prefix_index import PrefixIndex
+
+autocomplete_index = PrefixIndex()
+
+
+def load_index_rows(
+    product_ids: list[int] | None = None,
+) -> list[tuple[int, str, str | None, int]]:
+    """(id, name, category name, order line count) for active products."""
+    popularity = (
+        select(func.count(OrderItem.id))
+        .where(OrderItem.product_id == Product.id)
+        .correlate_except(OrderItem)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(Product.id, Product.name, Category.name, popularity)
+        .outerjoin(Category, Product.category_id == Category.id)
+        .where(Product.is_active == True)
+    )
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(product_ids))
+    with SessionLocal() as db:
+        return [tuple(row) for row in db.execute(stmt).all()]
+
+
+def _build_autocomplete_index() -> PrefixIndex:
+    return PrefixIndex.build(load_index_rows(), autocomplete_index.top_k)
+
+
+async def rebuild_autocomplete_index() -> None:
+    # Sorting every name's keys is CPU work; only the swap runs on the loop.
+    index = await asyncio.to_thread(_build_autocomplete_index)
+    autocomplete_index.replace(index)
+    logger.info(f"Autocomplete index built with {len(index)} product(s)")
+
+
+async def apply_product_changes(product_ids: list[int]) -> None:
+    """Re-read changed products; inactive or deleted ones leave the index."""
+    rows = await asyncio.to_thread(load_index_rows, product_ids)
+    active = set()
+    for product_id, name, category, popularity in rows:
+        autocomplete_index.upsert(product_id, name, category, popularity)
+        active.add(product_id)
+    for product_id in set(product_ids) - active:
+        autocomplete_index.remove(product_id)
+
+
+class AutocompleteIndexSync:
+    name = "autocomplete"
+
+    async def rebuild(self) -> None:
+        await rebuild_autocomplete_index()
+
+    async def apply_changes(self, product_ids: list[int]) -> None:
+        await apply_product_changes(product_ids)
+
+    def is_stale(self) -> bool:
+        built_at = autocomplete_index.built_at
+        return (
+            built_at is None
+            or time.monotonic() - built_at > settings.AUTOCOMPLETE_INDEX_REBUILD_SECONDS
+        )
@@ -0,0 +1,80 @@
+"""
+Purge of expired anonymous carts.
+
+Anonymous carts are only reachable through the session_id cookie, which
+lasts CART_SESSION_TTL_SECONDS; once a cart has been idle that long nobody
+can come back to it. Runs as its own process next to the outbox relay:
+
+    python -m app.services.cart_gc
+
+and exposes its metrics on CART_GC_METRICS_PORT.
+"""
+
+import asyncio
+import signal
+import time
+from datetime import datetime, timedelta
+
+from prometheus_client import start_http_server
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import CART_GC_DELETED, CART_GC_DURATION, CART_GC_LAST_SUCCESS
+from app.crud.cart_item import CartCrud
+from app.db.database import SessionLocal
+
+
+def _purge_chunk(cutoff: datetime, chunk_size: int) -> int:
+    with SessionLocal() as db:
+        return CartCrud(db).delete_expired_session_carts(cutoff, chunk_size)
+
+
+async def purge_expired_carts(
+    chunk_size: int = settings.CART_GC_CHUNK_SIZE,
+) -> int:
+    """Delete expired anonymous carts one chunk per transaction."""
+    # Database timestamps are naive UTC.
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.CART_SESSION_TTL_SECONDS)
+    total = 0
+    with CART_GC_DURATION.time():
+        while True:
+            deleted = await asyncio.to_thread(_purge_chunk, cutoff, chunk_size)
+            total += deleted
+            CART_GC_DELETED.inc(deleted)
+            if deleted < chunk_size:
+                break
+    CART_GC_LAST_SUCCESS.set(time.time())
+    return total
+
+
+async def run_cart_gc(stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            removed = await purge_expired_carts()
+            if removed:
+                logger.info(f"Removed {removed} expired anonymous cart(s)")
+        except Exception:
+            logger.exception("Cart purge failed")
+        try:
+            await asyncio.wait_for(
+                stop.wait(), timeout=settings.CART_GC_INTERVAL_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main() -> None:
+    start_http_server(settings.CART_GC_METRICS_PORT)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Cart purge started")
+    await run_cart_gc(stop)
+    logger.info("Cart purge stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,135 +1,119 @@
-from typing import Optional
+from typing import Any, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.exceptions import ProductException
+from app.core.redis import RedisClient
 from app.crud.product import ProductCrud
-from app.crud.cart_item import CartCrud
-from app.models.cart import Cart
-from app.schema.cart_schema import CartItemCreate, CartItemUpdate
+from app.schema.cart_schema import (
+    CartBatchLineResult,
+    CartBatchResponse,
+    CartItemCreate,
+    CartItemUpdate,
+    CartResponse,
+)
+from app.services.cart_store import CartStore, RedisCartStore, SqlCartStore
 from app.core.logger import logger
 
 
 class CartService:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        redis: Optional[RedisClient] = None,
+        backend: Optional[str] = None,
+    ):
         self.db = db
-        self.cart_crud = CartCrud(db=db)
         self.prod_crud = ProductCrud(db=db)
-
-    def get_or_create_cart(self, user_id: Optional[int], session_id: Optional[str]):
+        self.store: CartStore
+        if (backend or settings.CART_BACKEND) == "redis":
+            self.store = RedisCartStore(db=db, redis=redis)
+        else:
+            self.store = SqlCartStore(db=db)
+
+    async def get_or_create_cart(
+        self, user_id: Optional[int], session_id: Optional[str]
+    ) -> Any:
         try:
-            if user_id:
-                cart = self.cart_crud.get_cart_by_user_id(user_id=user_id)
-                if cart:
-                    return cart
-                cart = self.cart_crud.create_cart_by_user_id(user_id=user_id)
-                return cart
-            else:
-                cart = self.cart_crud.get_cart_by_session_id(session_id=session_id)
-                if cart:
-                    return cart
-                cart = self.cart_crud.create_cart_by_session_id(session_id=session_id)
-                return cart
+            return await self.store.get_or_create_cart(
+                user_id=user_id, session_id=session_id
+            )
         except Exception as e:
             logger.info(f"exception: {e}")
 
-    def add_item(self, cart: Cart, data: CartItemCreate):
+    async def add_item(self, cart: Any, data: CartItemCreate) -> int:
         product = self.prod_crud.get_product_by_id(data.product_id)
         if not product:
             raise ProductException("product not found")
         if product.stock_quantity < data.quantity:
             raise ProductException("Product out of stock")
 
-        # stmt = select(CartItem).where(
-        #     CartItem.cart_id == cart.id, CartItem.product_id == data.product_id
-        # )
-
-        # existing = self.db.scalar(stmt)
-        existing = self.cart_crud.get_cart_item_by_product(cart.id, product.id)
-
-        if existing:
-            result = self.cart_crud.update_existing_cart_item(
-                cart.id, product.id, data.quantity
+        return await self.store.add_item(cart, product.id, data.quantity)
+
+    async def add_items(
+        self, cart: Any, items: list[CartItemCreate]
+    ) -> CartBatchResponse:
+        """
+        Add many products with one stock query and one write.
+
+        Lines for the same product are combined; products that are missing,
+        inactive or short on stock are reported and skipped.
+        """
+        wanted: dict[int, int] = {}
+        for item in items:
+            wanted[item.product_id] = wanted.get(item.product_id, 0) + item.quantity
+
+        products = {p.id: p for p in self.prod_crud.get_products_by_ids(list(wanted))}
+        accepted: dict[int, int] = {}
+        results = []
+        for product_id, quantity in wanted.items():
+            product = products.get(product_id)
+            if product is None:
+                line_status, available = "not_found", None
+            elif product.stock_quantity < quantity:
+                line_status, available = "out_of_stock", product.stock_quantity
+            else:
+                line_status, available = "added", None
+                accepted[product_id] = quantity
+            results.append(
+                CartBatchLineResult(
+                    product_id=product_id,
+                    quantity=quantity,
+                    status=line_status,
+                    available=available,
+                )
             )
-            return result
 
-        new_item = self.cart_crud.add_new_cart_item(
-            cart_id=cart.id, product_id=product.id, quantity=data.quantity
-        )
-        return new_item
+        await self.store.add_items(cart, accepted)
+        return CartBatchResponse(added_count=len(accepted), results=results)
 
-    def update_item(self, cart: Cart, item_id: int, data: CartItemUpdate):
-        item = self.cart_crud.update_item(cart_id=cart.id, item_id=item_id, data=data)
-        if not item:
+    async def update_item(self, cart: Any, item_id: int, data: CartItemUpdate) -> int:
+        updated = await self.store.update_item(cart, item_id, data.quantity)
+        if updated is None:
             raise HTTPException(
-                status=status.HTTP_404_NOT_FOUND, detail="Item not found"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Item not found"
             )
-        return item
+        return updated
 
-    def remove_item(self, cart: Cart, item_id: int):
-        item = self.cart_crud.remove_item(cart_id=cart.id, item_id=item_id)
-
-        if not item:
+    async def remove_item(self, cart: Any, item_id: int) -> bool:
+        if not await self.store.remove_item(cart, item_id):
             raise HTTPException(
-                status=status.HTTP_404_NOT_FOUND, detail="Item not found"
-            )
-        return item
-
-    def get_cart_details(self, cart: Cart):
-        items = []
-        subtotal = 0
-        total_items = 0
-
-        for item in cart.cart_items:
-            product = item.product
-            item_sub = product.price * item.quantity
-
-            items.append(
-                {
-                    "id": item.id,
-                    "product_id": product.id,
-                    "quantity": item.quantity,
-                    "product_name": product.name,
-                    "unit_price": product.price,
-                    "subtotal": item_sub,
-                }
+                status_code=status.HTTP_404_NOT_FOUND, detail="Item not found"
             )
+        return True
 
-            subtotal += item_sub
-            total_items += item.quantity
+    async def get_cart_summary(self, cart: Any) -> CartResponse:
+        """Lines and totals; the SQL store computes them in one query."""
+        return await self.store.get_summary(cart)
 
-        return {
-            "id": cart.id,
-            "items": items,
-            "subtotal": subtotal,
-            "total_items": total_items,
-        }
+    async def merge_carts(self, user_id: int, session_id: Optional[str]) -> None:
+        await self.store.merge_carts(user_id=user_id, session_id=session_id)
 
-    def merge_carts(self, user_id: int, session_id: str):
-        user_cart = self.cart_crud.get_cart_by_user_id(user_id=user_id)
-        anon_cart = self.cart_crud.get_cart_by_session_id(session_id=session_id)
+    async def prepare_checkout(self, user_id: int) -> None:
+        """Bring the user's SQL cart up to date for order creation."""
+        await self.store.persist(user_id)
 
-        logger.info(f"info user cart: {user_cart}")
-        logger.info(f"anon cart: {anon_cart}")
-
-        if not anon_cart:
-            return
-
-        if not user_cart:
-            self.cart_crud.update_anon_cart_to_user_cart(
-                user_id=user_id, session_id=session_id
-            )
-            return
-
-        for item in anon_cart.cart_items:
-            existing = self.cart_crud.get_cart_item_by_product(
-                user_cart.id, item.product_id
-            )
-
-            if existing:
-                existing.quantity += item.quantity
-            else:
-                item.cart_id = user_cart.id
-        self.cart_crud.remove_anon_cart(session_id=session_id)
+    async def finish_checkout(self, user_id: int) -> None:
+        await self.store.clear(user_id)
@@ -0,0 +1,271 @@
+"""
+Cart storage backends.
+
+CartService talks to one of these, picked by CART_BACKEND. Item ids are
+opaque to callers: the SQL store uses cart item row ids, the Redis store
+uses product ids.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Optional, Protocol
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import RedisClient
+from app.crud.cart_item import CartCrud
+from app.models.cart import Cart
+from app.schema.cart_schema import CartItemResponse, CartResponse
+
+
+class CartStore(Protocol):
+    async def get_or_create_cart(
+        self, user_id: Optional[int], session_id: Optional[str]
+    ) -> Any: ...
+
+    async def add_item(self, cart: Any, product_id: int, quantity: int) -> int:
+        """Add to the product's quantity; returns the item id."""
+        ...
+
+    async def add_items(self, cart: Any, lines: dict[int, int]) -> None:
+        """add_item for many products (product_id -> quantity) at once."""
+        ...
+
+    async def update_item(
+        self, cart: Any, item_id: int, quantity: int
+    ) -> Optional[int]: ...
+
+    async def remove_item(self, cart: Any, item_id: int) -> bool: ...
+
+    async def get_summary(self, cart: Any) -> CartResponse: ...
+
+    async def merge_carts(self, user_id: int, session_id: Optional[str]) -> None: ...
+
+    async def persist(self, user_id: int) -> None:
+        """Make the user's SQL cart match the stored one, ahead of checkout."""
+        ...
+
+    async def clear(self, user_id: int) -> None:
+        """Drop the user's cart after its items became an order."""
+        ...
+
+
+class SqlCartStore:
+    """Carts and cart items as rows, written through on every change."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.cart_crud = CartCrud(db=db)
+
+    async def get_or_create_cart(
+        self, user_id: Optional[int], session_id: Optional[str]
+    ) -> Cart:
+        if user_id:
+            cart = self.cart_crud.get_cart_by_user_id(user_id=user_id)
+            if cart:
+                return cart
+            return self.cart_crud.create_cart_by_user_id(user_id=user_id)
+        cart = self.cart_crud.get_cart_by_session_id(session_id=session_id)
+        if cart:
+            return cart
+        return self.cart_crud.create_cart_by_session_id(session_id=session_id)
+
+    async def add_item(self, cart: Cart, product_id: int, quantity: int) -> int:
+        existing = self.cart_crud.get_cart_item_by_product(cart.id, product_id)
+        if existing:
+            item = self.cart_crud.update_existing_cart_item(
+                cart.id, product_id, quantity
+            )
+        else:
+            item = self.cart_crud.add_new_cart_item(
+                cart_id=cart.id, product_id=product_id, quantity=quantity
+            )
+        return item.id
+
+    async def add_items(self, cart: Cart, lines: dict[int, int]) -> None:
+        self.cart_crud.upsert_items(cart.id, lines)
+
+    async def update_item(
+        self, cart: Cart, item_id: int, quantity: int
+    ) -> Optional[int]:
+        item = self.cart_crud.update_item(
+            cart_id=cart.id, item_id=item_id, quantity=quantity
+        )
+        return item.id if item else None
+
+    async def remove_item(self, cart: Cart, item_id: int) -> bool:
+        return self.cart_crud.remove_item(cart_id=cart.id, item_id=item_id)
+
+    async def get_summary(self, cart: Cart) -> CartResponse:
+        rows = self.cart_crud.get_cart_summary(cart.id)
+        return CartResponse(
+            id=cart.id,
+            items=[CartItemResponse.model_validate(row) for row in rows],
+            subtotal=rows[0].cart_subtotal if rows else 0,
+            total_items=rows[0].total_items if rows else 0,
+        )
+
+    async def merge_carts(self, user_id: int, session_id: Optional[str]) -> None:
+        if session_id:
+            self.cart_crud.merge_session_cart(user_id=user_id, session_id=session_id)
+
+    async def persist(self, user_id: int) -> None:
+        # Already in SQL.
+        pass
+
+    async def clear(self, user_id: int) -> None:
+        # Checkout deletes the ordered cart items itself.
+        pass
+
+
+@dataclass
+class RedisCart:
+    key: str
+    user_id: Optional[int]
+
+
+class RedisCartStore:
+    """
+    Carts as Redis hashes of product_id -> quantity.
+
+    Anonymous carts expire CART_SESSION_TTL_SECONDS after their last change.
+    SQL only sees a cart when it is merged into a user's at login, which
+    leaves a durable copy of the user's cart, and right before checkout. A
+    user cart missing from Redis is restored from that copy; if the copy is
+    empty too, a marker key says so for CART_EMPTY_MARKER_TTL_SECONDS so
+    reads of an empty cart do not go to SQL every time.
+    """
+
+    def __init__(self, db: Session, redis: RedisClient):
+        self.redis = redis
+        self.cart_crud = CartCrud(db=db)
+
+    @staticmethod
+    def _user_key(user_id: int) -> str:
+        return f"cart:user:{user_id}"
+
+    @staticmethod
+    def _empty_key(user_id: int) -> str:
+        return f"cart:user:{user_id}:empty"
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f"cart:session:{session_id}"
+
+    async def get_or_create_cart(
+        self, user_id: Optional[int], session_id: Optional[str]
+    ) -> RedisCart:
+        if user_id:
+            key = self._user_key(user_id)
+            await self._restore(user_id, key)
+            return RedisCart(key=key, user_id=user_id)
+        return RedisCart(key=self._session_key(session_id), user_id=None)
+
+    async def _restore(self, user_id: int, key: str) -> None:
+        client = self.redis.client
+        if await client.exists(key, self._empty_key(user_id)):
+            return
+        lines = self.cart_crud.get_user_cart_lines(user_id)
+        if lines:
+            await client.hset(key, mapping=lines)
+        else:
+            await self._mark_empty(user_id)
+
+    async def _mark_empty(self, user_id: int) -> None:
+        await self.redis.client.set(
+            self._empty_key(user_id), 1, ex=settings.CART_EMPTY_MARKER_TTL_SECONDS
+        )
+
+    @staticmethod
+    def _touch(pipe, cart: RedisCart) -> None:
+        if cart.user_id is None:
+            pipe.expire(cart.key, settings.CART_SESSION_TTL_SECONDS)
+
+    async def add_item(self, cart: RedisCart, product_id: int, quantity: int) -> int:
+        pipe = self.redis.client.pipeline()
+        pipe.hincrby(cart.key, product_id, quantity)
+        self._touch(pipe, cart)
+        await pipe.execute()
+        return product_id
+
+    async def add_items(self, cart: RedisCart, lines: dict[int, int]) -> None:
+        if not lines:
+            return
+        pipe = self.redis.client.pipeline()
+        for product_id, quantity in lines.items():
+            pipe.hincrby(cart.key, product_id, quantity)
+        self._touch(pipe, cart)
+        await pipe.execute()
+
+    async def update_item(
+        self, cart: RedisCart, item_id: int, quantity: int
+    ) -> Optional[int]:
+        client = self.redis.client
+        if not await client.hexists(cart.key, item_id):
+            return None
+        pipe = client.pipeline()
+        pipe.hset(cart.key, item_id, quantity)
+        self._touch(pipe, cart)
+        await pipe.execute()
+        return item_id
+
+    async def remove_item(self, cart: RedisCart, item_id: int) -> bool:
+        pipe = self.redis.client.pipeline()
+        pipe.hdel(cart.key, item_id)
+        pipe.exists(cart.key)
+        removed, remaining = await pipe.execute()
+        if removed and not remaining and cart.user_id is not None:
+            # Otherwise the emptied cart would come back from the SQL copy.
+            self.cart_crud.replace_user_cart_items(cart.user_id, {})
+            await self._mark_empty(cart.user_id)
+        return bool(removed)
+
+    async def _read(self, key: str) -> dict[int, int]:
+        raw = await self.redis.client.hgetall(key)
+        return {int(product_id): int(quantity) for product_id, quantity in raw.items()}
+
+    async def get_summary(self, cart: RedisCart) -> CartResponse:
+        quantities = await self._read(cart.key)
+        products = self.cart_crud.get_line_products(sorted(quantities))
+        # Totals are summed as Decimal, before the floats of the response.
+        line_totals = {p.id: p.price * quantities[p.id] for p in products}
+        return CartResponse(
+            items=[
+                CartItemResponse(
+                    id=p.id,
+                    product_id=p.id,
+                    quantity=quantities[p.id],
+                    product_name=p.name,
+                    unit_price=p.price,
+                    subtotal=line_totals[p.id],
+                )
+                for p in products
+            ],
+            subtotal=sum(line_totals.values()),
+            total_items=sum(quantities[p.id] for p in products),
+        )
+
+    async def merge_carts(self, user_id: int, session_id: Optional[str]) -> None:
+        if not session_id:
+            return
+        anon_key = self._session_key(session_id)
+        anon = await self._read(anon_key)
+        if not anon:
+            return
+
+        user_key = self._user_key(user_id)
+        await self._restore(user_id, user_key)
+        pipe = self.redis.client.pipeline()
+        for product_id, quantity in anon.items():
+            pipe.hincrby(user_key, product_id, quantity)
+        pipe.delete(anon_key)
+        await pipe.execute()
+        await self.persist(user_id)
+
+    async def persist(self, user_id: int) -> None:
+        lines = await self._read(self._user_key(user_id))
+        self.cart_crud.replace_user_cart_items(user_id, lines)
+
+    async def clear(self, user_id: int) -> None:
+        await self.redis.delete(self._user_key(user_id))
+        await self._mark_empty(user_id)
@@ -0,0 +1,93 @@
+"""
+Per-worker full-text index over the product catalog.
+
+Answers listing searches when Elasticsearch is unavailable, instead of an
+ILIKE scan of the products table. Kept current by the product change
+listener. Ratings and popularity only move on the periodic rebuild every
+CATALOG_INDEX_REBUILD_SECONDS, since reviews and orders publish no product
+change.
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import SessionLocal
+from app.models.order_item import OrderItem
+from app.models.product import Product
+from app.utils.bm25_index import BM25Index, CatalogDocument
+
+catalog_index = BM25Index()
+
+
+def load_catalog_documents(
+    product_ids: list[int] | None = None,
+) -> list[CatalogDocument]:
+    popularity = (
+        select(func.count(OrderItem.id))
+        .where(OrderItem.product_id == Product.id)
+        .correlate_except(OrderItem)
+        .scalar_subquery()
+    )
+    stmt = select(
+        Product.id,
+        Product.name,
+        Product.description,
+        Product.category_id,
+        Product.price,
+        Product.stock_quantity,
+        Product.created_at,
+        Product.average_rating,
+        popularity,
+    ).where(Product.is_active == True)
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(product_ids))
+    with SessionLocal() as db:
+        return [
+            CatalogDocument(
+                product_id=row[0],
+                name=row[1],
+                description=row[2],
+                category_id=row[3],
+                price=float(row[4]),
+                in_stock=(row[5] or 0) > 0,
+                created_at=row[6],
+                rating=None if row[7] is None else float(row[7]),
+                popularity=row[8] or 0,
+            )
+            for row in db.execute(stmt).all()
+        ]
+
+
+def _build_catalog_index() -> int:
+    documents = load_catalog_documents()
+    catalog_index.rebuild(documents)
+    return len(documents)
+
+
+class CatalogIndexSync:
+    name = "catalog"
+
+    async def rebuild(self) -> None:
+        # Tokenising the whole catalog is CPU work; keep it off the event loop.
+        count = await asyncio.to_thread(_build_catalog_index)
+        logger.info(f"Catalog search index built with {count} product(s)")
+
+    async def apply_changes(self, product_ids: list[int]) -> None:
+        documents = await asyncio.to_thread(load_catalog_documents, product_ids)
+        for document in documents:
+            catalog_index.upsert(document)
+        for product_id in set(product_ids) - {d.product_id for d in documents}:
+            catalog_index.remove(product_id)
+        if catalog_index.needs_compaction:
+            await asyncio.to_thread(catalog_index.compact)
+
+    def is_stale(self) -> bool:
+        built_at = catalog_index.built_at
+        return (
+            built_at is None
+            or time.monotonic() - built_at > settings.CATALOG_INDEX_REBUILD_SECONDS
+        )
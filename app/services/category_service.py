@@ -1,17 +1,31 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError  # Import for specific handling
 from app.core.exceptions import CategoryCreationError, CategoryUpdateError
+from app.core.redis import RedisClient
+from app.crud.cache_version import CATEGORY_TREE, CacheVersionCrud
 from app.crud.category import CategoryCrud
-from app.schema.category_schema import CreateCategory, UpdateCategory, CategoryPublic
+from app.schema.category_schema import (
+    CategoryPublic,
+    CategoryTreeNode,
+    CreateCategory,
+    UpdateCategory,
+)
 from fastapi import HTTPException, status
+from pydantic import TypeAdapter
 from app.core.logger import logger
 
+_tree_adapter = TypeAdapter(list[CategoryTreeNode])
+
+# The newest category tree this worker has seen, as (version, JSON body).
+_tree_l1: tuple[int, str] | None = None
+
 
 class CategoryService:
     """Business logic for categories including validation and error mapping."""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, redis: RedisClient | None = None):
         self.db = db
+        self.redis_client = redis
         self.crud = CategoryCrud(db=db)
 
     def create_category(self, create_dto: CreateCategory) -> CategoryPublic:
@@ -50,6 +64,62 @@ class CategoryService:
                 detail="Failed to fetch categories.",
             )
 
+    def get_tree_version(self) -> int:
+        """Current category tree version; bumped by every write that changes it."""
+        return CacheVersionCrud(self.db).get_version(CATEGORY_TREE)
+
+    async def get_category_tree(self, version: int) -> str:
+        """
+        The nested category tree with product counts, as a JSON body.
+
+        Served from this worker's memory, then Redis, and only built from the
+        database once per version. Entries are keyed by version, so a write
+        never needs to invalidate anything.
+        """
+        global _tree_l1
+        if _tree_l1 is not None and _tree_l1[0] == version:
+            return _tree_l1[1]
+
+        cache_key = f"category-tree:{version}"
+        body = None
+        if self.redis_client is not None:
+            try:
+                body = await self.redis_client.get_json(cache_key)
+            except Exception as e:
+                logger.warning(f"Category tree cache read failed: {e}")
+
+        if body is None:
+            body = _tree_adapter.dump_json(self._build_tree()).decode()
+            if self.redis_client is not None:
+                try:
+                    await self.redis_client.set_json(cache_key, body, ex=86400)
+                except Exception as e:
+                    logger.warning(f"Category tree cache write failed: {e}")
+
+        # A slow request must not replace a newer tree with an older one.
+        if _tree_l1 is None or _tree_l1[0] <= version:
+            _tree_l1 = (version, body)
+        return body
+
+    def _build_tree(self) -> list[CategoryTreeNode]:
+        categories = self.crud.get_all_categories()
+        own, subtree = self.crud.get_product_counts()
+        nodes = {
+            c.id: CategoryTreeNode(
+                id=c.id,
+                name=c.name,
+                slug=c.slug,
+                product_count=own.get(c.id, 0),
+                total_product_count=subtree.get(c.id, 0),
+            )
+            for c in categories
+        }
+        roots = []
+        for c in sorted(categories, key=lambda c: c.name):
+            parent = nodes.get(c.parent_id)
+            (parent.children if parent is not None else roots).append(nodes[c.id])
+        return roots
+
     def get_category_by_slug(self, slug: str) -> CategoryPublic:
         """Retrieve a category by slug; 404 if missing."""
         category = self.crud.get_category_by_slug(slug)
@@ -69,7 +139,7 @@ class CategoryService:
                 )
             return CategoryPublic.model_validate(updated_category)
         except CategoryUpdateError as e:
-            if "its own parent" in str(e):
+            if "its own" in str(e):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
                 )
@@ -1,24 +1,103 @@
-from typing import Any, Dict
+import asyncio
+import inspect
+from typing import Any, AsyncIterator, Dict
 
 from elasticsearch import (
+    ApiError,
     AsyncElasticsearch,
     AuthenticationException,
     ConnectionError,
     NotFoundError,
     RequestError,
+    TransportError,
 )
 from fastapi import HTTPException, status
 
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.config import settings
+from app.core.exceptions import SearchUnavailableError
 from app.core.logger import logger
+from app.core.search_cache import SearchCache
+from app.schema.search_schema import PRICE_RANGES
+from app.utils.cursor import decode_cursor, encode_cursor
+from app.utils.es_utils import PRODUCT_INDEX
+
+
+# Public sort names mapped to index fields; "relevance" sorts by score.
+SORT_FIELDS = {
+    "relevance": None,
+    "price": "price",
+    "name": "name.keyword",
+    "created_at": "created_at",
+}
+
+# Elasticsearch refuses from + size beyond index.max_result_window.
+MAX_RESULT_WINDOW = 10_000
+
+# How long an idle search cursor (point in time) stays valid between pages.
+CURSOR_KEEP_ALIVE = "2m"
+
+
+# One per worker: every request sees the failures the others ran into.
+elastic_breaker = CircuitBreaker(
+    "elasticsearch",
+    failure_threshold=settings.ELASTIC_BREAKER_FAILURES,
+    reset_timeout=settings.ELASTIC_BREAKER_RESET_SECONDS,
+)
 
 
 class ElasticService:
-    INDEX = "products"
+    # Alias, never a concrete index, so reads survive rebuilds.
+    INDEX = PRODUCT_INDEX
 
-    def __init__(self, es: AsyncElasticsearch):
+    def __init__(self, es: AsyncElasticsearch | None, cache: SearchCache | None = None):
+        # None while the cluster is not connected; calls then fail fast.
         self.es = es
+        self.cache = cache
+
+    async def _call(self, method: str, **kwargs: Any) -> Any:
+        """
+        Run one Elasticsearch API call under the circuit breaker.
+
+        The call is cut off after ELASTIC_REQUEST_BUDGET_SECONDS, including
+        the client's own retries. A missing client, an open circuit,
+        connection failures, timeouts, 429 and 5xx responses raise
+        SearchUnavailableError; other API errors (bad query, missing index)
+        mean the cluster is healthy and propagate unchanged.
+        """
+        if self.es is None:
+            raise SearchUnavailableError("Elasticsearch is not connected")
+        if not elastic_breaker.allow_request():
+            raise SearchUnavailableError("Elasticsearch circuit is open")
+        try:
+            result = await asyncio.wait_for(
+                getattr(self.es, method)(**kwargs),
+                timeout=settings.ELASTIC_REQUEST_BUDGET_SECONDS,
+            )
+        except ApiError as e:
+            # 429: the cluster is shedding load, so back off like on a 5xx.
+            if e.meta.status >= 500 or e.meta.status == 429:
+                elastic_breaker.record_failure()
+                raise SearchUnavailableError(str(e)) from e
+            elastic_breaker.record_success()
+            raise
+        except (TransportError, asyncio.TimeoutError) as e:
+            elastic_breaker.record_failure()
+            raise SearchUnavailableError(str(e) or type(e).__name__) from e
+        except BaseException:
+            # Cancellation or a bug on our side says nothing about the
+            # cluster; just don't leave a half-open trial slot taken.
+            elastic_breaker.record_release()
+            raise
+        elastic_breaker.record_success()
+        return result
 
     async def ping(self):
+        if self.es is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="elasticseach unreachable",
+            )
         try:
             info = await self.es.info()
             health = await self.es.cluster.health()
@@ -47,6 +126,8 @@ class ElasticService:
         size: int = 20,
         from_: int = 0,
         highlight: bool = True,
+        pit: Dict[str, Any] | None = None,
+        search_after: list | None = None,
     ):
         if size > 100:
             raise HTTPException(
@@ -59,41 +140,68 @@ class ElasticService:
                     "description": {"pre_tags": ["<em>"], "post_tags": ["</em>"]},
                 }
             }
+        params: Dict[str, Any] = {"size": size, "rest_total_hits_as_int": True}
+        if pit:
+            # A point-in-time search names its indices through the PIT only.
+            query["pit"] = pit
+        else:
+            params.update(index=index, from_=from_)
+        if search_after:
+            query["search_after"] = search_after
+
+        # Cursor pages belong to one client's point in time; never cache them.
+        cache_key = None
+        if self.cache is not None and not pit:
+            cache_key = await self.cache.key_for(index, query, size=size, from_=from_)
+            if cache_key is not None:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
         try:
-            result = await self.es.search(
-                index=index,
-                body=query,
-                size=size,
-                from_=from_,
-                rest_total_hits_as_int=True,
-            )
+            result = await self._call("search", body=query, **params)
 
             hits = result["hits"]["hits"]
-            return {
+            response = {
                 "total": result["hits"]["total"],
                 "took_ms": result["took"],
+                "aggregations": result.get("aggregations", {}),
+                "pit_id": result.get("pit_id"),
                 "results": [
                     {
                         "id": hit["_id"],
                         "score": hit["_score"],
                         "data": hit["_source"],
                         "highlight": hit.get("highlight", {}),
+                        "sort": hit.get("sort"),
                     }
                     for hit in hits
                 ],
             }
+            if cache_key is not None:
+                await self.cache.set(cache_key, response)
+            return response
 
         except NotFoundError:
+            if pit:
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="Search cursor expired, start the search again",
+                )
             raise HTTPException(status_code=404, detail=f"Index '{index}' not found")
         except RequestError as e:
-
             logger.warning(f"Bad search query: {query} → {e}")
             error_msg = e.info.get("error", {}).get("reason", str(e))
             raise HTTPException(
                 status_code=400, detail=f"Invalid search query: {error_msg}"
             )
-        except ConnectionError as e:
-            logger.error(f"Elasticsearch connection failed during search: {e}")
+        except SearchUnavailableError as e:
+            logger.warning(f"Elasticsearch unavailable during search: {e}")
+            # Degraded mode: an expired cached answer beats no answer.
+            if cache_key is not None:
+                stale = await self.cache.get_stale(cache_key)
+                if stale is not None:
+                    return {**stale, "degraded": True}
             raise HTTPException(
                 status_code=503, detail="Search temporarily unavailable"
             )
@@ -101,31 +209,311 @@ class ElasticService:
             logger.exception("Unexpected error in search")
             raise HTTPException(status_code=500, detail="Search failed")
 
+    async def search_products(
+        self,
+        q: str | None = None,
+        category_id: int | list[int] | None = None,
+        category: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool | None = None,
+        sort_by: str = "relevance",
+        sort_order: str = "asc",
+        page: int = 1,
+        per_page: int = 20,
+        facets: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Full-text product search with filters and category/price facets.
+
+        Category and price filters go in post_filter and each facet applies
+        every filter except its own, so a facet still lists the alternatives
+        to the value currently selected.
+        """
+        offset = (page - 1) * per_page
+        if offset + per_page > MAX_RESULT_WINDOW:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot page beyond the first {MAX_RESULT_WINDOW} results; "
+                "use cursor pagination",
+            )
+
+        body = self._build_product_query(
+            q=q,
+            category_id=category_id,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            in_stock=in_stock,
+            sort_by=sort_by,
+            sort_order=sort_order,
+        )
+        if facets:
+            body["aggs"] = self._facet_aggregations(body)
+        result = await self.search(body, size=per_page, from_=offset)
+        result.pop("pit_id", None)
+        aggregations = result.pop("aggregations", {})
+        if facets:
+            result["facets"] = self._format_facets(aggregations)
+        return result
+
+    async def search_products_cursor(
+        self,
+        cursor: str | None = None,
+        per_page: int = 20,
+        facets: bool = True,
+        **filters: Any,
+    ) -> Dict[str, Any]:
+        """
+        search_after pagination over a point-in-time snapshot.
+
+        The first call (no cursor) takes search_products' filters and opens a
+        PIT; every response carries an opaque `next_cursor` holding the PIT,
+        the filters and the last hit's sort values. Cost per page stays flat
+        however deep the client goes, and max_result_window does not apply.
+        Facets are only computed for the first page.
+        """
+        if cursor:
+            pit_id, after, filters = self._decode_search_cursor(cursor)
+            facets = False
+            try:
+                body = self._build_product_query(**filters)
+            except (TypeError, ValueError, AttributeError):
+                raise _invalid_cursor()
+        else:
+            pit_id, after = await self.open_point_in_time(), None
+            body = self._build_product_query(**filters)
+        if facets:
+            body["aggs"] = self._facet_aggregations(body)
+        result = await self.search(
+            body,
+            size=per_page,
+            pit={"id": pit_id, "keep_alive": CURSOR_KEEP_ALIVE},
+            search_after=after,
+        )
+        # Elasticsearch may hand back a new PIT id; always continue with it.
+        pit_id = result.pop("pit_id", None) or pit_id
+        aggregations = result.pop("aggregations", {})
+        if facets:
+            result["facets"] = self._format_facets(aggregations)
+
+        hits = result["results"]
+        if len(hits) == per_page:
+            result["next_cursor"] = encode_cursor(
+                {"pit": pit_id, "after": hits[-1]["sort"], "filters": filters}
+            )
+        else:
+            result["next_cursor"] = None
+            await self.close_point_in_time(pit_id)
+        return result
+
+    async def iter_products(
+        self, batch_size: int = 100, **filters: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Every product document matching `filters`, for exports."""
+        cursor = None
+        while True:
+            page = await self.search_products_cursor(
+                cursor=cursor, per_page=batch_size, facets=False, **filters
+            )
+            for hit in page["results"]:
+                yield hit["data"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    async def open_point_in_time(self) -> str:
+        try:
+            response = await self._call(
+                "open_point_in_time", index=self.INDEX, keep_alive=CURSOR_KEEP_ALIVE
+            )
+            return response["id"]
+        except NotFoundError:
+            raise HTTPException(
+                status_code=404, detail=f"Index '{self.INDEX}' not found"
+            )
+        except SearchUnavailableError as e:
+            logger.error(f"Elasticsearch connection failed opening PIT: {e}")
+            raise HTTPException(
+                status_code=503, detail="Search temporarily unavailable"
+            )
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        # Best effort: an unclosed PIT just lives until its keep_alive ends.
+        try:
+            await self._call("close_point_in_time", body={"id": pit_id})
+        except Exception as e:
+            logger.debug(f"Closing point in time failed: {e}")
+
+    @staticmethod
+    def _decode_search_cursor(cursor: str) -> tuple[str, list | None, dict]:
+        """(pit, after, filters) from a client cursor; 400 unless well-formed."""
+        state = decode_cursor(cursor, ("pit", "after", "filters"))
+        pit_id, after, filters = state["pit"], state["after"], state["filters"]
+        if not (
+            isinstance(pit_id, str)
+            and (after is None or isinstance(after, list))
+            and isinstance(filters, dict)
+            and filters.keys() <= _QUERY_FILTERS
+        ):
+            raise _invalid_cursor()
+        return pit_id, after, filters
+
+    @staticmethod
+    def _build_product_query(
+        q: str | None = None,
+        category_id: int | list[int] | None = None,
+        category: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool | None = None,
+        sort_by: str = "relevance",
+        sort_order: str = "asc",
+    ) -> Dict[str, Any]:
+        # Analyzers lowercase anyway; normalising here lets equivalent
+        # queries share a cache entry.
+        q = " ".join(q.lower().split()) if q else None
+        if q:
+            query: Dict[str, Any] = {
+                "multi_match": {
+                    "query": q,
+                    "fields": ["name^3", "name.english^2", "description"],
+                    "fuzziness": "AUTO",
+                }
+            }
+        else:
+            query = {"match_all": {}}
+        if in_stock is not None:
+            query = {
+                "bool": {"must": [query], "filter": [{"term": {"in_stock": in_stock}}]}
+            }
+
+        category_filter = None
+        if isinstance(category_id, list):
+            category_filter = {"terms": {"category_id": category_id}}
+        elif category_id is not None:
+            category_filter = {"term": {"category_id": category_id}}
+        elif category:
+            category_filter = {"term": {"category": category}}
+
+        price_filter = None
+        if min_price is not None or max_price is not None:
+            bounds = {}
+            if min_price is not None:
+                bounds["gte"] = min_price
+            if max_price is not None:
+                bounds["lte"] = max_price
+            price_filter = {"range": {"price": bounds}}
+
+        body: Dict[str, Any] = {"query": query}
+        post_filters = [f for f in (category_filter, price_filter) if f]
+        if post_filters:
+            body["post_filter"] = {"bool": {"filter": post_filters}}
+
+        # `id` is the final tiebreak so the order is total and search_after
+        # never skips or repeats documents with equal sort values.
+        sort_field = SORT_FIELDS.get(sort_by)
+        if sort_field:
+            body["sort"] = [{sort_field: sort_order}, {"id": "asc"}]
+        else:
+            body["sort"] = ["_score", {"id": "asc"}]
+        return body
+
+    @staticmethod
+    def _facet_aggregations(body: Dict[str, Any]) -> Dict[str, Any]:
+        category_filter = price_filter = {"match_all": {}}
+        for f in body.get("post_filter", {}).get("bool", {}).get("filter", []):
+            if "range" in f:
+                price_filter = f
+            else:
+                category_filter = f
+        return {
+            "categories": {
+                "filter": price_filter,
+                "aggs": {"values": {"terms": {"field": "category", "size": 50}}},
+            },
+            "price_ranges": {
+                "filter": category_filter,
+                "aggs": {
+                    "values": {
+                        "range": {
+                            "field": "price",
+                            "ranges": [
+                                {
+                                    "key": key,
+                                    **({"from": lo} if lo is not None else {}),
+                                    **({"to": hi} if hi is not None else {}),
+                                }
+                                for key, lo, hi in PRICE_RANGES
+                            ],
+                        }
+                    }
+                },
+            },
+        }
+
+    @staticmethod
+    def _format_facets(aggregations: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "categories": [
+                {"value": b["key"], "count": b["doc_count"]}
+                for b in aggregations["categories"]["values"]["buckets"]
+            ],
+            "price_ranges": [
+                {
+                    "key": b["key"],
+                    "from_price": b.get("from"),
+                    "to_price": b.get("to"),
+                    "count": b["doc_count"],
+                }
+                for b in aggregations["price_ranges"]["values"]["buckets"]
+            ],
+        }
+
     async def suggest(
         self, text: str, size: int = 10, category: str | None = None
     ) -> list[str]:
+        try:
+            return await self.complete(text, size=size, category=category)
+        except Exception as e:
+            logger.warning(f"Completion suggest failed: {e}")
+            return []
 
+    async def complete(
+        self, text: str, size: int = 10, category: str | None = None
+    ) -> list[str]:
+        """Completion-suggester lookup; unlike suggest() backend errors propagate."""
         if not text or len(text.strip()) < 2:
             return []
 
         body = {
+            "_source": False,
             "suggest": {
                 "product-suggest": {
                     "prefix": text.strip(),
                     "completion": {
                         "field": "suggest",
                         "size": size,
+                        "skip_duplicates": True,
                         "fuzzy": {"fuzziness": "AUTO"},
                         "contexts": {"category": [category] if category else ["all"]},
                     },
                 }
-            }
+            },
         }
 
-        try:
-            result = await self.es.search(index=self.INDEX, body=body)
-            options = result["suggest"]["product-suggest"][0]["options"]
-            return [opt["text"] for opt in options]
-        except Exception as e:
-            logger.warning(f"Completion suggest failed: {e}")
-            return []
+        result = await self._call("search", index=self.INDEX, body=body)
+        options = result["suggest"]["product-suggest"][0]["options"]
+        return [opt["text"] for opt in options]
+
+
+# Parameters a search cursor may carry back into _build_product_query.
+_QUERY_FILTERS = frozenset(
+    inspect.signature(ElasticService._build_product_query).parameters
+)
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+    )
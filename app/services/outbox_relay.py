@@ -0,0 +1,445 @@
+"""
+Outbox relay.
+
+Polls `outbox_events` and hands them, in batches, to the registered consumers
+(Elasticsearch indexer, cache invalidator, autocomplete publisher). Each
+consumer reads at its own pace: a cursor records how far it has got, and an
+`outbox_deliveries` row each event it failed on, retried with exponential
+backoff until OUTBOX_MAX_ATTEMPTS and then dead-lettered for replay. So a
+failing sink holds back neither the other consumers nor its own other
+entities. Delivery is at-least-once, so consumers must be idempotent, and
+each consumer gets an entity's events in commit order.
+
+Run it as its own process:
+
+    python -m app.services.outbox_relay
+
+and put dead-lettered events back in line once their sink is fixed with:
+
+    python -m app.services.outbox_relay --replay-dead-letters [--consumer NAME]
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Protocol
+
+from elasticsearch import ApiError, AsyncElasticsearch, TransportError, helpers
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+import app.models  # noqa: F401 - registers every mapper for the standalone process
+from app.core.config import settings
+from app.core.elastic_config import close_es_client, get_es_client
+from app.core.exceptions import SearchUnavailableError
+from app.core.logger import logger
+from app.core.redis import RedisClient
+from app.crud.outbox import PRODUCT, OutboxCrud
+from app.db.database import SessionLocal
+from app.models.outbox import OutboxEvent
+from app.models.product import Product
+from app.services.elasticsearch_service import elastic_breaker
+from app.services.product_change_listener import PRODUCT_CHANGES_CHANNEL
+from app.utils.es_utils import PRODUCT_INDEX, build_product_document
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    """Detached copy of an outbox row handed to consumers."""
+
+    id: int
+    aggregate_type: str
+    aggregate_id: int
+    event_type: str
+    payload: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def entity_key(self) -> tuple[str, int]:
+        return (self.aggregate_type, self.aggregate_id)
+
+
+class OutboxConsumer(Protocol):
+    name: str
+
+    async def handle(self, messages: list[OutboxMessage]) -> None:
+        """Apply messages in order; raise to have them redelivered."""
+        ...
+
+
+class ElasticIndexConsumer:
+    """
+    Keeps the products index in step with product change events.
+
+    Without a client it connects on first use, so the relay can start while
+    Elasticsearch is down. Calls go through the Elasticsearch circuit
+    breaker: during an outage events fail fast and wait for their retry.
+    """
+
+    name = "elasticsearch"
+
+    def __init__(
+        self, es: AsyncElasticsearch | None = None, index: str = PRODUCT_INDEX
+    ):
+        self.es = es
+        self.index = index
+
+    async def handle(self, messages: list[OutboxMessage]) -> None:
+        # The document is rebuilt from the current row, so only the latest
+        # state of each product matters no matter how many events it has.
+        product_ids = list(
+            dict.fromkeys(
+                m.aggregate_id for m in messages if m.aggregate_type == PRODUCT
+            )
+        )
+        if not product_ids:
+            return
+
+        products = await asyncio.to_thread(self._load_products, product_ids)
+        actions = []
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None or not product["is_active"]:
+                actions.append(
+                    {"_op_type": "delete", "_index": self.index, "_id": product_id}
+                )
+            else:
+                actions.append(
+                    {
+                        "_index": self.index,
+                        "_id": product_id,
+                        "_source": product["document"],
+                    }
+                )
+
+        if not elastic_breaker.allow_request():
+            raise SearchUnavailableError("Elasticsearch circuit is open")
+        try:
+            if self.es is None:
+                self.es = await get_es_client(attempts=1)
+            _, errors = await helpers.async_bulk(
+                self.es, actions, raise_on_error=False, raise_on_exception=True
+            )
+        except (RuntimeError, TransportError, ApiError):
+            # RuntimeError: get_es_client could not reach the cluster.
+            elastic_breaker.record_failure()
+            raise
+        except BaseException:
+            elastic_breaker.record_release()
+            raise
+        elastic_breaker.record_success()
+        # A delete of a document that was never indexed is not a failure.
+        errors = [e for e in errors if e.get("delete", {}).get("status") != 404]
+        if errors:
+            raise RuntimeError(f"{len(errors)} product documents failed to index")
+
+    @staticmethod
+    def _load_products(product_ids: list[int]) -> dict[int, dict]:
+        with SessionLocal() as db:
+            stmt = (
+                select(Product)
+                .where(Product.id.in_(product_ids))
+                .options(selectinload(Product.category))
+            )
+            return {
+                p.id: {"is_active": p.is_active, "document": build_product_document(p)}
+                for p in db.scalars(stmt).all()
+            }
+
+
+class CacheInvalidationConsumer:
+    """Drops Redis entries derived from products that changed."""
+
+    name = "cache"
+
+    # Events that can change which names autocomplete should return.
+    AUTOCOMPLETE_EVENTS = {"product.created", "product.updated", "product.deleted"}
+    # Product fields the listing facets count by or filter on.
+    FACET_FIELDS = {
+        "name",
+        "description",
+        "category_id",
+        "price",
+        "average_rating",
+        "is_active",
+        "stock_quantity",
+    }
+
+    def __init__(self, redis: RedisClient):
+        self.redis = redis
+
+    async def handle(self, messages: list[OutboxMessage]) -> None:
+        product_ids = {m.aggregate_id for m in messages if m.aggregate_type == PRODUCT}
+        if product_ids:
+            await self.redis.client.delete(*(f"product:{i}" for i in product_ids))
+        stale: set[str] = set()
+        for m in messages:
+            if m.aggregate_type == PRODUCT:
+                stale |= self._stale_listings(m)
+        if stale:
+            await self.redis.bump_generation(*sorted(stale))
+        if any(m.event_type in self.AUTOCOMPLETE_EVENTS for m in messages):
+            await self.redis.bump_generation("autocomplete")
+
+    @classmethod
+    def _stale_listings(cls, message: OutboxMessage) -> set[str]:
+        """
+        Listing caches an event makes stale. Stock moves with every order
+        line, so it only counts when a product goes in or out of stock.
+        """
+        both = {"product-facets", "category-products"}
+        if message.event_type in ("product.created", "product.deleted"):
+            return both
+        if message.event_type == "product.updated":
+            # Category pages show every field; facets depend on a few.
+            fields = set(message.payload.get("fields") or cls.FACET_FIELDS)
+            return both if fields & cls.FACET_FIELDS else {"category-products"}
+        if message.event_type == "product.stock_changed":
+            stock = message.payload.get("stock_quantity")
+            delta = message.payload.get("delta")
+            if stock is None or delta is None:
+                return both
+            return both if (stock > 0) != (stock - delta > 0) else set()
+        return set()
+
+
+class AutocompletePublisher:
+    """Announces changed product ids to every API worker's in-memory indexes."""
+
+    name = "autocomplete"
+
+    def __init__(self, redis: RedisClient):
+        self.redis = redis
+
+    async def handle(self, messages: list[OutboxMessage]) -> None:
+        product_ids = list(
+            dict.fromkeys(
+                m.aggregate_id for m in messages if m.aggregate_type == PRODUCT
+            )
+        )
+        if product_ids:
+            await self.redis.client.publish(
+                PRODUCT_CHANGES_CHANNEL, json.dumps(product_ids)
+            )
+
+
+@dataclass
+class _Pass:
+    """What one consumer's delivery pass read and how each event ended."""
+
+    messages: list[OutboxMessage]
+    due: dict[int, bool]
+    attempts: dict[int, int]
+    owed_entities: set[tuple[str, int]]
+    cursor: int | None
+    delivered: list[int] = field(default_factory=list)
+    failed: dict[int, tuple[str, datetime, bool]] = field(default_factory=dict)
+    held: list[int] = field(default_factory=list)
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        consumers: list[OutboxConsumer],
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        poll_interval: float = settings.OUTBOX_POLL_INTERVAL_SECONDS,
+        max_attempts: int = settings.OUTBOX_MAX_ATTEMPTS,
+        retry_base: float = settings.OUTBOX_RETRY_BASE_SECONDS,
+        retry_max: float = settings.OUTBOX_RETRY_MAX_SECONDS,
+    ):
+        self.consumers = consumers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    async def run_once(self) -> int:
+        """
+        One delivery pass per consumer, side by side. Returns the most new
+        events any consumer read.
+        """
+        fetched = await asyncio.gather(
+            *(self._deliver(consumer) for consumer in self.consumers)
+        )
+        return max(fetched, default=0)
+
+    async def run_forever(self, stop: asyncio.Event) -> None:
+        last_cleanup = datetime.min
+        while not stop.is_set():
+            fetched = 0
+            try:
+                fetched = await self.run_once()
+                if datetime.utcnow() - last_cleanup > timedelta(hours=1):
+                    await asyncio.to_thread(self._cleanup)
+                    last_cleanup = datetime.utcnow()
+            except Exception:
+                logger.exception("Outbox relay iteration failed")
+
+            # A full batch means there is probably more waiting.
+            if fetched < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def retry_delay(self, attempts: int) -> timedelta:
+        """Exponential backoff after the `attempts`-th failed delivery."""
+        seconds = self.retry_base * 2 ** max(attempts - 1, 0)
+        return timedelta(seconds=min(seconds, self.retry_max))
+
+    async def _deliver(self, consumer: OutboxConsumer) -> int:
+        """
+        Hand `consumer` its due retries, then the events after its cursor.
+
+        An entity whose event failed, or is still waiting for its retry,
+        keeps its later events back, so each consumer sees every entity's
+        events in commit order. Other entities carry on.
+        """
+        state = await asyncio.to_thread(self._read, consumer.name)
+        blocked: set[tuple[str, int]] = set()
+        eligible: list[OutboxMessage] = []
+        for m in state.messages:
+            if m.entity_key in blocked or not state.due[m.id]:
+                blocked.add(m.entity_key)
+                if m.id not in state.attempts:
+                    state.held.append(m.id)
+            elif m.id not in state.attempts and m.entity_key in state.owed_entities:
+                # Owes older events beyond this pass's window of retries.
+                state.held.append(m.id)
+            else:
+                eligible.append(m)
+
+        if eligible:
+            try:
+                await consumer.handle(eligible)
+                state.delivered = [m.id for m in eligible]
+            except Exception as e:
+                logger.warning(
+                    f"Outbox delivery to {consumer.name} failed, "
+                    f"retrying per entity: {e}"
+                )
+                await self._deliver_per_entity(consumer, eligible, state)
+
+        await asyncio.to_thread(self._settle, consumer.name, state)
+        if eligible:
+            logger.info(
+                f"Outbox relay delivered {len(state.delivered)} event(s) to "
+                f"{consumer.name}, {len(state.failed)} failed"
+            )
+        return sum(m.id not in state.attempts for m in state.messages)
+
+    async def _deliver_per_entity(
+        self,
+        consumer: OutboxConsumer,
+        messages: list[OutboxMessage],
+        state: _Pass,
+    ) -> None:
+        # A failed entity stops at its first event; the rest wait behind it.
+        groups: dict[tuple[str, int], list[OutboxMessage]] = {}
+        for m in messages:
+            groups.setdefault(m.entity_key, []).append(m)
+        for group in groups.values():
+            try:
+                await consumer.handle(group)
+                state.delivered.extend(m.id for m in group)
+            except Exception as e:
+                first = group[0]
+                attempts = state.attempts.get(first.id, 0) + 1
+                state.failed[first.id] = (
+                    str(e) or type(e).__name__,
+                    datetime.utcnow() + self.retry_delay(attempts),
+                    attempts >= self.max_attempts,
+                )
+                state.held.extend(m.id for m in group[1:] if m.id not in state.attempts)
+
+    def _read(self, consumer: str) -> _Pass:
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            crud = OutboxCrud(db)
+            retries = crud.get_retries(consumer, self.batch_size)
+            events = crud.get_events_after(crud.get_cursor(consumer), self.batch_size)
+            owed = crud.get_entities_with_retries(
+                consumer, {(e.aggregate_type, e.aggregate_id) for e in events}
+            )
+            messages = [_message(e) for e, _ in retries] + [_message(e) for e in events]
+            due = {e.id: d.next_attempt_at <= now for e, d in retries}
+            due.update((e.id, True) for e in events)
+            return _Pass(
+                messages=messages,
+                due=due,
+                attempts={e.id: d.attempts for e, d in retries},
+                owed_entities=owed,
+                cursor=events[-1].id if events else None,
+            )
+
+    @staticmethod
+    def _settle(consumer: str, state: _Pass) -> None:
+        with SessionLocal() as db:
+            OutboxCrud(db).settle(
+                consumer, state.cursor, state.delivered, state.failed, state.held
+            )
+
+    def _cleanup(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+        with SessionLocal() as db:
+            removed = OutboxCrud(db).delete_delivered_before(
+                cutoff, [c.name for c in self.consumers]
+            )
+        if removed:
+            logger.info(f"Removed {removed} delivered outbox event(s)")
+
+
+def _message(event: OutboxEvent) -> OutboxMessage:
+    return OutboxMessage(
+        id=event.id,
+        aggregate_type=event.aggregate_type,
+        aggregate_id=event.aggregate_id,
+        event_type=event.event_type,
+        payload=event.payload or {},
+    )
+
+
+async def main() -> None:
+    from app.core.redis import redis_client
+
+    await redis_client.connect()
+    relay = OutboxRelay(
+        consumers=[
+            ElasticIndexConsumer(),
+            CacheInvalidationConsumer(redis_client),
+            AutocompletePublisher(redis_client),
+        ]
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Outbox relay started")
+    try:
+        await relay.run_forever(stop)
+    finally:
+        await redis_client.close()
+        await close_es_client()
+        logger.info("Outbox relay stopped")
+
+
+def replay_dead_letters(consumer: str | None = None) -> None:
+    with SessionLocal() as db:
+        replayed = OutboxCrud(db).replay_dead_letters(consumer)
+    logger.info(f"Replaying {replayed} dead-lettered outbox delivery(ies)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outbox relay")
+    parser.add_argument("--replay-dead-letters", action="store_true")
+    parser.add_argument("--consumer", help="only this consumer's dead letters")
+    args = parser.parse_args()
+    if args.replay_dead_letters:
+        replay_dead_letters(args.consumer)
+    else:
+        asyncio.run(main())
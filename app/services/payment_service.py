@@ -3,6 +3,7 @@ from fastapi import HTTPException, status
 from app.core.config import settings
 from app.crud.payment import PaymentCrud
 from app.crud.order import OrderCrud
+from app.crud.outbox import ORDER, OutboxCrud
 from app.models.order import Order
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -13,6 +14,7 @@ class PaymentService:
         self.db = db
         self.payment_crud = PaymentCrud(db)
         self.order_crud = OrderCrud(db)
+        self.outbox = OutboxCrud(db)
 
     def create_payment_intent(self, user_id: int, order_id: int):
         # get order
@@ -80,6 +82,9 @@ class PaymentService:
             if order:
                 order.payment_status = "success"
                 order.status = "paid"
+                self.outbox.add_event(
+                    ORDER, order.id, "order.status_changed", {"status": "paid"}
+                )
                 self.db.commit()
 
     def _handle_failed_payment(self, payment_intent):
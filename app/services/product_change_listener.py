@@ -0,0 +1,72 @@
+"""
+Follows product changes for the per-worker in-memory indexes.
+
+The outbox relay publishes changed product ids on PRODUCT_CHANGES_CHANNEL.
+Pub/sub delivery is at-most-once, so every index is also rebuilt from the
+database after each (re)subscribe and whenever it reports itself stale.
+"""
+
+import asyncio
+import json
+from typing import Protocol
+
+from app.core.logger import logger
+from app.core.redis import RedisClient
+
+PRODUCT_CHANGES_CHANNEL = "product-changes"
+
+
+class LocalIndexSync(Protocol):
+    name: str
+
+    async def rebuild(self) -> None: ...
+
+    async def apply_changes(self, product_ids: list[int]) -> None:
+        """Re-read changed products; inactive or deleted ones leave the index."""
+        ...
+
+    def is_stale(self) -> bool: ...
+
+
+async def _rebuild_stale(syncs: list[LocalIndexSync]) -> None:
+    for sync in syncs:
+        if sync.is_stale():
+            try:
+                await sync.rebuild()
+            except Exception as e:
+                logger.warning(f"{sync.name} index build failed: {e}")
+
+
+async def run_product_change_listener(
+    redis: RedisClient, syncs: list[LocalIndexSync]
+) -> None:
+    """Build the indexes, then follow product changes until cancelled."""
+    while True:
+        pubsub = None
+        try:
+            pubsub = redis.client.pubsub()
+            # Subscribe before building so no change falls between the two.
+            await pubsub.subscribe(PRODUCT_CHANGES_CHANNEL)
+            for sync in syncs:
+                await sync.rebuild()
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    product_ids = json.loads(message["data"])
+                    for sync in syncs:
+                        await sync.apply_changes(product_ids)
+                else:
+                    await _rebuild_stale(syncs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Product change listener failed: {e}")
+            # Without change events a periodically rebuilt index still beats
+            # a round trip per request.
+            await _rebuild_stale(syncs)
+            await asyncio.sleep(5)
+        finally:
+            if pubsub is not None:
+                await pubsub.aclose()
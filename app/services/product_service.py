@@ -1,15 +1,40 @@
+import hashlib
+import json
 from typing import List, Optional
 
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.config import settings
 from app.core.exceptions import ProductException
+from app.core.metrics import AUTOCOMPLETE_BACKEND_LATENCY, observe_latency
 from app.core.logger import logger
 from app.core.redis import RedisClient
 from app.crud.category import CategoryCrud
 from app.crud.product import ProductCrud
 from app.schema.product_schema import ProductCreate, ProductResponse, ProductUpdate
 from app.schema.common_schema import PaginatedResponse
+from app.schema.search_schema import ProductListingFacets
+from app.services.autocomplete_index import autocomplete_index
+from app.services.catalog_index import catalog_index
+from app.services.elasticsearch_service import ElasticService
+from app.utils.cursor import decode_cursor, encode_cursor
+from app.utils.es_utils import build_product_document
+
+# Shared by every request in this worker, so failures seen by one request
+# spare the others from waiting on the same broken backend. Elasticsearch
+# calls go through ElasticService's own breaker.
+autocomplete_db_breaker = CircuitBreaker("autocomplete_database")
+
+# Listing sorts Elasticsearch can serve; "id" is the listing default and
+# means "no explicit order", which for a text search is relevance.
+ES_LISTING_SORTS = {
+    "id": "relevance",
+    "name": "name",
+    "price": "price",
+    "created_at": "created_at",
+}
 
 
 class ProductService:
@@ -88,6 +113,7 @@ class ProductService:
         availability: str | None = "all",
         sort_by: str | None = "id",
         sort_order: str | None = "asc",
+        include_subcategories: bool = False,
     ) -> PaginatedResponse[ProductResponse]:
         """
         List all products with advanced filtering and sorting.
@@ -103,6 +129,7 @@ class ProductService:
             availability: Stock filter ('all', 'in_stock', 'out_of_stock')
             sort_by: Sort field
             sort_order: Sort direction ('asc' or 'desc')
+            include_subcategories: Let category_id match its whole subtree
         """
         try:
             products = self.crud.get_all_products(
@@ -116,6 +143,7 @@ class ProductService:
                 availability,
                 sort_by,
                 sort_order,
+                include_subcategories,
             )
             return products
         except Exception as e:
@@ -125,6 +153,264 @@ class ProductService:
                 detail="failed to fetch products",
             )
 
+    async def get_listing_facets(
+        self,
+        search: str | None = None,
+        category_id: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        availability: str | None = "all",
+        include_subcategories: bool = False,
+    ) -> ProductListingFacets:
+        """
+        Facet counts for a listing, cached by filter signature.
+
+        Entries expire after FACET_CACHE_TTL_SECONDS, and the outbox relay
+        retires them all by bumping the cache generation whenever a product
+        changes.
+        """
+        signature = json.dumps(
+            [
+                search.casefold().strip() if search else None,
+                category_id,
+                min_price,
+                max_price,
+                min_rating,
+                availability,
+                include_subcategories,
+            ]
+        )
+        digest = hashlib.sha1(signature.encode()).hexdigest()
+        cache_key = None
+        try:
+            generation = await self.redis_client.generation("product-facets")
+            cache_key = f"product-facets:{generation}:{digest}"
+            cached = await self.redis_client.get_json(cache_key)
+        except Exception as e:
+            logger.warning(f"Facet cache read failed: {e}")
+            cached = None
+        if cached:
+            return ProductListingFacets.model_validate_json(cached)
+
+        facets = ProductListingFacets.model_validate(
+            self.crud.get_listing_facets(
+                search,
+                category_id,
+                min_price,
+                max_price,
+                min_rating,
+                availability,
+                include_subcategories,
+            )
+        )
+        if cache_key is None:
+            return facets
+        try:
+            await self.redis_client.set_json(
+                cache_key,
+                facets.model_dump_json(),
+                ex=settings.FACET_CACHE_TTL_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(f"Facet cache write failed: {e}")
+        return facets
+
+    def search_products_in_database(
+        self,
+        q: str | None = None,
+        category_id: int | None = None,
+        category: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool | None = None,
+        sort_by: str = "relevance",
+        sort_order: str = "asc",
+        page: int = 1,
+        per_page: int = 20,
+    ) -> dict:
+        """
+        Degraded-mode stand-in for ElasticService.search_products.
+
+        Answers the same filters from the catalog index or the SQL listing,
+        in the same result shape, without relevance scores, highlights or
+        facets.
+        """
+        if category_id is None and category:
+            found = CategoryCrud(self.db).get_category_by_name(category)
+            if found is None:
+                return {"total": 0, "took_ms": 0, "results": [], "degraded": True}
+            category_id = found.id
+
+        availability = {True: "in_stock", False: "out_of_stock"}.get(in_stock, "all")
+        sort = sort_by if sort_by in ES_LISTING_SORTS else "id"
+        listing = None
+        if q:
+            listing = self.search_products_in_catalog_index(
+                page,
+                per_page,
+                q,
+                category_id,
+                min_price,
+                max_price,
+                None,
+                availability,
+                sort,
+                sort_order,
+            )
+        if listing is None:
+            listing = self.crud.get_all_products(
+                page,
+                per_page,
+                q,
+                category_id,
+                min_price,
+                max_price,
+                None,
+                availability,
+                sort,
+                sort_order,
+            )
+        return {
+            "total": listing.meta.total_items,
+            "took_ms": 0,
+            "degraded": True,
+            "results": [
+                {
+                    "id": str(p.id),
+                    "score": None,
+                    "data": build_product_document(p),
+                    "highlight": {},
+                }
+                for p in listing.data
+            ],
+        }
+
+    def search_products_in_catalog_index(
+        self,
+        page: int,
+        per_page: int,
+        search: str,
+        category_id: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        availability: str | None = "all",
+        sort_by: str | None = "id",
+        sort_order: str | None = "asc",
+        include_subcategories: bool = False,
+    ) -> PaginatedResponse[ProductResponse] | None:
+        """
+        Serve a product listing search from this worker's catalog index.
+
+        Matches whole words (the last one as a prefix) ranked by BM25 rather
+        than substrings. Returns None until the index has been built, and
+        for queries it can't answer (see BM25Index.can_answer), so the caller
+        falls back to the SQL search.
+        """
+        if not catalog_index.ready or not catalog_index.can_answer(search):
+            return None
+
+        page = max(page, 1)
+        per_page = max(min(per_page, 100), 1)
+        total, ids = catalog_index.search(
+            search,
+            category_id=self._category_filter(category_id, include_subcategories),
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            availability=availability,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            offset=(page - 1) * per_page,
+            limit=per_page,
+        )
+        items = self.crud.get_products_by_ids(ids)
+        return self.crud.build_page(
+            items,
+            total,
+            page,
+            per_page,
+            search=search,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            availability=availability,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            include_subcategories=include_subcategories,
+        )
+
+    def _category_filter(
+        self, category_id: int | None, include_subcategories: bool
+    ) -> int | list[int] | None:
+        """The category, or with include_subcategories every id in its subtree."""
+        if category_id and include_subcategories:
+            return CategoryCrud(self.db).get_subtree_ids(category_id)
+        return category_id
+
+    async def search_products(
+        self,
+        elastic: ElasticService,
+        page: int,
+        per_page: int,
+        search: str,
+        category_id: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        availability: str | None = "all",
+        sort_by: str | None = "id",
+        sort_order: str | None = "asc",
+        include_subcategories: bool = False,
+    ) -> PaginatedResponse[ProductResponse] | None:
+        """
+        Serve a product listing search from Elasticsearch.
+
+        Returns None when the index can't answer this request (unsupported
+        sort, cluster error) so the caller falls back to the SQL listing.
+        """
+        es_sort = ES_LISTING_SORTS.get(sort_by)
+        if es_sort is None:
+            return None
+
+        in_stock = {"in_stock": True, "out_of_stock": False}.get(availability)
+        try:
+            result = await elastic.search_products(
+                q=search,
+                category_id=self._category_filter(category_id, include_subcategories),
+                min_price=min_price,
+                max_price=max_price,
+                in_stock=in_stock,
+                sort_by=es_sort,
+                sort_order=sort_order,
+                page=page,
+                per_page=per_page,
+                facets=False,
+            )
+        except HTTPException as e:
+            logger.warning(f"Search index unavailable, using database: {e.detail}")
+            return None
+
+        # The index only supplies ids and ranking; rows come from the database
+        # so the response matches the regular listing exactly.
+        ids = [int(hit["id"]) for hit in result["results"]]
+        items = self.crud.get_products_by_ids(ids)
+        return self.crud.build_page(
+            items,
+            result["total"],
+            page,
+            per_page,
+            search=search,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price,
+            availability=availability,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            include_subcategories=include_subcategories,
+        )
+
     def update_product(self, id: int, update_dto: ProductUpdate) -> ProductResponse:
         """Partially update a product; maps conflicts and not-found to HTTP codes."""
         try:
@@ -157,25 +443,122 @@ class ProductService:
             )
         return None
 
-    def get_products_by_category_id(self, category_id: int) -> List[ProductResponse]:
-        products = self.crud.get_products_by_category_id(category_id)
+    def get_products_by_category_id(
+        self, category_id: int, include_subcategories: bool = False
+    ) -> List[ProductResponse]:
+        products = self.crud.get_products_by_category_id(
+            category_id, include_subcategories
+        )
         return [ProductResponse.model_validate(p) for p in products]
 
-    def get_products_by_category_slug(self, slug: str) -> List[ProductResponse]:
-        category = CategoryCrud(self.db).get_category_by_slug(slug)
-        if category is None:
+    async def get_products_by_category_slug(
+        self,
+        slug: str,
+        page: int = 1,
+        per_page: int = 20,
+        cursor: str | None = None,
+        include_subcategories: bool = False,
+    ) -> PaginatedResponse[ProductResponse]:
+        """
+        Paginated products of a category, cached for a short while.
+
+        Rows are projected straight to response fields by one slug join,
+        so no product is loaded as an ORM object. Pass the previous page's
+        `next_cursor` to walk a large category at constant cost per page:
+        the category is counted for the first page only, and the cursor
+        carries that total and the position on to later pages.
+        """
+        page = max(page, 1)
+        per_page = max(min(per_page, 100), 1)
+        state = decode_cursor(cursor, ("after", "total", "offset")) if cursor else None
+        if state is not None and not all(
+            isinstance(state[k], int) and not isinstance(state[k], bool)
+            for k in ("after", "total", "offset")
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+        cache_key = None
+        try:
+            generation = await self.redis_client.generation("category-products")
+            cache_key = (
+                f"category-products:{generation}:{slug}:{int(include_subcategories)}:"
+                f"{per_page}:{cursor or page}"
+            )
+            cached = await self.redis_client.get_json(cache_key)
+        except Exception as e:
+            logger.warning(f"Category products cache read failed: {e}")
+            cached = None
+        if cached:
+            return PaginatedResponse[ProductResponse].model_validate_json(cached)
+
+        rows, more, total = self.crud.get_category_products_page(
+            slug,
+            page,
+            per_page,
+            state["after"] if state else None,
+            include_subcategories,
+            count=state is None,
+        )
+        if state is None:
+            offset = (page - 1) * per_page
+        else:
+            total, offset = state["total"], state["offset"]
+        if total == 0 and CategoryCrud(self.db).get_category_by_slug(slug) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Category not found"
             )
-        products = self.crud.get_products_by_category_id(category.id)
-        return [ProductResponse.model_validate(p) for p in products]
 
-    async def get_autocomplete_suggestions(self, query: str) -> List[str]:
+        next_cursor = None
+        if more:
+            next_cursor = encode_cursor(
+                {
+                    "after": rows[-1]["id"],
+                    "total": total,
+                    "offset": offset + len(rows),
+                }
+            )
+        result = self.crud.build_page(
+            [ProductResponse.model_validate(row) for row in rows],
+            total,
+            offset // per_page + 1,
+            per_page,
+            include_subcategories=include_subcategories,
+            path=f"/product/category/{slug}",
+            next_cursor=next_cursor,
+        )
+        if cache_key is None:
+            return result
+        try:
+            await self.redis_client.set_json(
+                cache_key,
+                result.model_dump_json(),
+                ex=settings.CATEGORY_PRODUCTS_CACHE_TTL_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(f"Category products cache write failed: {e}")
+        return result
+
+    async def get_autocomplete_suggestions(
+        self,
+        query: str,
+        category: str | None = None,
+        elastic: ElasticService | None = None,
+    ) -> List[str]:
         """
         Get product name suggestions for autocomplete with Redis caching.
 
+        Answered from this worker's in-memory prefix index once it is built.
+        Until then the Elasticsearch completion suggester serves, and the
+        ILIKE queries are only a fallback; both sit behind circuit breakers
+        so an outage costs one skipped call rather than a timeout per
+        keystroke.
+
         Args:
             query: Search query (minimum 2 characters)
+            category: Restrict suggestions to this category name
+            elastic: Connected search service, if any
 
         Returns:
             List of product name suggestions (max 10)
@@ -186,26 +569,56 @@ class ProductService:
                 detail="Query must be at least 2 characters",
             )
 
+        if autocomplete_index.ready:
+            with observe_latency(AUTOCOMPLETE_BACKEND_LATENCY, backend="memory"):
+                return autocomplete_index.search(query, category=category, limit=10)
+
         # Normalize query for cache key
-        cache_key = f"autocomplete:{query.lower()}"
+        try:
+            generation = await self.redis_client.generation("autocomplete")
+        except Exception as e:
+            logger.warning(f"Autocomplete cache unavailable: {e}")
+            generation = None
+        cache_key = f"autocomplete:{generation}:{category or 'all'}:{query.lower()}"
 
         # Try cache first
-        cached_suggestions = await self.redis_client.get_json(cache_key)
+        cached_suggestions = None
+        if generation is not None:
+            cached_suggestions = await self.redis_client.get_json(cache_key)
         if cached_suggestions:
             logger.info(f"Cache hit for autocomplete: {query}")
-            import json
-
             return json.loads(cached_suggestions)
 
         logger.info(f"Cache miss for autocomplete: {query}")
 
-        # Get suggestions from database
-        suggestions = self.crud.get_product_suggestions(query, limit=10)
+        suggestions = None
+        if elastic is not None:
+            try:
+                with observe_latency(
+                    AUTOCOMPLETE_BACKEND_LATENCY, backend="elasticsearch"
+                ):
+                    suggestions = await elastic.complete(
+                        query, size=10, category=category
+                    )
+            except Exception as e:
+                logger.warning(f"Autocomplete suggester failed, using database: {e}")
 
-        # Cache for 1 hour (3600 seconds)
-        if suggestions:
-            import json
+        if suggestions is None:
+            if not autocomplete_db_breaker.allow_request():
+                return []
+            try:
+                with observe_latency(AUTOCOMPLETE_BACKEND_LATENCY, backend="database"):
+                    suggestions = self.crud.get_product_suggestions(
+                        query, limit=10, category=category
+                    )
+                autocomplete_db_breaker.record_success()
+            except Exception as e:
+                autocomplete_db_breaker.record_failure()
+                logger.warning(f"Autocomplete database fallback failed: {e}")
+                return []
 
+        # Cache for 1 hour (3600 seconds)
+        if suggestions and generation is not None:
             await self.redis_client.set_json(
                 cache_key, json.dumps(suggestions), ex=3600
             )
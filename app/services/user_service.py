@@ -9,11 +9,18 @@ from app.models.user import User
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from app.crud.user import UserCrud
-from app.utils.security import verify_password, create_token
+from app.utils.security import create_token
+from app.core.password_hasher import PasswordHasher, PasswordHasherBusy, password_hasher
+from app.core.user_cache import UserCache
 
 
 class UserService:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        cache: UserCache | None = None,
+        hasher: PasswordHasher = password_hasher,
+    ):
         """
         Initialize the UserService with a database session.
 
@@ -22,11 +29,15 @@ class UserService:
 
         Parameters:
         - db (Session): The SQLAlchemy database session for performing queries and commits.
+        - cache (UserCache | None): The cache of authenticated users, invalidated when a user changes.
+        - hasher (PasswordHasher): Runs Argon2 hashing and verification off the event loop.
         """
         self.db = db
         self.crud = UserCrud(db=db)
+        self.cache = cache
+        self.hasher = hasher
 
-    def create_user(self, user_create_data: CreateUserSchema) -> UserPublic:
+    async def create_user(self, user_create_data: CreateUserSchema) -> UserPublic:
         """
         Create a new user based on the provided data.
 
@@ -41,16 +52,23 @@ class UserService:
 
         Raises:
         - HTTPException: 400 Bad Request if a user with the same email already exists.
+        - HTTPException: 503 Service Unavailable if the password hasher is saturated.
         """
         if self.crud.get_user_by_email(user_create_data.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email already exists",
             )
-        user = self.crud.create_user(user_create_data=user_create_data)
+        try:
+            hashed_password = await self.hasher.hash(user_create_data.password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+        user = self.crud.create_user(
+            user_create_data=user_create_data, password_hash=hashed_password
+        )
         return UserPublic.model_validate(user)
 
-    def authenticate_user(self, user_login_data: LoginSchema) -> User:
+    async def authenticate_user(self, user_login_data: LoginSchema) -> User:
         """
         Authenticate a user based on login credentials.
 
@@ -62,15 +80,24 @@ class UserService:
 
         Returns:
         - User: The authenticated user object if credentials are valid, otherwise None.
+
+        Raises:
+        - HTTPException: 503 Service Unavailable if the password hasher is saturated.
         """
         user = self.crud.get_user_by_email(email=user_login_data.email)
         if not user:
             return None
-        if not verify_password(user_login_data.password, user.password_hash):
+        try:
+            verified = await self.hasher.verify(
+                user_login_data.password, user.password_hash
+            )
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+        if not verified:
             return None
         return user
 
-    def login(self, user_login_data: LoginSchema) -> TokenSchema:
+    async def login(self, user_login_data: LoginSchema) -> TokenSchema:
         """
         Handle user login and generate an access token.
 
@@ -85,7 +112,25 @@ class UserService:
         Raises:
         - HTTPException: 401 Unauthorized if authentication fails.
         """
-        user = self.authenticate_user(user_login_data=user_login_data)
+        _, token = await self.login_user(user_login_data=user_login_data)
+        return token
+
+    async def login_user(
+        self, user_login_data: LoginSchema
+    ) -> tuple[User, TokenSchema]:
+        """
+        Authenticate a user and return them along with a new access token.
+
+        Parameters:
+        - user_login_data (LoginSchema): The schema containing email and password for login.
+
+        Returns:
+        - tuple[User, TokenSchema]: The authenticated user and their token.
+
+        Raises:
+        - HTTPException: 401 Unauthorized if authentication fails.
+        """
+        user = await self.authenticate_user(user_login_data=user_login_data)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -93,7 +138,7 @@ class UserService:
             )
         access_token_payload = {"sub": str(user.id)}
         access_token = create_token(data=access_token_payload)
-        return TokenSchema(token=access_token, token_type="Bearer")
+        return user, TokenSchema(token=access_token, token_type="Bearer")
 
     def get_user_by_id(self, id: int) -> User:
         """
@@ -118,7 +163,9 @@ class UserService:
             )
         return user
 
-    def update_user(self, id: int, update_user_data: UpdateUserSchema) -> UserPublic:
+    async def update_user(
+        self, id: int, update_user_data: UpdateUserSchema
+    ) -> UserPublic:
         """
         Update an existing user's information.
 
@@ -144,11 +191,13 @@ class UserService:
             setattr(user, field, value)
         self.db.commit()
         self.db.refresh(user)
+        if self.cache is not None:
+            await self.cache.invalidate(id)
         return UserPublic.model_validate(
             user
         )  # Note: Added model_validate for consistency with return type
 
-    def delete_user(self, id: int):
+    async def delete_user(self, id: int):
         """
         Delete a user by their ID.
 
@@ -167,4 +216,14 @@ class UserService:
             )
         self.db.delete(user)
         self.db.commit()
+        if self.cache is not None:
+            await self.cache.invalidate(id)
         return
+
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
@@ -2,6 +2,9 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from typing import List
 
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis import RedisClient
 from app.crud.wishlist import WishlistCrud
 from app.crud.product import ProductCrud
 from app.crud.cart_item import CartCrud
@@ -12,22 +15,44 @@ from app.schema.wishlist_schema import (
     WishlistActionResponse,
 )
 
+# Always in a cached membership set, so an empty wishlist can be cached too;
+# product ids start at 1.
+_LOADED_MARKER = 0
+
+# KEYS[1] membership set, KEYS[2] its version; ARGV[1] the version read
+# before loading from the database, ARGV[2] TTL, ARGV[3..] members. Writes
+# only if no change bumped the version meanwhile, so a slow load cannot put
+# back a set that an add or remove has already invalidated.
+_WRITE_BACK_LUA = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SADD', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def _membership_keys(user_id: int) -> tuple[str, str]:
+    return f"wishlist-products:{user_id}", f"wishlist-version:{user_id}"
+
 
 class WishlistService:
     """Service layer for wishlist operations"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, redis: RedisClient | None = None):
         self.db = db
+        self.redis_client = redis
         self.wishlist_crud = WishlistCrud(db=db)
         self.product_crud = ProductCrud(db=db)
         self.cart_crud = CartCrud(db=db)
 
-    def add_product_to_wishlist(
+    async def add_product_to_wishlist(
         self, user_id: int, product_id: int
     ) -> WishlistActionResponse:
         """Add a product to user's wishlist"""
         # Check if product exists
-        product = self.product_crud.get_product_by_id(product_id=product_id)
+        product = self.product_crud.get_product_by_id(product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
@@ -44,11 +69,12 @@ class WishlistService:
                 message="Product is already in your wishlist", product_id=product_id
             )
 
+        await self._invalidate_membership(user_id)
         return WishlistActionResponse(
             message="Product added to wishlist successfully", product_id=product_id
         )
 
-    def remove_product_from_wishlist(
+    async def remove_product_from_wishlist(
         self, user_id: int, product_id: int
     ) -> WishlistActionResponse:
         """Remove a product from user's wishlist"""
@@ -62,29 +88,15 @@ class WishlistService:
                 detail="Product not found in wishlist",
             )
 
+        await self._invalidate_membership(user_id)
         return WishlistActionResponse(
             message="Product removed from wishlist successfully", product_id=product_id
         )
 
     def get_wishlist(self, user_id: int) -> WishlistResponse:
         """Get user's wishlist with product details"""
-        wishlist_items = self.wishlist_crud.get_user_wishlist(user_id=user_id)
-
-        items_response = []
-        for item in wishlist_items:
-            items_response.append(
-                WishlistItemResponse(
-                    id=item.id,
-                    product_id=item.product.id,
-                    product_name=item.product.name,
-                    product_slug=item.product.slug,
-                    product_price=float(item.product.price),
-                    product_image_url=item.product.image_url,
-                    product_stock_quantity=item.product.stock_quantity,
-                    product_is_active=item.product.is_active,
-                    added_at=item.created_at,
-                )
-            )
+        rows = self.wishlist_crud.get_user_wishlist(user_id=user_id)
+        items_response = [WishlistItemResponse.model_validate(row) for row in rows]
 
         return WishlistResponse(items=items_response, total_count=len(items_response))
 
@@ -93,14 +105,17 @@ class WishlistService:
         count = self.wishlist_crud.get_wishlist_count(user_id=user_id)
         return WishlistStatsResponse(count=count)
 
-    def clear_wishlist(self, user_id: int) -> WishlistActionResponse:
+    async def clear_wishlist(self, user_id: int) -> WishlistActionResponse:
         """Clear all items from user's wishlist"""
         count = self.wishlist_crud.clear_wishlist(user_id=user_id)
+        await self._invalidate_membership(user_id)
         return WishlistActionResponse(
             message=f"Wishlist cleared successfully. {count} item(s) removed."
         )
 
-    def move_to_cart(self, user_id: int, product_id: int) -> WishlistActionResponse:
+    async def move_to_cart(
+        self, user_id: int, product_id: int
+    ) -> WishlistActionResponse:
         """Move a wishlist item to shopping cart"""
         # Check if product is in wishlist
         wishlist_item = self.wishlist_crud.get_wishlist_item(
@@ -144,6 +159,7 @@ class WishlistService:
 
         # Remove from wishlist
         self.wishlist_crud.remove_from_wishlist(user_id=user_id, product_id=product_id)
+        await self._invalidate_membership(user_id)
 
         return WishlistActionResponse(
             message="Product moved to cart successfully", product_id=product_id
@@ -152,3 +168,62 @@ class WishlistService:
     def is_in_wishlist(self, user_id: int, product_id: int) -> bool:
         """Check if a product is in user's wishlist"""
         return self.wishlist_crud.is_in_wishlist(user_id=user_id, product_id=product_id)
+
+    async def get_membership(
+        self, user_id: int, product_ids: List[int]
+    ) -> dict[int, bool]:
+        """
+        Whether each product is in the user's wishlist.
+
+        Answered with one SMISMEMBER against a per-user Redis set of
+        wishlisted product ids, loaded from the database on a miss and
+        dropped whenever the wishlist changes. Every change also bumps a
+        per-user version, and a load is only written back if the version
+        is still the one read before it.
+        """
+        if not product_ids:
+            return {}
+        key, version_key = _membership_keys(user_id)
+        seen = None
+        if self.redis_client is not None:
+            try:
+                pipe = self.redis_client.client.pipeline(transaction=False)
+                pipe.smismember(key, [_LOADED_MARKER, *product_ids])
+                pipe.get(version_key)
+                flags, version = await pipe.execute()
+                if flags[0]:
+                    return {p: bool(f) for p, f in zip(product_ids, flags[1:])}
+                seen = version or ""
+            except Exception as e:
+                logger.warning(f"Wishlist membership cache read failed: {e}")
+
+        wishlisted = set(self.wishlist_crud.get_product_ids(user_id))
+        if seen is not None:
+            try:
+                write_back = self.redis_client.client.register_script(_WRITE_BACK_LUA)
+                await write_back(
+                    keys=[key, version_key],
+                    args=[
+                        seen,
+                        settings.WISHLIST_CACHE_TTL_SECONDS,
+                        _LOADED_MARKER,
+                        *wishlisted,
+                    ],
+                )
+            except Exception as e:
+                logger.warning(f"Wishlist membership cache write failed: {e}")
+        return {p: p in wishlisted for p in product_ids}
+
+    async def _invalidate_membership(self, user_id: int) -> None:
+        if self.redis_client is None:
+            return
+        key, version_key = _membership_keys(user_id)
+        try:
+            pipe = self.redis_client.client.pipeline()
+            pipe.incr(version_key)
+            # Kept as long as the set it guards could live.
+            pipe.expire(version_key, settings.WISHLIST_CACHE_TTL_SECONDS)
+            pipe.delete(key)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Wishlist membership cache invalidation failed: {e}")
@@ -0,0 +1,78 @@
+"""
+Login throughput benchmark: inline Argon2 against the PasswordHasher pool.
+
+Runs a burst of password verifications, the CPU cost of a login, on one
+event loop as the API does, while a ticker measures how long other requests
+on the loop would have waited:
+
+    python -m app.utils.bench_login --logins 200 --workers 4
+
+"inline" is the old behaviour (verify_password called in the handler),
+"pool" is PasswordHasher with --workers processes.
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.core.password_hasher import PasswordHasher
+from app.utils.security import hash_password, verify_password
+
+PASSWORD = "benchmark-password"
+
+
+async def _ticker(stop: asyncio.Event, interval: float, stalls: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def _inline_login(hashed: str) -> bool:
+    return verify_password(PASSWORD, hashed)
+
+
+async def run(mode: str, logins: int, workers: int) -> None:
+    hashed = hash_password(PASSWORD)
+    hasher = PasswordHasher(workers=workers, max_pending=logins)
+    if mode == "pool":
+        hasher.start()
+        # Let the workers finish starting before timing anything.
+        await hasher.verify(PASSWORD, hashed)
+
+    stop = asyncio.Event()
+    stalls: list[float] = []
+    ticker = asyncio.create_task(_ticker(stop, 0.005, stalls))
+    started = time.perf_counter()
+    if mode == "pool":
+        await asyncio.gather(*(hasher.verify(PASSWORD, hashed) for _ in range(logins)))
+    else:
+        await asyncio.gather(*(_inline_login(hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    hasher.close()
+
+    stalls.sort()
+    worst = stalls[-1] if stalls else elapsed
+    p99 = stalls[int(len(stalls) * 0.99)] if stalls else elapsed
+    print(
+        f"{mode:>6}: {logins / elapsed:8.1f} logins/s  "
+        f"loop stall p99 {p99 * 1000:7.1f} ms  max {worst * 1000:7.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run(mode, args.logins, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+import heapq
+import math
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Collection, Iterable
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or the this to with".split()
+)
+# Sorts after every character a token can contain.
+_MAX_CHAR = "\U0010ffff"
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN.findall(text.casefold()) if t not in _STOPWORDS]
+
+
+@dataclass(frozen=True)
+class CatalogDocument:
+    """An active product with the fields the listing filters and sorts on."""
+
+    product_id: int
+    name: str
+    description: str | None
+    category_id: int | None
+    price: float
+    in_stock: bool
+    created_at: datetime | None
+    rating: float | None
+    popularity: int
+
+
+class _Postings:
+    __slots__ = ("docs", "tfs")
+
+    def __init__(self):
+        # Parallel arrays; doc numbers only ever grow, so `docs` stays sorted.
+        self.docs = array("I")
+        self.tfs = array("H")
+
+
+class _Segment:
+    """The index contents; replaced as a whole on rebuild."""
+
+    def __init__(self):
+        self.postings: dict[str, _Postings] = {}
+        self.vocabulary: list[str] | None = None
+        self.documents: list[CatalogDocument] = []
+        self.lengths = array("I")
+        self.live = bytearray()
+        self.doc_by_product: dict[int, int] = {}
+        self.total_length = 0
+
+    def append(self, document: CatalogDocument, name_boost: int) -> None:
+        doc = len(self.documents)
+        frequencies: dict[str, int] = {}
+        for token in tokenize(document.name):
+            frequencies[token] = frequencies.get(token, 0) + name_boost
+        for token in tokenize(document.description):
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        for term, tf in frequencies.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+                self.vocabulary = None
+            postings.docs.append(doc)
+            postings.tfs.append(min(tf, 0xFFFF))
+
+        length = sum(frequencies.values())
+        self.documents.append(document)
+        self.lengths.append(length)
+        self.live.append(1)
+        self.total_length += length
+        self.doc_by_product[document.product_id] = doc
+
+    def tombstone(self, product_id: int) -> None:
+        doc = self.doc_by_product.pop(product_id, None)
+        if doc is not None:
+            self.live[doc] = 0
+            self.total_length -= self.lengths[doc]
+
+    def expand_prefix(self, prefix: str) -> list[str]:
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        lo = bisect_left(self.vocabulary, prefix)
+        hi = bisect_right(self.vocabulary, prefix + _MAX_CHAR, lo)
+        return self.vocabulary[lo:hi]
+
+
+class BM25Index:
+    """
+    In-process full-text index over product names and descriptions.
+
+    Terms map to posting lists of (doc number, term frequency) held in
+    typed arrays and are scored with BM25; name tokens count NAME_BOOST
+    times so title matches outrank description matches. An update appends
+    the new version of a product and tombstones the old one, which keeps
+    posting lists sorted for bisecting. Once tombstones pass COMPACT_RATIO
+    of the documents, needs_compaction is set and compact() rebuilds the
+    index from the live ones; callers run it on a worker thread.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    NAME_BOOST = 3
+    COMPACT_RATIO = 0.25
+    # A shorter trailing prefix expands to too much of the vocabulary.
+    MIN_PREFIX = 2
+
+    def __init__(self):
+        self._segment = _Segment()
+        self.built_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self) -> int:
+        return len(self._segment.doc_by_product)
+
+    def rebuild(self, documents: Iterable[CatalogDocument]) -> None:
+        """Replace the contents. Safe to call from a worker thread."""
+        segment = _Segment()
+        for document in documents:
+            segment.append(document, self.NAME_BOOST)
+        # Swapped in one go so concurrent readers never see a partial index.
+        self._segment = segment
+        self.built_at = time.monotonic()
+
+    def upsert(self, document: CatalogDocument) -> None:
+        self._segment.tombstone(document.product_id)
+        self._segment.append(document, self.NAME_BOOST)
+
+    def remove(self, product_id: int) -> None:
+        self._segment.tombstone(product_id)
+
+    @property
+    def needs_compaction(self) -> bool:
+        segment = self._segment
+        dead = len(segment.documents) - len(segment.doc_by_product)
+        return dead > 64 and dead > self.COMPACT_RATIO * len(segment.documents)
+
+    def compact(self) -> None:
+        """
+        Rebuild from the live documents, dropping tombstones. Safe to call
+        from a worker thread: if the index changes meanwhile, the rebuilt
+        copy is discarded and the next compaction tries again.
+        """
+        segment = self._segment
+        size, live = len(segment.documents), len(segment.doc_by_product)
+        compacted = _Segment()
+        for doc in sorted(segment.doc_by_product.values()):
+            compacted.append(segment.documents[doc], self.NAME_BOOST)
+        if (
+            self._segment is segment
+            and len(segment.documents) == size
+            and len(segment.doc_by_product) == live
+        ):
+            self._segment = compacted
+
+    def can_answer(self, query: str) -> bool:
+        """
+        Whether `query` has terms to match: not only stopwords, and a last
+        word of at least MIN_PREFIX characters. The SQL search, which
+        matches substrings, serves the rest.
+        """
+        terms = tokenize(query)
+        return bool(terms) and len(terms[-1]) >= self.MIN_PREFIX
+
+    def search(
+        self,
+        query: str,
+        category_id: int | Collection[int] | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        availability: str | None = "all",
+        sort_by: str | None = "id",
+        sort_order: str | None = "asc",
+        offset: int = 0,
+        limit: int = 10,
+    ) -> tuple[int, list[int]]:
+        """
+        Product ids for one page of matches, plus the total match count.
+
+        Every query term must match and the last one also matches as a
+        prefix. Filters and sorts follow ProductCrud.get_all_products, except
+        that the default "id" sort ranks by score and category_id may be a
+        collection of ids (a category subtree).
+        """
+        if isinstance(category_id, int):
+            category_ids = {category_id}
+        else:
+            category_ids = set(category_id) if category_id is not None else None
+        segment = self._segment
+        scores = self._score(segment, tokenize(query))
+        documents = segment.documents
+        matches = [
+            d
+            for d in scores
+            if _accepts(
+                documents[d],
+                category_ids,
+                min_price,
+                max_price,
+                min_rating,
+                availability,
+            )
+        ]
+
+        # Only the requested page is ever ordered, not every match.
+        wanted = offset + limit
+        if sort_by in (None, "id"):
+            top = heapq.nsmallest(
+                wanted, matches, key=lambda d: (-scores[d], documents[d].product_id)
+            )
+        else:
+            key = _sort_key(documents, sort_by)
+            pick = heapq.nlargest if sort_order == "desc" else heapq.nsmallest
+            top = pick(wanted, matches, key=key)
+        return len(matches), [documents[d].product_id for d in top[offset:]]
+
+    def _score(self, segment: _Segment, terms: list[str]) -> dict[int, float]:
+        live_count = len(segment.doc_by_product)
+        if not terms or not live_count:
+            return {}
+        avg_length = segment.total_length / live_count
+
+        # One group of index terms per query term; the trailing prefix can
+        # expand to several, and a document scores its best one.
+        groups = [[t] if t in segment.postings else [] for t in terms[:-1]]
+        groups.append(segment.expand_prefix(terms[-1]))
+        if not all(groups):
+            return {}
+        # Rarest first, so later groups only probe surviving documents.
+        groups.sort(key=lambda g: sum(len(segment.postings[t].docs) for t in g))
+
+        k1, b = self.K1, self.B
+        live, lengths = segment.live, segment.lengths
+        scores: dict[int, float] | None = None
+        for group in groups:
+            group_scores: dict[int, float] = {}
+            for term in group:
+                postings = segment.postings[term]
+                df = len(postings.docs)
+                idf = math.log(1 + (live_count - df + 0.5) / (df + 0.5))
+                if scores is None:
+                    pairs = zip(postings.docs, postings.tfs)
+                elif df > 8 * len(scores):
+                    # Long list, few candidates: bisect for each candidate.
+                    pairs = _probe(postings, scores)
+                else:
+                    pairs = (
+                        (doc, tf)
+                        for doc, tf in zip(postings.docs, postings.tfs)
+                        if doc in scores
+                    )
+                for doc, tf in pairs:
+                    if not live[doc]:
+                        continue
+                    norm = k1 * (1 - b + b * lengths[doc] / avg_length)
+                    gain = idf * tf * (k1 + 1) / (tf + norm)
+                    if gain > group_scores.get(doc, 0.0):
+                        group_scores[doc] = gain
+            if scores is None:
+                scores = group_scores
+            else:
+                scores = {
+                    d: s + group_scores[d]
+                    for d, s in scores.items()
+                    if d in group_scores
+                }
+            if not scores:
+                break
+        return scores
+
+
+def _probe(postings: _Postings, docs: Iterable[int]):
+    for doc in docs:
+        i = bisect_left(postings.docs, doc)
+        if i < len(postings.docs) and postings.docs[i] == doc:
+            yield doc, postings.tfs[i]
+
+
+def _accepts(
+    document: CatalogDocument,
+    category_ids: set[int] | None,
+    min_price: float | None,
+    max_price: float | None,
+    min_rating: float | None,
+    availability: str | None,
+) -> bool:
+    if category_ids is not None and document.category_id not in category_ids:
+        return False
+    if min_price is not None and document.price < min_price:
+        return False
+    if max_price is not None and document.price > max_price:
+        return False
+    if min_rating is not None and (
+        document.rating is None or document.rating < min_rating
+    ):
+        return False
+    if availability == "in_stock":
+        return document.in_stock
+    if availability == "out_of_stock":
+        return not document.in_stock
+    return True
+
+
+def _sort_key(documents: list[CatalogDocument], sort_by: str):
+    # Ties break on id, and products without a value sort first ascending,
+    # as NULLs do in SQLite and MySQL.
+    fields = {
+        "name": lambda p: p.name,
+        "price": lambda p: p.price,
+        "created_at": lambda p: (p.created_at is not None, p.created_at),
+        "rating": lambda p: (p.rating is not None, p.rating),
+        "popularity": lambda p: p.popularity,
+    }
+    field = fields.get(sort_by)
+    if field is None:
+        return lambda d: documents[d].product_id
+    return lambda d: (field(documents[d]), documents[d].product_id)
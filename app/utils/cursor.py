@@ -0,0 +1,26 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Opaque, URL-safe pagination cursor for a JSON-serialisable state."""
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """Inverse of encode_cursor; 400 unless the state has every key in `keys`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded))
+        if not set(keys) <= state.keys():
+            raise ValueError("missing keys")
+        return state
+    except (ValueError, TypeError, AttributeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
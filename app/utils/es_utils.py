@@ -1,85 +1,469 @@
+import argparse
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
 from decimal import Decimal
+from typing import AsyncIterator, Iterator
 
-from elasticsearch import AsyncElasticsearch, helpers
-from sqlalchemy import select
+from elasticsearch import AsyncElasticsearch, NotFoundError, helpers
+from sqlalchemy import func, select
 from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.search_cache import search_cache
 from app.db.database import SessionLocal
 from app.models.product import Product
 
+# Readers and incremental writers always go through this alias; the concrete
+# indices behind it are named products_v{n} and replaced by rebuilds.
+PRODUCT_INDEX = "products"
+PRODUCT_INDEX_PREFIX = f"{PRODUCT_INDEX}_v"
 
-async def create_product_index(es: AsyncElasticsearch):
-    """create product index"""
-    mapping = {
-        "mappings": {
-            "properties": {
-                "id": {"type": "keyword"},
-                "name": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {"type": "keyword"},
-                        "english": {"type": "text", "analyzer": "english"},
-                    },
+PRODUCT_INDEX_MAPPING = {
+    "mappings": {
+        "properties": {
+            "id": {"type": "keyword"},
+            "name": {
+                "type": "text",
+                "fields": {
+                    "keyword": {"type": "keyword"},
+                    "english": {"type": "text", "analyzer": "english"},
                 },
-                "description": {"type": "text"},
-                "category": {"type": "keyword"},
-                "price": {"type": "float"},
-                "in_stock": {"type": "boolean"},
-                "suggest": {
-                    "type": "completion",
-                    "contexts": [{"name": "category", "type": "category"}],
-                },
-            }
+            },
+            "description": {"type": "text"},
+            "category": {"type": "keyword"},
+            "category_id": {"type": "integer"},
+            "price": {"type": "float"},
+            "in_stock": {"type": "boolean"},
+            "created_at": {"type": "date"},
+            "suggest": {
+                "type": "completion",
+                "contexts": [{"name": "category", "type": "category"}],
+            },
         }
     }
+}
+
+
+def versioned_index_name(version: int) -> str:
+    return f"{PRODUCT_INDEX_PREFIX}{version}"
+
+
+async def get_index_versions(es: AsyncElasticsearch) -> dict[int, str]:
+    """Existing versioned product indices keyed by version number."""
+    indices = await es.indices.get(index=f"{PRODUCT_INDEX_PREFIX}*")
+    versions = {}
+    for name in indices:
+        suffix = name[len(PRODUCT_INDEX_PREFIX) :]
+        if suffix.isdigit():
+            versions[int(suffix)] = name
+    return versions
+
+
+async def get_alias_targets(es: AsyncElasticsearch) -> list[str]:
+    """Concrete indices the products alias currently points to."""
+    try:
+        return list(await es.indices.get_alias(name=PRODUCT_INDEX))
+    except NotFoundError:
+        return []
+
 
-    if await es.indices.exists(index="products"):
-        await es.indices.delete(index="products")
-        print("Deleted old 'products' index")
+async def create_versioned_index(
+    es: AsyncElasticsearch, version: int, bulk_load: bool = False
+) -> str:
+    """
+    Create products_v{version}.
+
+    With bulk_load, refresh is disabled and replicas are dropped so the
+    initial load is not slowed down by segment refreshes and replication.
+    """
+    name = versioned_index_name(version)
+    body = dict(PRODUCT_INDEX_MAPPING)
+    if bulk_load:
+        body["settings"] = {
+            "index": {"refresh_interval": "-1", "number_of_replicas": 0}
+        }
+    await es.indices.create(index=name, body=body)
+    logger.info(f"Created '{name}' index")
+    return name
+
+
+async def ensure_product_index(es: AsyncElasticsearch) -> bool:
+    """Create a first versioned index behind the alias if nothing serves it yet."""
+    if await es.indices.exists(index=PRODUCT_INDEX):
+        return False
+    versions = await get_index_versions(es)
+    name = await create_versioned_index(es, max(versions, default=0) + 1)
+    await es.indices.update_aliases(
+        actions=[{"add": {"index": name, "alias": PRODUCT_INDEX}}]
+    )
+    return True
 
-    await es.indices.create(index="products", body=mapping)
-    print("Created fresh 'products' index")
 
+def iter_product_partitions(partition_size: int) -> Iterator[list[dict]]:
+    """
+    Documents for every active product, `partition_size` at a time.
 
-def get_all_products():
+    Rows are streamed with yield_per (a server-side cursor where the driver
+    supports one). The session only holds weak references to loaded rows, so
+    each partition is freed once its documents are built and memory stays
+    flat however large the catalog is.
+    """
+    with SessionLocal() as db:
+        stmt = (
+            select(Product)
+            .where(Product.is_active == True)
+            .options(selectinload(Product.category))
+            .order_by(Product.id)
+            .execution_options(yield_per=partition_size)
+        )
+        for partition in db.scalars(stmt).partitions():
+            yield [build_product_document(p) for p in partition]
+
+
+async def stream_product_documents(
+    partition_size: int, max_buffered: int = 2
+) -> AsyncIterator[list[dict]]:
+    """
+    Async view of iter_product_partitions.
+
+    The blocking DB reads run in a worker thread that stalls once
+    `max_buffered` partitions are waiting, so a slow cluster throttles the
+    reader instead of letting partitions pile up in memory.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item) -> None:
+        if not stopped.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce() -> None:
+        try:
+            for partition in iter_product_partitions(partition_size):
+                if stopped.is_set():
+                    return
+                put(partition)
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock a producer parked on a full queue so its thread can exit.
+        stopped.set()
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait({producer}, timeout=0.05)
+
+
+@dataclass
+class BulkIndexReport:
+    indexed: int = 0
+    failed: int = 0
+    chunks: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.indexed / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.indexed} indexed, {self.failed} failed in {self.chunks} chunk(s), "
+            f"{self.elapsed:.1f}s ({self.docs_per_second:.0f} docs/s)"
+        )
+
+
+async def index_document_stream(
+    es: AsyncElasticsearch,
+    partitions: AsyncIterator[list[dict]],
+    index: str = PRODUCT_INDEX,
+    concurrency: int = settings.ELASTIC_BULK_CONCURRENCY,
+    max_retries: int = settings.ELASTIC_BULK_MAX_RETRIES,
+    progress_interval: float = 5.0,
+) -> BulkIndexReport:
+    """
+    Index partitions of documents with `concurrency` bulk requests in flight.
+
+    Partitions are handed to the workers through a queue of the same size, so
+    at most about 2 x concurrency partitions are held at once. Documents the
+    cluster rejects with 429 are retried with exponential backoff by the bulk
+    helper; anything still failing is counted and logged, not raised.
+    """
+    report = BulkIndexReport()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    last_progress = time.monotonic()
+
+    async def worker() -> None:
+        nonlocal last_progress
+        while True:
+            docs = await queue.get()
+            if docs is None:
+                return
+            actions = ({"_index": index, "_id": d["id"], "_source": d} for d in docs)
+            failed = 0
+            async for ok, item in helpers.async_streaming_bulk(
+                es,
+                actions,
+                chunk_size=len(docs),
+                max_retries=max_retries,
+                initial_backoff=1,
+                raise_on_error=False,
+                yield_ok=False,
+            ):
+                if not ok:
+                    failed += 1
+                    logger.warning(f"Failed to index product document: {item}")
+            report.indexed += len(docs) - failed
+            report.failed += failed
+            report.chunks += 1
+            if time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                logger.info(f"Bulk indexing into '{index}': {report}")
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for docs in partitions:
+            if not docs:
+                continue
+            # Blocks while every worker is busy and the queue is full.
+            put = asyncio.create_task(queue.put(docs))
+            finished, _ = await asyncio.wait(
+                {put, *workers}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if put not in finished:
+                put.cancel()
+                # A worker died; surface its exception.
+                for w in finished:
+                    w.result()
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+
+    return report
+
+
+def get_products_changed_since(since: datetime | None) -> list[Product]:
+    """Products (active or not) whose last change is at or after `since`."""
+    changed_at = func.coalesce(Product.updated_at, Product.created_at)
     with SessionLocal() as db:
         stmt = select(Product).options(selectinload(Product.category))
-        return db.scalars(stmt).all()
+        if since is not None:
+            # >= rather than >: rows committed later with the same timestamp
+            # as the mark must not be skipped; re-indexing them is harmless.
+            stmt = stmt.where(changed_at >= since)
+        return db.scalars(stmt.order_by(changed_at, Product.id)).all()
+
+
+def build_product_document(p: Product) -> dict:
+    """Elasticsearch source document for a product (category must be loaded)."""
+    return {
+        "id": p.id,
+        "name": p.name,
+        "description": p.description,
+        "category": p.category.name if p.category else None,
+        "category_id": p.category_id,
+        "price": float(p.price) if isinstance(p.price, Decimal) else p.price,
+        "in_stock": p.in_stock,
+        "created_at": p.created_at.isoformat() if p.created_at else None,
+        "suggest": {
+            "input": [p.name],
+            "contexts": {
+                "category": ([p.category.name] if p.category else ["General"]) + ["all"]
+            },
+        },
+    }
+
+
+async def get_high_water_mark(es: AsyncElasticsearch) -> datetime | None:
+    """Timestamp of the newest product change already reflected in the index."""
+    mapping = await es.indices.get_mapping(index=PRODUCT_INDEX)
+    for index_mapping in mapping.values():
+        value = index_mapping["mappings"].get("_meta", {}).get("synced_until")
+        if value:
+            return datetime.fromisoformat(value)
+    return None
 
 
-async def bulk_index_products(es: AsyncElasticsearch):
+async def set_high_water_mark(
+    es: AsyncElasticsearch, value: datetime, index: str = PRODUCT_INDEX
+) -> None:
+    # Kept in the index's own _meta so a rebuilt index starts without one.
+    await es.indices.put_mapping(
+        index=index, body={"_meta": {"synced_until": value.isoformat()}}
+    )
+
+
+async def bulk_index_products(
+    es: AsyncElasticsearch, index: str = PRODUCT_INDEX
+) -> BulkIndexReport:
     """populate elastic index from existing products"""
-    products = get_all_products()
-    print(products[0])
+    started_at = datetime.utcnow()
+    report = await index_document_stream(
+        es,
+        stream_product_documents(settings.ELASTIC_BULK_CHUNK_SIZE),
+        index=index,
+    )
+    await set_high_water_mark(es, started_at, index=index)
+    logger.info(f"Indexed products into '{index}': {report}")
+    return report
 
-    actions = []
 
+async def sync_changed_products(es: AsyncElasticsearch) -> int:
+    """
+    Index only the products changed since the index's high-water mark.
+
+    Deactivated products are removed from the index. Hard deletes leave no row
+    behind, so they reach the index through outbox events instead.
+    """
+    since = await get_high_water_mark(es)
+    if since is None:
+        # Never synced: a full streamed load rather than one huge change set.
+        report = await bulk_index_products(es)
+        return report.indexed
+
+    products = await asyncio.to_thread(get_products_changed_since, since)
+    if not products:
+        return 0
+
+    actions = []
     for p in products:
-        actions.append(
-            {
-                "_index": "products",
-                "_id": p.id,
-                "_source": {
-                    "id": p.id,
-                    "name": p.name,
-                    "description": p.description,
-                    "category": p.category.name if p.category else None,
-                    "price": (
-                        float(p.price) if isinstance(p.price, Decimal) else p.price
-                    ),
-                    "in_stock": p.in_stock,
-                    "suggest": {
-                        "input": [p.name],
-                        "contexts": {
-                            "category": (
-                                [p.category.name] if p.category else ["General"]
-                            )
-                            + ["all"]
-                        },
-                    },
-                },
-            }
+        if p.is_active:
+            actions.append(
+                {
+                    "_index": PRODUCT_INDEX,
+                    "_id": p.id,
+                    "_source": build_product_document(p),
+                }
+            )
+        else:
+            actions.append({"_op_type": "delete", "_index": PRODUCT_INDEX, "_id": p.id})
+
+    _, errors = await helpers.async_bulk(es, actions=actions, raise_on_error=False)
+    failed = _failed_product_ids(errors)
+    changed_at = {p.id: p.updated_at or p.created_at for p in products}
+    if failed:
+        # Hold the mark at the oldest failure (the next sync reads >= the
+        # mark), so failed products are retried instead of skipped for good.
+        logger.warning(f"Failed to sync product(s) {sorted(failed)}; will retry")
+        await set_high_water_mark(es, min(changed_at[i] for i in failed))
+    else:
+        await set_high_water_mark(es, max(changed_at.values()))
+    synced = len(actions) - len(failed)
+    logger.info(f"Synced {synced} changed product(s) into Elasticsearch")
+    return synced
+
+
+def _failed_product_ids(errors: list[dict]) -> set[int]:
+    """Product ids of failed bulk items; deleting a missing document is fine."""
+    failed = set()
+    for error in errors:
+        for op_type, item in error.items():
+            if op_type == "delete" and item.get("status") == 404:
+                continue
+            failed.add(int(item["_id"]))
+    return failed
+
+
+async def rebuild_product_index(es: AsyncElasticsearch) -> str:
+    """
+    Zero-downtime rebuild.
+
+    Loads every active product into a new products_v{n} while the alias keeps
+    serving the previous version, then swaps the alias in one atomic call and
+    drops the old versions. Returns the name of the new index.
+    """
+    versions = await get_index_versions(es)
+    new_index = await create_versioned_index(
+        es, max(versions, default=0) + 1, bulk_load=True
+    )
+    try:
+        await bulk_index_products(es, index=new_index)
+        await es.indices.put_settings(
+            index=new_index,
+            settings={
+                "index": {
+                    "refresh_interval": "1s",
+                    "number_of_replicas": settings.ELASTIC_PRODUCT_REPLICAS,
+                }
+            },
         )
-    await helpers.async_bulk(es, actions=actions)
-    logger.info(f"Indexed {len(actions)} products into Elasticsearch!")
+        await es.indices.refresh(index=new_index)
+    except Exception:
+        await es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise
+
+    actions = [
+        {"remove": {"index": target, "alias": PRODUCT_INDEX}}
+        for target in await get_alias_targets(es)
+    ]
+    if not actions and await es.indices.exists(index=PRODUCT_INDEX):
+        # A concrete index from before versioning still holds the name.
+        actions.append({"remove_index": {"index": PRODUCT_INDEX}})
+    actions.append({"add": {"index": new_index, "alias": PRODUCT_INDEX}})
+    await es.indices.update_aliases(actions=actions)
+    logger.info(f"Alias '{PRODUCT_INDEX}' now points to '{new_index}'")
+    await search_cache.invalidate_all()
+
+    for name in versions.values():
+        await es.indices.delete(index=name, ignore_unavailable=True)
+        logger.info(f"Deleted old '{name}' index")
+
+    # Writes that landed on the old index while the new one was loading.
+    await sync_changed_products(es)
+    return new_index
+
+
+async def _run_cli(command: str) -> None:
+    import app.models  # noqa: F401 - registers every mapper for standalone runs
+    from app.core.elastic_config import close_es_client, get_es_client
+    from app.core.redis import redis_client
+
+    try:
+        # Only needed to invalidate cached search results after a rebuild.
+        await redis_client.connect()
+    except Exception as e:
+        logger.warning(f"Redis unavailable, search cache not invalidated: {e}")
+    es = await get_es_client()
+    try:
+        if command == "rebuild":
+            await rebuild_product_index(es)
+        else:
+            await ensure_product_index(es)
+            await sync_changed_products(es)
+    finally:
+        await close_es_client()
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Product search index maintenance")
+    parser.add_argument(
+        "command",
+        choices=["rebuild", "sync"],
+        help="rebuild: recreate the index from scratch; sync: index recent changes",
+    )
+    asyncio.run(_run_cli(parser.parse_args().command))
@@ -0,0 +1,141 @@
+import re
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Iterable
+
+_WORD = re.compile(r"\w+")
+# Sorts after every character a normalised key can contain.
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+@dataclass(frozen=True)
+class PrefixEntry:
+    product_id: int
+    name: str
+    category: str | None
+    popularity: int
+    keys: tuple[str, ...]
+
+
+class PrefixIndex:
+    """
+    In-memory autocomplete index over product names.
+
+    Every word start of every normalised name ("iphone 16 pro", "16 pro",
+    "pro") is one key in a sorted array, with the product id in a parallel
+    array. A prefix lookup is two bisects plus a scan of the matching range,
+    ranked by name-prefix match first and then popularity. Ranked answers for
+    short prefixes, whose ranges are widest, are memoised until a product
+    under that prefix changes.
+    """
+
+    MEMO_PREFIX_LENGTH = 3
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self._keys: list[str] = []
+        self._ids: list[int] = []
+        self._entries: dict[int, PrefixEntry] = {}
+        self._memo: dict[str, list[str]] = {}
+        self.built_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _make_entry(
+        product_id: int, name: str, category: str | None, popularity: int
+    ) -> PrefixEntry:
+        norm = normalize(name)
+        keys = tuple(dict.fromkeys(norm[m.start() :] for m in _WORD.finditer(norm)))
+        return PrefixEntry(product_id, name, category, popularity, keys)
+
+    @classmethod
+    def build(
+        cls, rows: Iterable[tuple[int, str, str | None, int]], top_k: int = 10
+    ) -> "PrefixIndex":
+        """
+        A new index over (id, name, category, popularity) rows. It touches no
+        shared state, so the sort can run on a worker thread.
+        """
+        index = cls(top_k)
+        entries = {row[0]: cls._make_entry(*row) for row in rows}
+        pairs = sorted((key, e.product_id) for e in entries.values() for key in e.keys)
+        index._keys = [key for key, _ in pairs]
+        index._ids = [product_id for _, product_id in pairs]
+        index._entries = entries
+        index.built_at = time.monotonic()
+        return index
+
+    def replace(self, other: "PrefixIndex") -> None:
+        """Take over a built index's contents; cheap enough for the event loop."""
+        self._keys, self._ids, self._entries = other._keys, other._ids, other._entries
+        self._memo = {}
+        self.built_at = other.built_at
+
+    def rebuild(self, rows: Iterable[tuple[int, str, str | None, int]]) -> None:
+        """Replace the contents with (id, name, category, popularity) rows."""
+        self.replace(self.build(rows, self.top_k))
+
+    def upsert(
+        self, product_id: int, name: str, category: str | None, popularity: int
+    ) -> None:
+        self.remove(product_id)
+        entry = self._make_entry(product_id, name, category, popularity)
+        for key in entry.keys:
+            i = bisect_right(self._keys, key)
+            self._keys.insert(i, key)
+            self._ids.insert(i, product_id)
+        self._entries[product_id] = entry
+        self._forget(entry.keys)
+
+    def remove(self, product_id: int) -> None:
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        for key in entry.keys:
+            i = bisect_left(self._keys, key)
+            while self._ids[i] != product_id:
+                i += 1
+            del self._keys[i]
+            del self._ids[i]
+        self._forget(entry.keys)
+
+    def search(
+        self, prefix: str, category: str | None = None, limit: int = 10
+    ) -> list[str]:
+        """Up to `limit` distinct product names with a word starting with prefix."""
+        p = normalize(prefix)
+        if not p:
+            return []
+        memoise = category is None and len(p) <= self.MEMO_PREFIX_LENGTH
+        if memoise and p in self._memo and limit <= self.top_k:
+            return self._memo[p][:limit]
+
+        lo = bisect_left(self._keys, p)
+        hi = bisect_right(self._keys, p + _MAX_CHAR, lo)
+        candidates = [self._entries[i] for i in dict.fromkeys(self._ids[lo:hi])]
+        if category is not None:
+            candidates = [e for e in candidates if e.category == category]
+        candidates.sort(
+            key=lambda e: (not e.keys[0].startswith(p), -e.popularity, e.name)
+        )
+
+        names = list(dict.fromkeys(e.name for e in candidates))
+        if memoise:
+            self._memo[p] = names[: self.top_k]
+        return names[:limit]
+
+    def _forget(self, keys: tuple[str, ...]) -> None:
+        for key in keys:
+            for length in range(1, self.MEMO_PREFIX_LENGTH + 1):
+                self._memo.pop(key[:length], None)
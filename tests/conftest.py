@@ -1,3 +1,4 @@
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -7,7 +8,11 @@ from unittest.mock import AsyncMock, patch
 
 from app.main import app
 from app.db.database import Base
-from app.dependencies import get_db
+from app.core.password_hasher import password_hasher
+from app.core.rate_limit import rate_limiter
+from app.core.redis import RedisClient
+from app.core.user_cache import user_cache
+from app.dependencies import get_db, get_redis_manager
 
 
 # Create in-memory SQLite database for testing
@@ -43,11 +48,134 @@ def client(db_session):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    # User ids repeat across test databases; don't reuse a cached one.
+    user_cache._local.clear()
+    rate_limiter._local.clear()
     
-    # Mock Redis to prevent connection attempts during tests
-    with patch("app.core.redis.redis_client.connect", new_callable=AsyncMock):
+    # Mock Redis and Elasticsearch to prevent connection attempts during tests.
+    # Passwords are hashed on a thread instead of a spawned process pool.
+    with patch.object(password_hasher, "start"), patch(
+        "app.core.redis.redis_client.connect", new_callable=AsyncMock
+    ):
         with patch("app.core.redis.redis_client.close", new_callable=AsyncMock):
-            with TestClient(app) as test_client:
-                yield test_client
+            with patch(
+                "app.main.get_es_client",
+                new_callable=AsyncMock,
+                side_effect=ConnectionError("Elasticsearch disabled in tests"),
+            ):
+                # In-memory indexes would be built from the app database,
+                # not the test one; tests build them explicitly.
+                with patch(
+                    "app.main.run_product_change_listener", new_callable=AsyncMock
+                ):
+                    with TestClient(app) as test_client:
+                        yield test_client
     
     app.dependency_overrides.clear()
+
+
+class FakeRedis:
+    """The Redis commands the app uses, on plain dicts and sets."""
+
+    def __init__(self):
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.values: dict[str, str] = {}
+        self.ttls: dict[str, int] = {}
+
+    async def exists(self, *keys):
+        return sum(k in self.hashes or k in self.sets or k in self.values for k in keys)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = str(value)
+        if ex is not None:
+            self.ttls[key] = ex
+
+    async def hexists(self, key, field):
+        return str(field) in self.hashes.get(key, {})
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        self.hashes.setdefault(key, {}).update(
+            {str(f): str(v) for f, v in fields.items()}
+        )
+        return len(fields)
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[str(field)] = str(int(fields.get(str(field), 0)) + amount)
+        return int(fields[str(field)])
+
+    async def hdel(self, key, field):
+        fields = self.hashes.get(key, {})
+        removed = fields.pop(str(field), None) is not None
+        if not fields:
+            self.hashes.pop(key, None)
+        return int(removed)
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(str(m) for m in members)
+
+    async def smismember(self, key, members):
+        return [int(str(m) in self.sets.get(key, ())) for m in members]
+
+    async def delete(self, *keys):
+        removed = 0
+        for k in keys:
+            removed += self.hashes.pop(k, None) is not None
+            removed += self.sets.pop(k, None) is not None
+            removed += self.values.pop(k, None) is not None
+        return removed
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return [
+            await getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.calls
+        ]
+
+
+@pytest.fixture(scope="function")
+def fake_redis(client):
+    """Serve requests from an in-memory FakeRedis; returns it."""
+    fake = FakeRedis()
+    redis = RedisClient()
+    redis._client = fake
+    app.dependency_overrides[get_redis_manager] = lambda: redis
+    return fake
+
+
+@pytest.fixture(scope="function")
+def lua_redis(client):
+    """
+    Serve requests from fakeredis, which also runs Lua scripts; returns a
+    synchronous client on the same data for inspecting it.
+    """
+    server = fakeredis.FakeServer()
+    redis = RedisClient()
+    redis._client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    app.dependency_overrides[get_redis_manager] = lambda: redis
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
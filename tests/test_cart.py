@@ -0,0 +1,233 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.crud.cart_item import CartCrud
+from app.services import cart_gc
+from app.models.cart import Cart
+from app.models.cart_item import CartItem
+from app.models.product import Product
+
+
+def login(client: TestClient, email: str) -> dict[str, str]:
+    client.post(
+        "/users/register",
+        json={
+            "email": email,
+            "password": "password123",
+            "first_name": "Cart",
+            "last_name": "User",
+            "phone": "1234567890",
+        },
+    )
+    token = client.post(
+        "/users/login", json={"email": email, "password": "password123"}
+    ).json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_cart_summary_totals_lines_in_sql(client: TestClient, db_session: Session):
+    mug = Product(name="Mug", slug="mug", price=5.25, stock_quantity=10)
+    cup = Product(name="Cup", slug="cup", price=3.10, stock_quantity=10)
+    db_session.add_all([mug, cup])
+    db_session.commit()
+
+    assert client.get("/cart").json()["items"] == []
+    client.post("/cart/items", json={"product_id": mug.id, "quantity": 2})
+    client.post("/cart/items", json={"product_id": cup.id, "quantity": 3})
+
+    cart = client.get("/cart").json()
+    assert [(i["product_name"], i["subtotal"]) for i in cart["items"]] == [
+        ("Mug", 10.5),
+        ("Cup", 9.3),
+    ]
+    assert (cart["subtotal"], cart["total_items"]) == (19.8, 5)
+
+    # A deactivated product drops out of the summary, as with the Redis cart.
+    cup.is_active = False
+    db_session.commit()
+    cart = client.get("/cart").json()
+    assert [i["product_name"] for i in cart["items"]] == ["Mug"]
+    assert (cart["subtotal"], cart["total_items"]) == (10.5, 2)
+
+
+def test_login_merges_session_cart_once(client: TestClient, db_session: Session):
+    mug = Product(name="Mug", slug="mug", price=5.0, stock_quantity=10)
+    cup = Product(name="Cup", slug="cup", price=3.0, stock_quantity=10)
+    db_session.add_all([mug, cup])
+    db_session.commit()
+
+    headers = login(client, "merge_user@example.com")
+    client.post(
+        "/cart/items", json={"product_id": mug.id, "quantity": 1}, headers=headers
+    )
+
+    client.get("/cart")
+    client.post("/cart/items", json={"product_id": mug.id, "quantity": 2})
+    client.post("/cart/items", json={"product_id": cup.id, "quantity": 1})
+
+    headers = login(client, "merge_user@example.com")
+    assert "session_id" not in client.cookies
+    cart = client.get("/cart", headers=headers).json()
+    assert {i["product_id"]: i["quantity"] for i in cart["items"]} == {
+        mug.id: 3,
+        cup.id: 1,
+    }
+    assert db_session.query(Cart).count() == 1
+
+
+def test_batch_add_checks_stock_and_upserts(client: TestClient, db_session: Session):
+    mug = Product(name="Mug", slug="mug", price=5.0, stock_quantity=10)
+    cup = Product(name="Cup", slug="cup", price=3.0, stock_quantity=1)
+    db_session.add_all([mug, cup])
+    db_session.commit()
+    headers = login(client, "batch_user@example.com")
+    client.post(
+        "/cart/items", json={"product_id": mug.id, "quantity": 1}, headers=headers
+    )
+
+    response = client.post(
+        "/cart/items/batch",
+        json={
+            "items": [
+                {"product_id": mug.id, "quantity": 2},
+                {"product_id": cup.id, "quantity": 3},
+                {"product_id": 999, "quantity": 1},
+                {"product_id": mug.id, "quantity": 1},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["added_count"] == 1
+    assert [
+        (r["product_id"], r["status"], r["available"]) for r in body["results"]
+    ] == [
+        (mug.id, "added", None),
+        (cup.id, "out_of_stock", 1),
+        (999, "not_found", None),
+    ]
+    cart = client.get("/cart", headers=headers).json()
+    assert [(i["product_id"], i["quantity"]) for i in cart["items"]] == [(mug.id, 4)]
+
+
+def test_anonymous_batch_add_starts_a_session(client: TestClient, db_session: Session):
+    mug = Product(name="Mug", slug="mug", price=5.0, stock_quantity=10)
+    db_session.add(mug)
+    db_session.commit()
+
+    response = client.post(
+        "/cart/items/batch", json={"items": [{"product_id": mug.id, "quantity": 2}]}
+    )
+    assert response.status_code == 200
+    session_id = response.cookies["session_id"]
+
+    # The cookie leads back to the same cart.
+    client.post("/cart/items", json={"product_id": mug.id, "quantity": 1})
+    assert client.cookies["session_id"] == session_id
+    cart = client.get("/cart").json()
+    assert [(i["id"], i["quantity"]) for i in cart["items"]] == [(mug.id, 3)]
+
+
+def test_redis_cart_merges_at_login_and_persists_at_checkout(
+    client: TestClient, db_session: Session, fake_redis
+):
+    fake = fake_redis
+    product = Product(name="Mug", slug="mug", price=5.0, stock_quantity=10)
+    db_session.add(product)
+    db_session.commit()
+
+    with patch.object(settings, "CART_BACKEND", "redis"):
+        # Anonymous cart, held only in Redis.
+        assert client.get("/cart").status_code == 200
+        session_id = client.cookies["session_id"]
+        client.post("/cart/items", json={"product_id": product.id, "quantity": 2})
+        client.post("/cart/items", json={"product_id": product.id, "quantity": 1})
+        session_key = f"cart:session:{session_id}"
+        assert fake.hashes[session_key] == {str(product.id): "3"}
+        assert fake.ttls[session_key] == settings.CART_SESSION_TTL_SECONDS
+
+        # Login folds the session cart into a durable user cart.
+        headers = login(client, "cart_user@example.com")
+        assert session_key not in fake.hashes
+        assert "session_id" not in client.cookies
+        cart = client.get("/cart", headers=headers).json()
+        assert [(i["id"], i["quantity"]) for i in cart["items"]] == [(product.id, 3)]
+        assert cart["subtotal"] == 15.0
+        user_id = client.get("/users/me", headers=headers).json()["id"]
+        cart_crud = CartCrud(db_session)
+        assert cart_crud.get_user_cart_lines(user_id) == {product.id: 3}
+
+        # Later edits stay in Redis until checkout.
+        client.put(f"/cart/items/{product.id}", json={"quantity": 4}, headers=headers)
+        assert cart_crud.get_user_cart_lines(user_id) == {product.id: 3}
+
+        address_id = client.post(
+            "/users/me/address",
+            json={
+                "type": "shipping",
+                "street": "1 Cart St",
+                "city": "Cart City",
+                "country": "Cart Country",
+                "zip_code": "12345",
+                "state": "Cart State",
+            },
+            headers=headers,
+        ).json()["id"]
+        order = client.post(
+            "/order",
+            json={"shipping_address_id": address_id, "billing_address_id": address_id},
+            headers=headers,
+        )
+        assert order.status_code == 200
+        assert order.json()["total_amount"] == 20.0
+        assert f"cart:user:{user_id}" not in fake.hashes
+        assert client.get("/cart", headers=headers).json()["items"] == []
+
+        # The empty cart is remembered, so reading it does not go to SQL.
+        assert fake.ttls[f"cart:user:{user_id}:empty"] == (
+            settings.CART_EMPTY_MARKER_TTL_SECONDS
+        )
+        with patch.object(CartCrud, "get_user_cart_lines") as lines:
+            assert client.get("/cart", headers=headers).json()["items"] == []
+        lines.assert_not_called()
+
+
+def test_cart_gc_purges_only_expired_anonymous_carts(db_session: Session):
+    product = Product(name="Mug", slug="mug", price=5.0, stock_quantity=10)
+    db_session.add(product)
+    db_session.flush()
+    expired = datetime.utcnow() - timedelta(
+        seconds=settings.CART_SESSION_TTL_SECONDS + 60
+    )
+    carts = [
+        Cart(session_id="old-1", updated_at=expired),
+        Cart(session_id="old-2", updated_at=expired),
+        Cart(session_id="old-3", updated_at=expired),
+        Cart(session_id="fresh"),
+        Cart(user_id=None, session_id=None, updated_at=expired),
+    ]
+    db_session.add_all(carts)
+    db_session.flush()
+    db_session.add(CartItem(cart_id=carts[0].id, product_id=product.id, quantity=1))
+    db_session.commit()
+
+    deleted_before = REGISTRY.get_sample_value("cart_gc_deleted_carts_total")
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with patch.object(cart_gc, "SessionLocal", session_factory):
+        assert asyncio.run(cart_gc.purge_expired_carts(chunk_size=2)) == 3
+
+    db_session.expire_all()
+    assert [c.session_id for c in db_session.query(Cart).order_by(Cart.id)] == [
+        "fresh",
+        None,
+    ]
+    assert db_session.query(CartItem).count() == 0
+    deleted_after = REGISTRY.get_sample_value("cart_gc_deleted_carts_total")
+    assert deleted_after - deleted_before == 3
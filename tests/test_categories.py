@@ -0,0 +1,74 @@
+import warnings
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.crud.category import CategoryCrud
+from app.crud.product import ProductCrud
+from app.schema.category_schema import CreateCategory, UpdateCategory
+from app.schema.product_schema import ProductCreate
+from app.services import category_service
+
+
+def test_category_tree_is_nested_counted_and_revalidated(
+    client: TestClient, db_session: Session
+):
+    categories = CategoryCrud(db_session)
+    electronics = categories.create_category(CreateCategory(name="Electronics"))
+    phones = categories.create_category(
+        CreateCategory(name="Phones", parent_id=electronics.id)
+    )
+    ProductCrud(db_session).create_product(
+        ProductCreate(name="Phone", price=10, stock_quantity=1, category_id=phones.id)
+    )
+
+    with patch.object(category_service, "_tree_l1", None):
+        response = client.get("/category/tree")
+        assert response.status_code == 200
+        [root] = response.json()
+        assert (root["name"], root["product_count"], root["total_product_count"]) == (
+            "Electronics",
+            0,
+            1,
+        )
+        assert [c["name"] for c in root["children"]] == ["Phones"]
+        etag = response.headers["etag"]
+
+        unchanged = client.get("/category/tree", headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304
+        assert unchanged.content == b""
+
+        categories.create_category(CreateCategory(name="Garden"))
+        changed = client.get("/category/tree", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert [c["name"] for c in changed.json()] == ["Electronics", "Garden"]
+
+
+def test_moving_and_deleting_categories_keep_the_tree_consistent(
+    db_session: Session,
+):
+    categories = CategoryCrud(db_session)
+    electronics = categories.create_category(CreateCategory(name="Electronics"))
+    phones = categories.create_category(
+        CreateCategory(name="Phones", parent_id=electronics.id)
+    )
+    cases = categories.create_category(
+        CreateCategory(name="Cases", parent_id=phones.id)
+    )
+    gadgets = categories.create_category(CreateCategory(name="Gadgets"))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        categories.update_category(phones.id, UpdateCategory(parent_id=gadgets.id))
+    assert sorted(categories.get_subtree_ids(gadgets.id)) == sorted(
+        [gadgets.id, phones.id, cases.id]
+    )
+    assert categories.get_subtree_ids(electronics.id) == [electronics.id]
+
+    assert categories.delete_category(phones.id)
+    db_session.expire_all()
+    assert categories.get_category_by_id(cases.id).parent_id is None
+    assert categories.get_subtree_ids(gadgets.id) == [gadgets.id]
+    assert categories.get_subtree_ids(cases.id) == [cases.id]
@@ -0,0 +1,56 @@
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+
+
+def alembic_config(url: str) -> Config:
+    # No ini file: alembic.ini would reconfigure logging for the test run.
+    config = Config()
+    config.set_main_option("script_location", "alembic")
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def test_migrations_apply_on_sqlite_and_fold_duplicate_cart_items(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    config = alembic_config(url)
+    command.upgrade(config, "a91f4c7e2d63")
+
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO carts (id, session_id, created_at, updated_at) "
+                "VALUES (1, 'abc', '2026-01-01', '2026-01-01')"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO cartitems (id, cart_id, product_id, quantity, added_at) "
+                "VALUES (1, 1, 7, 1, '2026-01-01'), (2, 1, 7, 2, '2026-01-01'), "
+                "(3, 1, 8, 1, '2026-01-01'), (4, 1, 7, 4, '2026-01-01')"
+            )
+        )
+
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT id, product_id, quantity FROM cartitems ORDER BY id")
+        ).all()
+    assert [tuple(r) for r in rows] == [(1, 7, 7), (3, 8, 1)]
+    inspector = inspect(engine)
+    assert {"uq_cartitems_cart_product"} <= {
+        c["name"] for c in inspector.get_unique_constraints("cartitems")
+    }
+    with engine.connect() as conn:
+        index_sql = conn.execute(
+            text(
+                "SELECT sql FROM sqlite_master "
+                "WHERE type = 'index' AND name = 'ix_carts_anon_updated_at'"
+            )
+        ).scalar_one()
+    # Partial, as on Postgres: only anonymous carts are purged by age.
+    assert "WHERE session_id IS NOT NULL" in index_sql
+
+    command.downgrade(config, "a91f4c7e2d63")
+    engine.dispose()
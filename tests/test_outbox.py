@@ -0,0 +1,220 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.exceptions import SearchUnavailableError
+from app.core.redis import RedisClient
+from app.crud.outbox import PRODUCT, OutboxCrud
+from app.crud.product import ProductCrud
+from app.models.outbox import OutboxDelivery, OutboxEvent
+from app.schema.product_schema import ProductCreate, ProductUpdate
+from app.services.outbox_relay import (
+    CacheInvalidationConsumer,
+    ElasticIndexConsumer,
+    OutboxMessage,
+    OutboxRelay,
+)
+
+
+class RecordingConsumer:
+    name = "recording"
+
+    def __init__(self, fail_for: set[int] | None = None):
+        self.fail_for = fail_for or set()
+        self.seen: list[tuple[int, str]] = []
+
+    async def handle(self, messages):
+        if any(m.aggregate_id in self.fail_for for m in messages):
+            raise RuntimeError("consumer unavailable")
+        self.seen.extend((m.aggregate_id, m.event_type) for m in messages)
+
+
+def create_product(db_session: Session, name: str):
+    return ProductCrud(db_session).create_product(
+        ProductCreate(name=name, price=10, stock_quantity=5)
+    )
+
+
+def test_product_writes_record_outbox_events(db_session: Session):
+    product = create_product(db_session, "Outbox Product")
+    ProductCrud(db_session).update_product(product.id, ProductUpdate(price=12))
+    ProductCrud(db_session).delete_product(product.id)
+
+    events = db_session.scalars(select(OutboxEvent).order_by(OutboxEvent.id)).all()
+    assert [e.event_type for e in events] == [
+        "product.created",
+        "product.updated",
+        "product.deleted",
+    ]
+    assert all(e.aggregate_id == product.id for e in events)
+    assert events[1].payload == {"fields": ["price"]}
+
+
+def run_relay(db_session: Session, relay: OutboxRelay, passes: int = 1) -> None:
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with patch("app.services.outbox_relay.SessionLocal", session_factory):
+        for _ in range(passes):
+            asyncio.run(relay.run_once())
+    db_session.expire_all()
+
+
+def owed(db_session: Session, consumer: str) -> list[OutboxDelivery]:
+    return list(
+        db_session.scalars(
+            select(OutboxDelivery)
+            .where(OutboxDelivery.consumer == consumer)
+            .order_by(OutboxDelivery.event_id)
+        ).all()
+    )
+
+
+def test_relay_delivers_in_order_and_isolates_failing_entities(db_session: Session):
+    first = create_product(db_session, "First Product")
+    second = create_product(db_session, "Second Product")
+    ProductCrud(db_session).update_product(first.id, ProductUpdate(price=11))
+
+    consumer = RecordingConsumer(fail_for={second.id})
+    run_relay(db_session, OutboxRelay(consumers=[consumer], max_attempts=3))
+
+    assert consumer.seen == [
+        (first.id, "product.created"),
+        (first.id, "product.updated"),
+    ]
+    [failed] = owed(db_session, "recording")
+    assert (failed.attempts, failed.dead_at) == (1, None)
+    assert "consumer unavailable" in failed.last_error
+
+
+def test_a_failing_consumer_holds_back_neither_others_nor_itself(
+    db_session: Session,
+):
+    product = create_product(db_session, "Product")
+    healthy = RecordingConsumer()
+    healthy.name = "healthy"
+    failing = RecordingConsumer(fail_for={product.id})
+    relay = OutboxRelay(consumers=[healthy, failing], retry_base=60)
+
+    run_relay(db_session, relay)
+    ProductCrud(db_session).update_product(product.id, ProductUpdate(price=12))
+    # The failed event is not due for a minute: the second pass leaves it
+    # alone and keeps the product's newer event behind it.
+    run_relay(db_session, relay)
+
+    assert healthy.seen == [
+        (product.id, "product.created"),
+        (product.id, "product.updated"),
+    ]
+    assert owed(db_session, "healthy") == []
+    [failed, held] = owed(db_session, "recording")
+    assert (failed.attempts, held.attempts) == (1, 0)
+    assert failed.next_attempt_at > datetime.utcnow() + timedelta(seconds=50)
+
+    failing.fail_for.clear()
+    failed.next_attempt_at = datetime.utcnow()
+    db_session.commit()
+    run_relay(db_session, relay, passes=2)
+    assert failing.seen == [
+        (product.id, "product.created"),
+        (product.id, "product.updated"),
+    ]
+    assert owed(db_session, "recording") == []
+    assert len(healthy.seen) == 2
+
+
+def test_dead_letters_are_kept_apart_and_can_be_replayed(db_session: Session):
+    product = create_product(db_session, "Product")
+    consumer = RecordingConsumer(fail_for={product.id})
+    relay = OutboxRelay(consumers=[consumer], max_attempts=1)
+
+    run_relay(db_session, relay)
+    [dead] = owed(db_session, "recording")
+    assert dead.dead_at is not None
+    # Dead letters neither block their entity nor count as delivered.
+    consumer.fail_for.clear()
+    ProductCrud(db_session).update_product(product.id, ProductUpdate(price=12))
+    run_relay(db_session, relay)
+    assert consumer.seen == [(product.id, "product.updated")]
+    assert OutboxCrud(db_session).replay_dead_letters("recording") == 1
+    run_relay(db_session, relay)
+    assert consumer.seen[-1] == (product.id, "product.created")
+    assert owed(db_session, "recording") == []
+
+
+class StringRedis:
+    """GET, INCR and DELETE on a dict; anything else (KEYS, SCAN) is an error."""
+
+    def __init__(self, values: dict[str, str]):
+        self.values = values
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    async def delete(self, *keys):
+        return sum(self.values.pop(k, None) is not None for k in keys)
+
+
+def test_cache_invalidation_bumps_generations_instead_of_scanning():
+    redis = RedisClient()
+    redis._client = StringRedis({"product:7": "{}", "product:8": "{}"})
+    consumer = CacheInvalidationConsumer(redis)
+
+    def generations_after(*messages):
+        async def run():
+            await consumer.handle(list(messages))
+            return [
+                await redis.generation(name)
+                for name in ("product-facets", "category-products", "autocomplete")
+            ]
+
+        return asyncio.run(run())
+
+    assert generations_after(
+        OutboxMessage(1, PRODUCT, 7, "product.updated", {"fields": ["price"]})
+    ) == [1, 1, 1]
+    # A sale that leaves the product in stock changes no listing or facet.
+    sale = {"delta": -1, "stock_quantity": 4}
+    assert generations_after(
+        OutboxMessage(2, PRODUCT, 8, "product.stock_changed", sale)
+    ) == [1, 1, 1]
+    sold_out = {"delta": -1, "stock_quantity": 0}
+    assert generations_after(
+        OutboxMessage(3, PRODUCT, 8, "product.stock_changed", sold_out)
+    ) == [2, 2, 1]
+    assert set(redis._client.values) == {
+        "cache-generation:product-facets",
+        "cache-generation:category-products",
+        "cache-generation:autocomplete",
+    }
+
+
+def test_index_consumer_starts_without_elasticsearch_and_fails_fast(
+    db_session: Session,
+):
+    product = create_product(db_session, "Product")
+    consumer = ElasticIndexConsumer()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    connect = AsyncMock(side_effect=RuntimeError("Elasticsearch connection failed"))
+    messages = [OutboxMessage(1, PRODUCT, product.id, "product.created")]
+
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with (
+        patch("app.services.outbox_relay.SessionLocal", session_factory),
+        patch("app.services.outbox_relay.get_es_client", connect),
+        patch("app.services.outbox_relay.elastic_breaker", breaker),
+    ):
+        with pytest.raises(RuntimeError):
+            asyncio.run(consumer.handle(messages))
+        # The open circuit turns the next attempts away without connecting.
+        with pytest.raises(SearchUnavailableError):
+            asyncio.run(consumer.handle(messages))
+    assert connect.await_count == 1
+    assert breaker.state == "open"
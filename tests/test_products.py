@@ -1,7 +1,15 @@
+import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
+from app.core.exceptions import CategoryUpdateError
+from app.crud.category import CategoryCrud
+from app.crud.product import ProductCrud
+from app.models.category import Category
 from app.models.user import User
+from app.schema.category_schema import CreateCategory, UpdateCategory
+from app.schema.product_schema import ProductCreate
+from app.utils.cursor import encode_cursor
 
 
 def test_create_product_as_admin(client: TestClient, db_session: Session):
@@ -68,3 +76,170 @@ def test_get_products(client: TestClient):
     assert "total_items" in meta
     assert meta["current_page"] == 1
     assert meta["per_page"] == 10
+
+
+def test_get_products_with_facets(client: TestClient, db_session: Session):
+    phones = Category(name="Phones", slug="phones")
+    audio = Category(name="Audio", slug="audio")
+    db_session.add_all([phones, audio])
+    db_session.commit()
+    crud = ProductCrud(db_session)
+    for name, price, stock, category in [
+        ("Phone A", 20, 5, phones),
+        ("Phone B", 300, 0, phones),
+        ("Headphones", 60, 2, audio),
+    ]:
+        crud.create_product(
+            ProductCreate(
+                name=name, price=price, stock_quantity=stock, category_id=category.id
+            )
+        )
+
+    response = client.get(
+        "/product",
+        params={"facets": True, "category_id": phones.id, "availability": "in_stock"},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["name"] for p in data["data"]] == ["Phone A"]
+    facets = data["facets"]
+    # Category and availability counts ignore their own filter.
+    assert [(c["name"], c["count"]) for c in facets["categories"]] == [
+        ("Audio", 1),
+        ("Phones", 1),
+    ]
+    assert facets["availability"] == {"in_stock": 1, "out_of_stock": 1}
+    prices = {b["key"]: b["count"] for b in facets["price_ranges"]}
+    assert prices["0-25"] == 1 and sum(prices.values()) == 1
+
+    # The price filter narrows the other facets but not the price ranges.
+    facets = client.get(
+        "/product", params={"facets": True, "category_id": phones.id, "min_price": 100}
+    ).json()["facets"]
+    assert [(c["name"], c["count"]) for c in facets["categories"]] == [("Phones", 1)]
+    assert facets["availability"] == {"in_stock": 0, "out_of_stock": 1}
+    prices = {b["key"]: b["count"] for b in facets["price_ranges"]}
+    assert prices["0-25"] == 1 and prices["250-500"] == 1
+
+    # Without the flag the listing is unchanged.
+    assert client.get("/product").json()["facets"] is None
+
+
+def test_get_products_including_subcategories(client: TestClient, db_session: Session):
+    categories = CategoryCrud(db_session)
+    electronics = categories.create_category(CreateCategory(name="Electronics"))
+    phones = categories.create_category(
+        CreateCategory(name="Phones", parent_id=electronics.id)
+    )
+    cases = categories.create_category(
+        CreateCategory(name="Cases", parent_id=phones.id)
+    )
+    garden = categories.create_category(CreateCategory(name="Garden"))
+    crud = ProductCrud(db_session)
+    for name, category in [
+        ("Laptop", electronics),
+        ("Phone", phones),
+        ("Case", cases),
+        ("Rake", garden),
+    ]:
+        crud.create_product(
+            ProductCreate(name=name, price=10, stock_quantity=1, category_id=category.id)
+        )
+
+    def names(**params):
+        response = client.get("/product", params=params)
+        assert response.status_code == 200
+        return [p["name"] for p in response.json()["data"]]
+
+    assert names(category_id=electronics.id) == ["Laptop"]
+    assert names(category_id=electronics.id, include_subcategories=True) == [
+        "Laptop",
+        "Phone",
+        "Case",
+    ]
+
+    # Moving a category moves its whole subtree.
+    categories.update_category(phones.id, UpdateCategory(parent_id=garden.id))
+    assert names(category_id=electronics.id, include_subcategories=True) == ["Laptop"]
+    response = client.get(
+        "/product/category/garden", params={"include_subcategories": True}
+    )
+    assert [p["name"] for p in response.json()["data"]] == ["Phone", "Case", "Rake"]
+
+    with pytest.raises(CategoryUpdateError):
+        categories.update_category(garden.id, UpdateCategory(parent_id=cases.id))
+
+    categories.delete_category(phones.id)
+    assert names(category_id=garden.id, include_subcategories=True) == ["Rake"]
+
+
+def test_category_products_are_paginated_by_cursor(
+    client: TestClient, db_session: Session
+):
+    phones = CategoryCrud(db_session).create_category(CreateCategory(name="Phones"))
+    crud = ProductCrud(db_session)
+    for i in range(5):
+        crud.create_product(
+            ProductCreate(
+                name=f"Phone {i}", price=10, stock_quantity=i, category_id=phones.id
+            )
+        )
+
+    names, cursor, pages = [], None, 0
+    while True:
+        params = {"per_page": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/product/category/phones", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["meta"]["total_items"] == 5
+        names += [p["name"] for p in body["data"]]
+        pages += 1
+        cursor = body["meta"]["next_cursor"]
+        if cursor is None:
+            break
+
+    assert names == [f"Phone {i}" for i in range(5)]
+    assert pages == 3
+    assert body["meta"]["from_item"] == 5
+    assert body["data"][0]["in_stock"] is True
+
+    second = client.get("/product/category/phones", params={"per_page": 2, "page": 2})
+    assert [p["name"] for p in second.json()["data"]] == ["Phone 2", "Phone 3"]
+    assert client.get("/product/category/missing").status_code == 404
+    assert (
+        client.get("/product/category/phones", params={"cursor": "bad"}).status_code
+        == 400
+    )
+    assert (
+        client.get(
+            "/product/category/phones",
+            params={"cursor": encode_cursor({"after": "x", "total": 5, "offset": 2})},
+        ).status_code
+        == 400
+    )
+
+    # A cursor page is one limited select: no window over the whole category
+    # and no count, the total comes with the cursor.
+    statements = []
+    engine = db_session.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        deep = client.get(
+            "/product/category/phones",
+            params={
+                "per_page": 2,
+                "cursor": encode_cursor({"after": 2, "total": 5, "offset": 2}),
+            },
+        ).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert [p["name"] for p in deep["data"]] == ["Phone 2", "Phone 3"]
+    assert deep["meta"]["from_item"] == 3
+    assert deep["meta"]["total_items"] == 5
+    assert not any("OVER" in s.upper() for s in statements)
+    assert sum("FROM products" in s for s in statements) == 1
@@ -0,0 +1,653 @@
+import asyncio
+import json
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from elasticsearch import ConnectionError as ElasticConnectionError
+from elasticsearch import ApiError, NotFoundError
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.redis import redis_client
+from app.core.search_cache import SearchCache
+from app.crud.product import ProductCrud
+from app.dependencies import (
+    get_elastic_service_dep,
+    get_optional_elastic_service,
+    require_admin,
+)
+from app.main import app
+from app.schema.product_schema import ProductCreate, ProductUpdate
+from app.services import catalog_index, elasticsearch_service, product_service
+from app.services.autocomplete_index import (
+    autocomplete_index,
+    rebuild_autocomplete_index,
+)
+from app.services.elasticsearch_service import ElasticService
+from app.utils import es_utils
+from app.utils.cursor import encode_cursor
+from app.utils.bm25_index import BM25Index, CatalogDocument
+from app.utils.prefix_index import PrefixIndex
+
+
+def create_products(db_session: Session, count: int):
+    crud = ProductCrud(db_session)
+    return [
+        crud.create_product(
+            ProductCreate(name=f"Indexed Product {i}", price=10 + i, stock_quantity=5)
+        )
+        for i in range(count)
+    ]
+
+
+def test_streamed_bulk_index_counts_rejected_documents(db_session: Session):
+    products = create_products(db_session, 5)
+    ProductCrud(db_session).update_product(
+        products[0].id, ProductUpdate(is_active=False)
+    )
+    rejected_id = products[3].id
+    received: list[list[int]] = []
+
+    async def fake_streaming_bulk(es, actions, chunk_size, **kwargs):
+        actions = list(actions)
+        received.append([a["_id"] for a in actions])
+        for action in actions:
+            if action["_id"] == rejected_id:
+                yield False, {"index": {"_id": rejected_id, "status": 429}}
+
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with (
+        patch.object(es_utils, "SessionLocal", session_factory),
+        patch.object(es_utils.helpers, "async_streaming_bulk", fake_streaming_bulk),
+    ):
+        report = asyncio.run(
+            es_utils.index_document_stream(
+                None, es_utils.stream_product_documents(2), concurrency=2
+            )
+        )
+
+    # The inactive product is skipped and rows arrive in bounded partitions.
+    assert sorted(i for chunk in received for i in chunk) == [
+        p.id for p in products[1:]
+    ]
+    assert all(len(chunk) <= 2 for chunk in received)
+    assert (report.indexed, report.failed, report.chunks) == (3, 1, 2)
+
+
+class FakeSearchClient:
+    def __init__(self, hits: list[int]):
+        self.hits = hits
+        self.bodies: list[dict] = []
+
+    async def search(self, index, body, size, from_, **kwargs):
+        self.bodies.append(body)
+        return {
+            "took": 1,
+            "hits": {
+                "total": len(self.hits),
+                "hits": [
+                    {"_id": str(i), "_score": 1.0, "_source": {}} for i in self.hits
+                ],
+            },
+        }
+
+
+def test_product_listing_search_uses_index_ranking(
+    client: TestClient, db_session: Session
+):
+    products = create_products(db_session, 3)
+    ranked = [products[2].id, products[0].id]
+    fake = FakeSearchClient(ranked)
+    elastic_service = ElasticService(fake)
+    app.dependency_overrides[get_optional_elastic_service] = lambda: elastic_service
+
+    response = client.get("/product", params={"search": "indexed", "min_price": 10})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["id"] for p in body["data"]] == ranked
+    assert body["meta"]["total_items"] == 2
+    query = fake.bodies[0]
+    assert query["query"]["multi_match"]["query"] == "indexed"
+    assert query["post_filter"] == {
+        "bool": {"filter": [{"range": {"price": {"gte": 10.0}}}]}
+    }
+    assert "aggs" not in query
+
+
+def test_product_listing_search_falls_back_to_database(
+    client: TestClient, db_session: Session
+):
+    create_products(db_session, 2)
+    app.dependency_overrides[get_optional_elastic_service] = lambda: None
+
+    response = client.get("/product", params={"search": "Product 1"})
+
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()["data"]] == ["Indexed Product 1"]
+
+
+class FakePitClient:
+    def __init__(self, ids: list[int]):
+        self.ids = ids
+        self.closed: list[str] = []
+        self.bodies: list[dict] = []
+
+    async def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit-1"}
+
+    async def close_point_in_time(self, body):
+        self.closed.append(body["id"])
+
+    async def search(self, body, size, **kwargs):
+        self.bodies.append(body)
+        after = body.get("search_after", [0])[0]
+        page = [i for i in self.ids if i > after][:size]
+        return {
+            "took": 1,
+            "pit_id": "pit-1",
+            "hits": {
+                "total": len(self.ids),
+                "hits": [
+                    {"_id": str(i), "_score": None, "_source": {"id": i}, "sort": [i]}
+                    for i in page
+                ],
+            },
+        }
+
+
+def test_cursor_search_walks_every_page_and_closes_point_in_time():
+    es = FakePitClient(list(range(1, 6)))
+    service = ElasticService(es)
+
+    async def collect():
+        return [doc["id"] async for doc in service.iter_products(batch_size=2, q="x")]
+
+    assert asyncio.run(collect()) == [1, 2, 3, 4, 5]
+    assert es.closed == ["pit-1"]
+    assert all(b["pit"]["id"] == "pit-1" and "index" not in b for b in es.bodies)
+    assert es.bodies[0]["sort"] == ["_score", {"id": "asc"}]
+
+
+def test_invalid_search_cursor_is_rejected(client: TestClient):
+    elastic_service = ElasticService(FakePitClient([]))
+    app.dependency_overrides[get_elastic_service_dep] = lambda: elastic_service
+
+    response = client.get("/elastic/search", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+def test_tampered_search_cursor_is_rejected(client: TestClient):
+    elastic_service = ElasticService(FakePitClient([]))
+    app.dependency_overrides[get_elastic_service_dep] = lambda: elastic_service
+
+    for state in (
+        {"pit": "x", "after": None, "filters": {"bogus": 1}},
+        {"pit": "x", "after": None, "filters": [1, 2]},
+        {"pit": "x", "after": 5, "filters": {}},
+        {"pit": "x", "after": None, "filters": {"q": 123}},
+    ):
+        response = client.get(
+            "/elastic/search", params={"cursor": encode_cursor(state)}
+        )
+        assert response.status_code == 400, state
+
+
+class UnreachableClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def search(self, **kwargs):
+        self.calls += 1
+        raise ElasticConnectionError("cluster down")
+
+
+def test_autocomplete_falls_back_to_database_and_opens_circuit(
+    client: TestClient, db_session: Session
+):
+    create_products(db_session, 2)
+    es = UnreachableClient()
+    elastic_service = ElasticService(es)
+    app.dependency_overrides[get_optional_elastic_service] = lambda: elastic_service
+    breaker = elasticsearch_service.elastic_breaker
+
+    with (
+        patch.object(redis_client, "get_json", AsyncMock(return_value=None)),
+        patch.object(redis_client, "set_json", AsyncMock()),
+        patch.object(breaker, "failure_threshold", 2),
+        patch.object(autocomplete_index, "built_at", None),
+    ):
+        for _ in range(3):
+            response = client.get("/product/autocomplete", params={"q": "Indexed"})
+            assert response.status_code == 200
+            assert sorted(response.json()["suggestions"]) == [
+                "Indexed Product 0",
+                "Indexed Product 1",
+            ]
+        breaker.record_success()
+
+    # The third request skipped the open circuit instead of calling the cluster.
+    assert es.calls == 2
+
+
+class HangingClient:
+    def __init__(self):
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def search(self, **kwargs):
+        self.calls += 1
+        self.started.set()
+        await asyncio.sleep(60)
+
+
+def test_cancelled_calls_release_the_probe_without_counting_as_failures():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+
+    async def cancelled_search():
+        task = asyncio.create_task(ElasticService(es).search({}))
+        await es.started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with patch.object(elasticsearch_service, "elastic_breaker", breaker):
+        # A client going away mid-search does not open a healthy circuit...
+        es = HangingClient()
+        asyncio.run(cancelled_search())
+        assert breaker.state == "closed"
+
+        # ...and a cancelled trial hands its slot to the next caller.
+        breaker.record_failure()
+        breaker.opened_at -= 60
+        es = HangingClient()
+        asyncio.run(cancelled_search())
+
+    assert es.calls == 1
+    assert breaker.state == "half_open"
+    assert breaker.allow_request()
+    # A probe that never reports back is replaced after one timeout.
+    assert not breaker.allow_request()
+    breaker.probe_started_at -= 60
+    assert breaker.allow_request()
+
+
+class ThrottledClient:
+    async def search(self, **kwargs):
+        raise ApiError(
+            "es_rejected_execution_exception", SimpleNamespace(status=429), {}
+        )
+
+
+def test_throttled_search_counts_against_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    with patch.object(elasticsearch_service, "elastic_breaker", breaker):
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(ElasticService(ThrottledClient()).search({}))
+    assert raised.value.status_code == 503
+    assert breaker.state == "open"
+
+
+def test_prefix_index_ranks_and_updates_incrementally():
+    index = PrefixIndex()
+    index.rebuild(
+        [
+            (1, "iPhone 16 Pro", "Phones", 5),
+            (2, "iPhone 15", "Phones", 9),
+            (3, "Pro Headphones", "Audio", 1),
+        ]
+    )
+
+    # Whole-name prefix matches rank before word matches, then popularity.
+    assert index.search("ip") == ["iPhone 15", "iPhone 16 Pro"]
+    assert index.search("pro") == ["Pro Headphones", "iPhone 16 Pro"]
+    assert index.search("pro", category="Phones") == ["iPhone 16 Pro"]
+
+    index.upsert(1, "iPhone 16 Pro Max", "Phones", 20)
+    index.remove(2)
+    assert index.search("ip") == ["iPhone 16 Pro Max"]
+    assert index.search("max") == ["iPhone 16 Pro Max"]
+    assert len(index) == 2
+
+
+def test_autocomplete_rebuild_builds_on_a_thread_and_swaps_in():
+    index = PrefixIndex()
+    index.rebuild([(1, "Old Phone", None, 0)])
+    assert index.search("ph") == ["Old Phone"]
+    build_threads = []
+    build = PrefixIndex.build
+
+    def recording_build(rows, top_k=10):
+        build_threads.append(threading.current_thread())
+        return build(rows, top_k)
+
+    with (
+        patch("app.services.autocomplete_index.autocomplete_index", index),
+        patch(
+            "app.services.autocomplete_index.load_index_rows",
+            lambda: [(2, "New Phone", None, 5)],
+        ),
+        patch.object(PrefixIndex, "build", staticmethod(recording_build)),
+    ):
+        asyncio.run(rebuild_autocomplete_index())
+
+    assert build_threads and build_threads[0] is not threading.main_thread()
+    assert index.search("ph") == ["New Phone"]
+
+
+class InMemoryRedis:
+    def __init__(self):
+        self.values: dict = {}
+        self.client = self
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def get_json(self, key):
+        value = self.values.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set_json(self, key, value, ex=None):
+        self.values[key] = json.dumps(value)
+
+
+def test_search_cache_serves_repeats_until_generation_bump():
+    es = FakeSearchClient([1, 2])
+    cache = SearchCache(InMemoryRedis(), generation_refresh=0)
+    service = ElasticService(es, cache=cache)
+
+    async def run():
+        first = await service.search_products(q="Phone", per_page=2, facets=False)
+        # Same query modulo case and spacing: served from the cache.
+        second = await service.search_products(q="  phone ", per_page=2, facets=False)
+        await cache.invalidate_all()
+        await service.search_products(q="phone", per_page=2, facets=False)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert second == first
+    assert len(es.bodies) == 2
+
+
+def test_search_degrades_to_database_while_elasticsearch_is_down(
+    client: TestClient, db_session: Session
+):
+    create_products(db_session, 3)
+    app.dependency_overrides[get_elastic_service_dep] = lambda: ElasticService(None)
+
+    response = client.get(
+        "/elastic/search", params={"q": "Product 2", "sort_by": "price"}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["degraded"] is True
+    assert [hit["name"] for hit in body["results"]] == ["Indexed Product 2"]
+
+
+def test_listing_search_uses_catalog_index_without_elasticsearch(
+    client: TestClient, db_session: Session
+):
+    crud = ProductCrud(db_session)
+    by_description = crud.create_product(
+        ProductCreate(
+            name="Leather Case",
+            description="Fits the wireless charger",
+            price=15,
+            stock_quantity=3,
+        )
+    )
+    by_name = crud.create_product(
+        ProductCreate(name="Wireless Charger", price=30, stock_quantity=0)
+    )
+    crud.create_product(ProductCreate(name="USB Cable", price=5, stock_quantity=9))
+    app.dependency_overrides[get_optional_elastic_service] = lambda: None
+    index = BM25Index()
+
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with (
+        patch.object(catalog_index, "SessionLocal", session_factory),
+        patch.object(catalog_index, "catalog_index", index),
+        patch.object(product_service, "catalog_index", index),
+    ):
+        index.rebuild(catalog_index.load_catalog_documents())
+
+        def search(**params):
+            response = client.get("/product", params=params)
+            assert response.status_code == 200
+            return [p["id"] for p in response.json()["data"]]
+
+        # Name matches outrank description matches; the last word is a prefix.
+        assert search(search="wireless char") == [by_name.id, by_description.id]
+        assert search(search="wireless", availability="in_stock") == [
+            by_description.id
+        ]
+        assert search(search="wireless", sort_by="price", sort_order="desc") == [
+            by_name.id,
+            by_description.id,
+        ]
+
+        # Only stopwords: the index has nothing to match, SQL's ILIKE does.
+        assert search(search="the") == [by_description.id]
+
+        crud.update_product(by_name.id, ProductUpdate(is_active=False))
+        asyncio.run(catalog_index.CatalogIndexSync().apply_changes([by_name.id]))
+        assert search(search="charger") == [by_description.id]
+        assert len(index) == 2
+
+
+def test_catalog_index_compacts_off_the_loop_and_declines_bare_queries():
+    index = BM25Index()
+    document = CatalogDocument(
+        product_id=1,
+        name="Wireless Charger",
+        description=None,
+        category_id=None,
+        price=30,
+        in_stock=True,
+        created_at=None,
+        rating=None,
+        popularity=0,
+    )
+    index.rebuild([document])
+    assert index.can_answer("wireless ch")
+    assert not index.can_answer("the of")
+    assert not index.can_answer("wireless c")
+
+    for price in range(100):
+        index.upsert(replace(document, price=price))
+    # Updates only tombstone; the rebuild waits for compact().
+    assert index.needs_compaction
+    index.compact()
+    assert not index.needs_compaction
+    assert index.search("charger", min_price=99) == (1, [1])
+
+
+class FakeMappingIndices:
+    """indices API of a client whose products index carries a high-water mark."""
+
+    def __init__(self, synced_until: datetime | None):
+        self.meta = {"synced_until": synced_until.isoformat()} if synced_until else {}
+
+    async def get_mapping(self, index):
+        return {"products_v1": {"mappings": {"_meta": dict(self.meta)}}}
+
+    async def put_mapping(self, index, body):
+        self.meta.update(body["_meta"])
+
+
+def test_incremental_sync_holds_the_mark_at_a_failed_product(db_session: Session):
+    products = create_products(db_session, 3)
+    products[2].is_active = False
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    for i, product in enumerate(products):
+        product.updated_at = start + timedelta(seconds=i + 1)
+    db_session.commit()
+    es = type("FakeClient", (), {})()
+    es.indices = FakeMappingIndices(start)
+    sent: list[list[tuple[str, int]]] = []
+    failing = {products[1].id}
+
+    async def fake_bulk(client, actions, raise_on_error):
+        sent.append([(a.get("_op_type", "index"), a["_id"]) for a in actions])
+        errors = [{"index": {"_id": str(i), "status": 400}} for i in failing]
+        errors.append({"delete": {"_id": str(products[2].id), "status": 404}})
+        return len(actions) - len(errors), errors
+
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with (
+        patch.object(es_utils, "SessionLocal", session_factory),
+        patch.object(es_utils.helpers, "async_bulk", fake_bulk),
+    ):
+        assert asyncio.run(es_utils.sync_changed_products(es)) == 2
+        assert es.indices.meta["synced_until"] == products[1].updated_at.isoformat()
+
+        # The next sync starts at the failed product; once it goes through
+        # the mark moves past everything.
+        failing.clear()
+        asyncio.run(es_utils.sync_changed_products(es))
+
+    assert sent == [
+        [
+            ("index", products[0].id),
+            ("index", products[1].id),
+            ("delete", products[2].id),
+        ],
+        [("index", products[1].id), ("delete", products[2].id)],
+    ]
+    assert es.indices.meta["synced_until"] == products[2].updated_at.isoformat()
+
+
+def test_reindex_endpoint_schedules_a_rebuild(client: TestClient):
+    es = object()
+    app.dependency_overrides[get_elastic_service_dep] = lambda: ElasticService(es)
+    app.dependency_overrides[require_admin] = lambda: None
+
+    with patch(
+        "app.api.v1.routes.elastic.rebuild_product_index", new_callable=AsyncMock
+    ) as rebuild:
+        response = client.post("/elastic/reindex")
+
+    assert response.status_code == 202
+    rebuild.assert_awaited_once_with(es)
+
+
+class FakeIndices:
+    """indices API over {index name: its aliases}, logging every write."""
+
+    def __init__(self, indices: dict[str, set[str]] | None = None):
+        self.indices = indices or {}
+        self.log: list[tuple] = []
+
+    async def get(self, index):
+        prefix = index.rstrip("*")
+        return {name: {} for name in self.indices if name.startswith(prefix)}
+
+    async def get_alias(self, name):
+        targets = {i: {} for i, aliases in self.indices.items() if name in aliases}
+        if not targets:
+            raise NotFoundError("alias missing", None, {})
+        return targets
+
+    async def exists(self, index):
+        return index in self.indices or any(
+            index in aliases for aliases in self.indices.values()
+        )
+
+    async def create(self, index, body):
+        self.log.append(("create", index, body.get("settings")))
+        self.indices[index] = set()
+
+    async def update_aliases(self, actions):
+        self.log.append(("update_aliases", actions))
+        for action in actions:
+            [(op, args)] = action.items()
+            if op == "add":
+                self.indices[args["index"]].add(args["alias"])
+            elif op == "remove":
+                self.indices[args["index"]].discard(args["alias"])
+
+    async def delete(self, index, ignore_unavailable=False):
+        self.log.append(("delete", index))
+        self.indices.pop(index, None)
+
+    async def put_settings(self, index, settings):
+        self.log.append(("put_settings", index))
+
+    async def refresh(self, index):
+        pass
+
+
+def fake_es(indices: FakeIndices):
+    es = type("FakeClient", (), {})()
+    es.indices = indices
+    return es
+
+
+def test_first_run_bootstraps_a_versioned_index_behind_the_alias():
+    indices = FakeIndices()
+    es = fake_es(indices)
+
+    assert asyncio.run(es_utils.ensure_product_index(es)) is True
+    assert indices.indices == {"products_v1": {"products"}}
+    # Created for serving, not with the bulk-load settings.
+    assert indices.log[0] == ("create", "products_v1", None)
+
+    assert asyncio.run(es_utils.ensure_product_index(es)) is False
+    assert len(indices.log) == 2
+
+
+def test_rebuild_swaps_the_alias_atomically_then_drops_old_versions():
+    indices = FakeIndices({"products_v1": {"products"}, "products_v3": set()})
+    es = fake_es(indices)
+
+    with (
+        patch.object(es_utils, "bulk_index_products", AsyncMock()) as bulk,
+        patch.object(es_utils, "sync_changed_products", AsyncMock()) as catch_up,
+        patch.object(es_utils.search_cache, "invalidate_all", AsyncMock()),
+    ):
+        assert asyncio.run(es_utils.rebuild_product_index(es)) == "products_v4"
+
+    bulk.assert_awaited_once_with(es, index="products_v4")
+    catch_up.assert_awaited_once_with(es)
+    assert indices.indices == {"products_v4": {"products"}}
+    writes = [entry[:2] for entry in indices.log if entry[0] != "put_settings"]
+    assert writes == [
+        ("create", "products_v4"),
+        (
+            "update_aliases",
+            [
+                {"remove": {"index": "products_v1", "alias": "products"}},
+                {"add": {"index": "products_v4", "alias": "products"}},
+            ],
+        ),
+        ("delete", "products_v1"),
+        ("delete", "products_v3"),
+    ]
+    assert indices.log[0][2] == {
+        "index": {"refresh_interval": "-1", "number_of_replicas": 0}
+    }
+
+
+def test_failed_rebuild_drops_the_new_index_and_keeps_the_alias():
+    indices = FakeIndices({"products_v1": {"products"}})
+    es = fake_es(indices)
+
+    failing = AsyncMock(side_effect=RuntimeError("bulk failed"))
+    with patch.object(es_utils, "bulk_index_products", failing):
+        with pytest.raises(RuntimeError):
+            asyncio.run(es_utils.rebuild_product_index(es))
+
+    assert indices.indices == {"products_v1": {"products"}}
+    assert not any(entry[0] == "update_aliases" for entry in indices.log)
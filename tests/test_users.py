@@ -0,0 +1,204 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.password_hasher import PasswordHasher, password_hasher
+from app.core.rate_limit import RateLimiter, RateLimitPolicy
+from app.core.redis import RedisClient
+from app.crud.user import UserCrud
+
+
+def test_authenticated_user_is_cached_until_changed(
+    client: TestClient, db_session: Session
+):
+    client.post(
+        "/users/register",
+        json={
+            "email": "cached_user@example.com",
+            "password": "password123",
+            "first_name": "Cached",
+            "last_name": "User",
+            "phone": "1234567890",
+        },
+    )
+    token = client.post(
+        "/users/login",
+        json={"email": "cached_user@example.com", "password": "password123"},
+    ).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    loads = []
+    get_user = UserCrud.get_user
+
+    def counting_get_user(self, user_id):
+        loads.append(user_id)
+        return get_user(self, user_id)
+
+    with patch.object(UserCrud, "get_user", counting_get_user):
+        assert client.get("/users/me", headers=headers).json()["first_name"] == "Cached"
+        assert client.get("/users/me", headers=headers).status_code == 200
+        assert client.get("/cart", headers=headers).status_code == 200
+        assert len(loads) == 1
+
+        client.put("/users/me", json={"first_name": "Renamed"}, headers=headers)
+        assert (
+            client.get("/users/me", headers=headers).json()["first_name"] == "Renamed"
+        )
+
+        client.post(
+            "/users/me/address",
+            json={
+                "type": "shipping",
+                "street": "1 Cache St",
+                "city": "Cache City",
+                "country": "Cache Country",
+                "zip_code": "12345",
+                "state": "Cache State",
+            },
+            headers=headers,
+        )
+        me = client.get("/users/me", headers=headers).json()
+        assert [a["street"] for a in me["addresses"]] == ["1 Cache St"]
+
+        client.delete("/users/me", headers=headers)
+        assert client.get("/users/me", headers=headers).status_code == 404
+
+
+def test_password_hasher_runs_on_worker_processes():
+    hasher = PasswordHasher(workers=1)
+    hasher.start()
+    try:
+        hashed = asyncio.run(hasher.hash("password123"))
+        assert asyncio.run(hasher.verify("password123", hashed))
+        assert not asyncio.run(hasher.verify("wrong-password", hashed))
+    finally:
+        hasher.close()
+
+
+def test_password_hasher_replaces_a_broken_pool():
+    hasher = PasswordHasher(workers=1)
+    hasher.start()
+    try:
+        broken = hasher._pool
+        # A worker dying (e.g. OOM-killed) breaks the whole pool.
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        hashed = asyncio.run(hasher.hash("password123"))
+        assert hasher._pool is not broken
+        assert asyncio.run(hasher.verify("password123", hashed))
+    finally:
+        hasher.close()
+
+
+def test_login_is_refused_while_the_hasher_is_saturated(client: TestClient):
+    with patch.object(password_hasher, "max_pending", 0):
+        response = client.post(
+            "/users/register",
+            json={
+                "email": "busy_user@example.com",
+                "password": "password123",
+                "first_name": "Busy",
+                "last_name": "User",
+                "phone": "1234567890",
+            },
+        )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_login_is_rate_limited_per_ip(client: TestClient):
+    client.post(
+        "/users/register",
+        json={
+            "email": "limited_user@example.com",
+            "password": "password123",
+            "first_name": "Limited",
+            "last_name": "User",
+            "phone": "1234567890",
+        },
+    )
+    response = client.post(
+        "/users/login",
+        json={"email": "limited_user@example.com", "password": "password123"},
+    )
+    assert response.status_code == 200
+    assert response.headers["RateLimit-Limit"] == "10"
+    assert response.headers["RateLimit-Remaining"] == "9"
+    assert response.headers["RateLimit-Policy"] == "10;w=60"
+
+    unknown = {"email": "nobody@example.com", "password": "password123"}
+    for _ in range(9):
+        assert client.post("/users/login", json=unknown).status_code == 401
+
+    response = client.post("/users/login", json=unknown)
+    assert response.status_code == 429
+    assert response.headers["RateLimit-Remaining"] == "0"
+    assert 1 <= int(response.headers["Retry-After"]) <= 6
+
+
+class FakeScript:
+    """A registered Lua script that answers as Redis would, and records calls."""
+
+    def __init__(self, client, replies):
+        self.registered_client = client
+        self.replies = replies
+        self.calls = []
+
+    async def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        return self.replies.pop(0)
+
+
+class ScriptingClient:
+    def __init__(self, replies):
+        self.replies = replies
+        self.scripts = []
+
+    def register_script(self, source):
+        script = FakeScript(self, self.replies)
+        self.scripts.append(script)
+        return script
+
+
+def test_rate_limiter_drives_the_token_bucket_script():
+    redis = RedisClient()
+    # Redis returns Lua integers as ints and the token count as a string.
+    redis._client = ScriptingClient([[1, "9.5"], [0, "0.25"]])
+    limiter = RateLimiter(redis)
+    policy = RateLimitPolicy.parse("10/20")
+
+    first = asyncio.run(limiter.hit("ratelimit:login:ip:1", policy))
+    second = asyncio.run(limiter.hit("ratelimit:login:ip:1", policy))
+
+    assert (first.allowed, first.tokens) == (True, 9.5)
+    assert (second.allowed, second.tokens) == (False, 0.25)
+    [script] = redis._client.scripts
+    assert script.calls == [(["ratelimit:login:ip:1"], [10, 0.0005, 1])] * 2
+    assert second.headers(policy)["Retry-After"] == "2"
+
+    # A reconnected client gets the script registered again.
+    redis._client = ScriptingClient([[1, "8"]])
+    asyncio.run(limiter.hit("ratelimit:login:ip:1", policy))
+    assert len(redis._client.scripts) == 1
+
+
+def test_token_bucket_script_runs_on_fakeredis():
+    redis = RedisClient()
+    redis._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    limiter = RateLimiter(redis)
+    policy = RateLimitPolicy.parse("2/60")
+
+    async def run():
+        return [await limiter.hit("ratelimit:test:ip:1", policy) for _ in range(3)]
+
+    decisions = asyncio.run(run())
+    assert [d.allowed for d in decisions] == [True, True, False]
+    assert decisions[0].tokens == pytest.approx(1, abs=0.01)
+    assert decisions[2].tokens < 1
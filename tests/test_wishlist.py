@@ -0,0 +1,132 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.redis import RedisClient
+from app.crud.wishlist import WishlistCrud
+from app.models.product import Product
+from app.models.user import User
+from app.services.wishlist_service import WishlistService
+
+
+def test_wishlist_listing_count_and_clear(client: TestClient, db_session: Session):
+    client.post(
+        "/users/register",
+        json={
+            "email": "wishlist_user@example.com",
+            "password": "password123",
+            "first_name": "Wish",
+            "last_name": "List",
+            "phone": "1234567890",
+        },
+    )
+    token = client.post(
+        "/users/login",
+        json={"email": "wishlist_user@example.com", "password": "password123"},
+    ).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    mug = Product(name="Mug", slug="mug", price=5.0, stock_quantity=10)
+    cup = Product(name="Cup", slug="cup", price=3.0, stock_quantity=0)
+    db_session.add_all([mug, cup])
+    db_session.commit()
+    wishlist = WishlistCrud(db_session)
+    wishlist.add_to_wishlist(user_id=user_id, product_id=mug.id)
+    wishlist.add_to_wishlist(user_id=user_id, product_id=cup.id)
+
+    body = client.get("/wishlist", headers=headers).json()
+    assert body["total_count"] == 2
+    assert {
+        (i["product_name"], i["product_price"], i["product_stock_quantity"])
+        for i in body["items"]
+    } == {("Mug", 5.0, 10), ("Cup", 3.0, 0)}
+    assert client.get("/wishlist/count", headers=headers).json() == {"count": 2}
+
+    assert client.delete(f"/wishlist/{cup.id}", headers=headers).status_code == 200
+    assert client.delete(f"/wishlist/{cup.id}", headers=headers).status_code == 404
+
+    cleared = client.delete("/wishlist", headers=headers).json()
+    assert "1 item(s) removed" in cleared["message"]
+    assert client.get("/wishlist/count", headers=headers).json() == {"count": 0}
+
+
+def test_wishlist_membership_is_cached_and_invalidated(
+    client: TestClient, db_session: Session, lua_redis
+):
+    client.post(
+        "/users/register",
+        json={
+            "email": "wishlist_flags@example.com",
+            "password": "password123",
+            "first_name": "Wish",
+            "last_name": "List",
+            "phone": "1234567890",
+        },
+    )
+    token = client.post(
+        "/users/login",
+        json={"email": "wishlist_flags@example.com", "password": "password123"},
+    ).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    mug = Product(name="Mug", slug="mug", sku="MUG-1", price=5.0, stock_quantity=10)
+    cup = Product(name="Cup", slug="cup", sku="CUP-1", price=3.0, stock_quantity=10)
+    db_session.add_all([mug, cup])
+    db_session.commit()
+    client.post("/wishlist", json={"product_id": mug.id}, headers=headers)
+
+    response = client.get(
+        "/wishlist/contains",
+        params={"product_ids": [mug.id, cup.id]},
+        headers=headers,
+    )
+    assert response.json()["in_wishlist"] == {str(mug.id): True, str(cup.id): False}
+    key = f"wishlist-products:{user_id}"
+    assert lua_redis.smembers(key) == {"0", str(mug.id)}
+
+    client.post("/wishlist", json={"product_id": cup.id}, headers=headers)
+    assert not lua_redis.exists(key)
+
+    listing = client.get(
+        "/product", params={"include_wishlist": True}, headers=headers
+    ).json()
+    assert listing["in_wishlist"] == {str(mug.id): True, str(cup.id): True}
+    assert client.get("/product").json()["in_wishlist"] is None
+
+
+def test_wishlist_membership_load_is_not_written_back_after_a_change(
+    db_session: Session,
+):
+    user = User(email="wishlist_race@example.com", password_hash="x")
+    mug = Product(name="Mug", slug="mug", sku="MUG-1", price=5.0, stock_quantity=10)
+    db_session.add_all([user, mug])
+    db_session.commit()
+    server = fakeredis.FakeServer()
+
+    def service() -> WishlistService:
+        redis = RedisClient()
+        redis._client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        return WishlistService(db_session, redis)
+
+    reader = service()
+    load = reader.wishlist_crud.get_product_ids
+
+    def load_racing_an_add(user_id):
+        product_ids = load(user_id)
+        # Another request adds the mug after the read but before write-back.
+        with ThreadPoolExecutor(1) as other:
+            other.submit(
+                asyncio.run, service().add_product_to_wishlist(user_id, mug.id)
+            ).result()
+        return product_ids
+
+    reader.wishlist_crud.get_product_ids = load_racing_an_add
+    assert asyncio.run(reader.get_membership(user.id, [mug.id])) == {mug.id: False}
+    key = f"wishlist-products:{user.id}"
+    assert not fakeredis.FakeRedis(server=server).exists(key)
+
+    reader.wishlist_crud.get_product_ids = load
+    assert asyncio.run(reader.get_membership(user.id, [mug.id])) == {mug.id: True}